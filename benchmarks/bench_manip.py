@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import time
+
+from hypertools.manip import manip, Normalize, Resample, Smooth, StreamingSmooth, ZScore
+
+# Fit and transform costs of the ZScore and Normalize manipulators for a range of data shapes.  Both steps should
+# scale with the number of elements (rows x columns), so the per-element cost should stay roughly constant as the
+# number of columns grows.
+
+shapes = [(1000, 10), (1000, 100), (1000, 1000), (1000, 5000), (10000, 100), (10000, 1000), (10000, 5000)]
+n_repeats = 3
+
+
+def best_time(f):
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return np.min(times)
+
+
+print(f"{'model':>10} {'rows':>7} {'columns':>8} {'fit (ms)':>10} {'transform (ms)':>15} {'ns / element':>13}")
+for model in [ZScore, Normalize]:
+    for rows, columns in shapes:
+        data = pd.DataFrame(np.random.randn(rows, columns))
+        m = model()
+        fit_time = best_time(lambda: m.fit(data))
+        transform_time = best_time(lambda: m.transform(data))
+        per_element = 1e9 * (fit_time + transform_time) / (rows * columns)
+        print(f'{model.__name__:>10} {rows:>7} {columns:>8} {1e3 * fit_time:>10.2f} {1e3 * transform_time:>15.2f} '
+              f'{per_element:>13.2f}')
+
+# Resampling many equal-length trajectories (stacked into a single MultiIndex DataFrame) to a common length.  All
+# trajectories are fit and evaluated in one batched call (when transforming), so the cost should scale with the total
+# number of samples.
+print(f"\n{'model':>10} {'trajectories':>13} {'length':>7} {'fit (ms)':>10} {'transform (ms)':>15}")
+for n_trajectories in [100, 1000, 10000]:
+    data = pd.DataFrame(np.cumsum(np.random.randn(n_trajectories * 100, 3), axis=0),
+                        index=pd.MultiIndex.from_product([np.arange(n_trajectories), np.arange(100)]))
+    m = Resample(n_samples=50)
+    fit_time = best_time(lambda: m.fit(data))
+    transform_time = best_time(lambda: m.transform(data))
+    print(f'{"Resample":>10} {n_trajectories:>13} {100:>7} {1e3 * fit_time:>10.2f} {1e3 * transform_time:>15.2f}')
+
+# A ZScore -> Smooth -> Normalize chain applied to stacked data, either fused into a single pass over one buffer (the
+# default) or applied one manipulator at a time.
+print(f"\n{'chain':>10} {'rows':>7} {'columns':>8} {'fused (ms)':>11} {'sequential (ms)':>16}")
+for rows, columns in [(10000, 100), (10000, 1000), (100000, 100)]:
+    data = [pd.DataFrame(np.random.randn(rows // 10, columns)) for _ in range(10)]
+    chain = ['ZScore', 'Smooth', 'Normalize']
+    fused_time = best_time(lambda: manip(data, model=chain))
+    sequential_time = best_time(lambda: manip(data, model=chain, fuse=False))
+    print(f'{"fused":>10} {rows:>7} {columns:>8} {1e3 * fused_time:>11.2f} {1e3 * sequential_time:>16.2f}')
+
+# Smoothing many short sessions stacked into a single MultiIndex DataFrame.  Equal-length sessions are smoothed
+# together, so the cost should be dominated by the number of samples rather than the number of sessions.
+print(f"\n{'model':>16} {'sessions':>9} {'length':>7} {'fit + transform (ms)':>21}")
+for n_sessions in [100, 1000, 10000]:
+    data = pd.DataFrame(np.random.randn(n_sessions * 20, 3),
+                        index=pd.MultiIndex.from_product([np.arange(n_sessions), np.arange(20)]))
+    for model in [Smooth, StreamingSmooth]:
+        elapsed = best_time(lambda: model().fit_transform(data))
+        print(f'{model.__name__:>16} {n_sessions:>9} {20:>7} {1e3 * elapsed:>21.2f}')
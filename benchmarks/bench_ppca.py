@@ -0,0 +1,57 @@
+import numpy as np
+import time
+import tracemalloc
+
+from hypertools.external import PPCA, MiniBatchPPCA
+
+# PPCA on data with 20% missing values.  Each EM iteration makes two passes over the (filled-in) data (to compute
+# data C and data' X); the reconstruction is only evaluated at the missing entries, and the reconstruction error is
+# computed from d x d summaries, so the peak memory use stays close to one working copy of the data (plus the input).
+#
+# The largest setting (10^5 x 10^3) needs roughly 2 GB of memory: 800 MB for the input and 800 MB for PPCA's working
+# copy.
+
+n_components = 10
+missing_fraction = 0.2
+
+print(f"{'rows':>7} {'columns':>8} {'time (s)':>9} {'iterations':>11} {'peak memory (MB)':>17} {'input (MB)':>11}")
+for rows, columns in [(10000, 100), (10000, 1000), (100000, 100), (100000, 1000)]:
+    rng = np.random.RandomState(0)
+    x = np.dot(rng.randn(rows, n_components), rng.randn(n_components, columns))
+    x += 0.5 * rng.randn(rows, columns)
+    x[rng.rand(rows, columns) < missing_fraction] = np.nan
+
+    model = PPCA()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    np.random.seed(0)
+    model.fit(x, d=n_components)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{rows:>7} {columns:>8} {elapsed:>9.2f} {model.n_iter:>11} {peak / 1024 ** 2:>17.0f} '
+          f'{x.nbytes / 1024 ** 2:>11.0f}')
+
+# Mini-batch PPCA accumulates the EM sufficient statistics over chunks of rows (and integrates out the missing values
+# rather than filling them in), so its memory use is governed by the batch size.  Parameter-expanded EM updates keep the
+# number of passes through the data small.
+print(f"\n{'rows':>7} {'columns':>8} {'batch size':>11} {'time (s)':>9} {'passes':>7} {'peak memory (MB)':>17}")
+for rows, columns in [(100000, 100), (100000, 1000)]:
+    rng = np.random.RandomState(0)
+    x = np.dot(rng.randn(rows, n_components), rng.randn(n_components, columns))
+    x += 0.5 * rng.randn(rows, columns)
+    x[rng.rand(rows, columns) < missing_fraction] = np.nan
+
+    for batch_size in [1000, 10000]:
+        model = MiniBatchPPCA(n_components=n_components, batch_size=batch_size, random_state=0)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        model.fit(x)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f'{rows:>7} {columns:>8} {batch_size:>11} {elapsed:>9.2f} {model.n_iter:>7} {peak / 1024 ** 2:>17.0f}')
@@ -0,0 +1,55 @@
+import numpy as np
+import time
+
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+
+from hypertools.core import get_default_options, eval_dict
+from hypertools.reduce import reduce
+from hypertools.reduce.solvers import select_solver
+
+# Timings that motivate the thresholds in the [solvers] section of config.ini.  For each setting, the solver chosen by
+# select_solver is marked with an asterisk.
+#
+#   - full_svd_max_size: full SVDs scale cubically with min(n_samples, n_features); randomized SVDs scale with the
+#     number of components.  Up to ~500 features (or samples) both solvers finish in a fraction of a second, and the
+#     full solver is exact, so it is preferred.  Beyond that, the randomized solver is roughly 3-10x faster, and the gap
+#     widens as both dimensions grow.
+#   - exact_tsne_max_samples: exact t-SNE gradients are O(n^2), whereas Barnes-Hut gradients are O(n log n) but carry
+#     more overhead.  The two break even at around 500 samples.
+
+policy = eval_dict(get_default_options()['solvers'])
+print('thresholds:', policy)
+
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+print(f"\n{'model':>6} {'rows':>7} {'columns':>8} {'full (s)':>10} {'randomized (s)':>15}")
+for rows, columns in [(1000, 100), (1000, 500), (1000, 1000), (10000, 100), (10000, 1000), (2000, 2000)]:
+    x = np.random.randn(rows, columns)
+    times = {s: timed(lambda: PCA(n_components=3, svd_solver=s).fit_transform(x)) for s in ['full', 'randomized']}
+    chosen = select_solver('PCA', rows, columns, n_components=3)[1]['svd_solver']
+    print(f'{"PCA":>6} {rows:>7} {columns:>8} ' +
+          ' '.join([f'{times[s]:>{w}.3f}{"*" if s == chosen else " "}' for s, w in [('full', 9), ('randomized', 14)]]))
+
+print(f"\n{'model':>6} {'rows':>7} {'columns':>8} {'exact (s)':>10} {'barnes_hut (s)':>15}")
+for rows in [100, 250, 500, 1000, 2000]:
+    x = np.random.randn(rows, 20)
+    times = {m: timed(lambda: TSNE(n_components=3, method=m).fit_transform(x)) for m in ['exact', 'barnes_hut']}
+    chosen = select_solver('TSNE', rows, 20, n_components=3)[1]['method']
+    print(f'{"TSNE":>6} {rows:>7} {20:>8} ' +
+          ' '.join([f'{times[m]:>{w}.3f}{"*" if m == chosen else " "}' for m, w in [('exact', 9), ('barnes_hut', 14)]]))
+
+# Landmark mode: the model is fit to a subset of landmark observations, and the remaining observations are placed by
+# out-of-sample extension.  Run time should scale with the number of landmarks, not the number of observations.
+print(f"\n{'model':>18} {'rows':>7} {'landmarks':>10} {'time (s)':>9}")
+for rows in [10000, 100000]:
+    x = np.random.randn(rows, 20)
+    for model in ['Isomap', 'SpectralEmbedding', 'TSNE']:
+        for n_landmarks in [250, 500, 1000]:
+            elapsed = timed(lambda: reduce(x, model=model, n_components=2, landmarks=n_landmarks))
+            print(f'{model:>18} {rows:>7} {n_landmarks:>10} {elapsed:>9.2f}')
@@ -1,6 +1,10 @@
 from .align import align
 from .srm import SharedResponseModel, RobustSharedResponseModel, DeterministicSharedResponseModel
 from .hyperalign import HyperAlign
+from .piecewise import PiecewiseHyperAlign
 from .procrustes import Procrustes
 from .null import NullAlign
 from .common import Aligner, pad, trim_and_pad
+from .pairwise import pairwise_alignment
+from .isc import isc, isfc
+from .evaluate import time_segment_matching, segment_matching_accuracy
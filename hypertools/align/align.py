@@ -2,15 +2,20 @@
 import datawrangler as dw
 
 from .hyperalign import HyperAlign
+from .piecewise import PiecewiseHyperAlign
 from .null import NullAlign
 from .procrustes import Procrustes
 from .srm import SharedResponseModel, DeterministicSharedResponseModel, RobustSharedResponseModel
 from .common import Aligner
 
-from ..core import apply_model, has_all_attributes, get_default_options
+from ..core import apply_model, has_all_attributes, get_default_options, cached
 from ..core.shared import unpack_model
 
+aligners = [HyperAlign, PiecewiseHyperAlign, SharedResponseModel, RobustSharedResponseModel,
+            DeterministicSharedResponseModel, Procrustes, NullAlign]
 
+
+@cached('align')
 @dw.decorate.funnel
 def align(data, model='HyperAlign', **kwargs):
     """
@@ -20,10 +25,12 @@ def align(data, model='HyperAlign', **kwargs):
     Parameters
     ----------
     :param data: a hypertools-compatible dataset
-    :param model: one of: 'HyperAlign' (default), 'SharedResponseModel', 'RobustSharedResponseModel',
-      'DeterministicSharedResponseModel', or 'Procrustes'.  Aligner objects are also supported.  Models may also be
-      supplied in dictionary form to modify their behaviors.  Lists of models (to be applied in sequence) are also
-      supported.
+    :param model: one of: 'HyperAlign' (default), 'PiecewiseHyperAlign', 'SharedResponseModel',
+      'RobustSharedResponseModel', 'DeterministicSharedResponseModel', or 'Procrustes'.  Aligner objects are also
+      supported.  Models may also be supplied in dictionary form to modify their behaviors.  Lists of models (to be
+      applied in sequence) are also supported.
+    :param cache: if True, load the aligned data from (or save it to) the persistent disk cache (default: set in the
+      [cache] section of config.ini)
     :param kwargs: keyword arguments are first passed to datawrangler.decorate.funnel, and any remaining arguments are
       passed to the appropriate Aligner object.
 
@@ -31,7 +38,5 @@ def align(data, model='HyperAlign', **kwargs):
     -------
     :returns: aligned data (as a DataFrame or a list of DataFrames)
     """
-    aligners = [HyperAlign, SharedResponseModel, RobustSharedResponseModel,
-                DeterministicSharedResponseModel, Procrustes, NullAlign]
     return apply_model(data, unpack_model(model, valid=aligners, parent_class=Aligner),
                        **dw.core.update_dict(get_default_options()['align'], kwargs))
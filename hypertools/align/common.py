@@ -97,7 +97,12 @@ class Aligner(BaseEstimator):
         for k, v in params.items():
             setattr(self, k, v)
 
-    def transform(self, *_):
+    def transform(self, data=None):
+        """
+        Apply the fitted alignment to a dataset.  If data is None (default), the fitted data are transformed;
+        otherwise the given data (e.g., held-out timepoints from the same subjects, in the same order as the fitted
+        data) are transformed using the fitted parameters.
+        """
         assert self.data is not None, NotFittedError('must fit aligner before transforming data')
         for r in self.required:
             assert hasattr(self, r), NotFittedError(f'missing fitted attribute: {r}')
@@ -106,7 +111,9 @@ class Aligner(BaseEstimator):
             RuntimeWarning('null transform function; returning without fitting alignment model')
             return
 
-        data = trim_and_pad(dw.unstack(self.data))
+        if data is None:
+            data = self.data
+        data = trim_and_pad(dw.unstack(data))
         required_params = {r: getattr(self, r) for r in self.required}
         return self.transformer(data, **dw.core.update_dict(required_params, self.kwargs))
 
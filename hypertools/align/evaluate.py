@@ -0,0 +1,136 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+from copy import deepcopy
+from time import perf_counter
+from joblib import Parallel, delayed
+
+from .align import aligners
+from .common import Aligner, trim_and_pad
+from .isc import zscore_columns
+
+from ..core import get_default_options, eval_dict
+from ..core.shared import unpack_model
+
+
+def get_aligner(model):
+    """
+    Return a (name, unfitted Aligner) tuple for an aligner specified as a string, Aligner subclass, Aligner object,
+    or a dictionary with 'model', 'args', and 'kwargs' fields
+    """
+    if isinstance(model, Aligner):
+        return type(model).__name__, deepcopy(model)
+
+    model = unpack_model(model, valid=aligners, parent_class=Aligner)
+    if type(model) is dict:
+        return model['model'].__name__, model['model'](*model['args'], **model['kwargs'])
+    elif type(model) is str:
+        raise ValueError(f'unknown aligner: {model}')
+    return model.__name__, model()
+
+
+def segments(x, segment_length):
+    """
+    Concatenate each run of segment_length consecutive rows of x into a single (flattened) row
+    """
+    n_segments = x.shape[0] - segment_length + 1
+    return np.hstack([x[i:(i + n_segments)] for i in range(segment_length)])
+
+
+def segment_matching_accuracy(data, segment_length=6):
+    """
+    Leave-one-subject-out time segment matching.  For each subject, every segment of segment_length consecutive
+    timepoints is correlated with every segment of the mean of the other subjects' data, and the segment is
+    classified correctly if its best match is the corresponding segment.  Segments that overlap the true segment
+    (other than the true segment itself) are excluded from the candidates.
+
+    Parameters
+    ----------
+    :param data: a list of number-of-timepoints by number-of-features datasets (e.g., aligned data)
+    :param segment_length: number of timepoints per segment (default: 6)
+
+    Returns
+    -------
+    :return: a numpy array of classification accuracies, one per subject
+    """
+    x = [np.asarray(d, dtype=float) for d in data]
+    n = len(x)
+    assert n > 1, ValueError('time segment matching requires at least two subjects')
+    n_segments = x[0].shape[0] - segment_length + 1
+    assert n_segments > 1, ValueError(f'not enough timepoints for segments of length {segment_length}')
+
+    offsets = np.abs(np.subtract.outer(np.arange(n_segments), np.arange(n_segments)))
+    overlapping = (offsets > 0) & (offsets < segment_length)
+
+    total = np.sum(x, axis=0)
+    accuracy = np.zeros(n)
+    for i in range(n):
+        a = zscore_columns(segments(x[i], segment_length).T)
+        b = zscore_columns(segments((total - x[i]) / (n - 1), segment_length).T)
+        r = np.dot(a.T, b)
+        r[overlapping] = -np.inf
+        accuracy[i] = np.mean(np.argmax(r, axis=1) == np.arange(n_segments))
+    return accuracy
+
+
+def evaluate_fold(data, model, test_inds, segment_length):
+    train_inds = np.setdiff1d(np.arange(data[0].shape[0]), test_inds)
+    name, aligner = get_aligner(model)
+
+    start = perf_counter()
+    aligner.fit(dw.stack([pd.DataFrame(x[train_inds]) for x in data]))
+    fit_time = perf_counter() - start
+
+    start = perf_counter()
+    aligned = aligner.transform([pd.DataFrame(x[test_inds]) for x in data])
+    transform_time = perf_counter() - start
+
+    accuracy = np.mean(segment_matching_accuracy(aligned, segment_length=segment_length))
+    return {'model': name, 'accuracy': accuracy, 'fit_time': fit_time, 'transform_time': transform_time}
+
+
+@dw.decorate.funnel
+def time_segment_matching(data, models=None, **kwargs):
+    """
+    Cross-validated time segment matching benchmark for comparing aligners.  Timepoints are split into contiguous
+    folds; for each fold, each aligner is fit to the remaining timepoints, the held-out timepoints are transformed
+    using the fitted model, and the aligned held-out data are evaluated using leave-one-subject-out time segment
+    matching.  All (model, fold) pairs are run concurrently on a process pool; the subjects' data are passed to the
+    workers as memory-mapped arrays rather than copied into each task.
+
+    Parameters
+    ----------
+    :param data: a list of hypertools-compatible datasets (one per subject), with timepoints as rows
+    :param models: a list of aligners to compare (strings, Aligner subclasses or objects, or dictionaries with
+      'model', 'args', and 'kwargs' fields).  Default: HyperAlign, SharedResponseModel,
+      DeterministicSharedResponseModel, and RobustSharedResponseModel.
+    :param kwargs: keyword arguments are first passed to datawrangler.decorate.funnel, and any remaining arguments
+      override the defaults in the [time_segment_matching] section of config.ini:
+        - n_folds: number of (contiguous) cross-validation folds (default: 2)
+        - segment_length: number of timepoints per segment (default: 6)
+        - n_jobs: number of parallel workers (default: -1, i.e., one worker per core)
+        - backend: joblib backend used to run the workers (default: 'loky')
+
+    Returns
+    -------
+    :return: a DataFrame (indexed by model and fold) containing the mean classification accuracy, fit time, and
+      transform time (in seconds) for each model and fold
+    """
+    opts = dw.core.update_dict(eval_dict(get_default_options()['time_segment_matching']), kwargs)
+    if models is None:
+        models = ['HyperAlign', 'SharedResponseModel', 'DeterministicSharedResponseModel',
+                  'RobustSharedResponseModel']
+    elif type(models) is not list:
+        models = [models]
+
+    assert type(data) is list and len(data) > 1, ValueError('data must contain at least two subjects')
+    data = [np.ascontiguousarray(d.values, dtype=float) for d in trim_and_pad(data)]
+    folds = np.array_split(np.arange(data[0].shape[0]), opts['n_folds'])
+
+    results = Parallel(n_jobs=opts['n_jobs'], backend=opts['backend'])(
+        delayed(evaluate_fold)(data, m, f, opts['segment_length']) for m in models for f in folds)
+
+    for i, r in enumerate(results):
+        r['fold'] = i % len(folds)
+    return pd.DataFrame(results).set_index(['model', 'fold'])
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from ..io import load
+
+
+def load_subject(x):
+    """
+    Load a single subject's data as a 2D numpy array.  Filenames ending in .npy are memory-mapped (so that only the
+    parts of the file that are used are read from disk); other filenames are loaded using hypertools.load.
+    """
+    if type(x) is str:
+        if x.endswith('.npy'):
+            x = np.load(x, mmap_mode='r')
+        else:
+            x = load(x)
+
+    if hasattr(x, 'values'):
+        x = x.values
+    x = np.asarray(x)
+    assert x.ndim == 2, ValueError(f'each subject\'s data must be a 2D matrix (given shape: {x.shape})')
+    return x
+
+
+def zscore_columns(x):
+    z = x - np.mean(x, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z /= np.sqrt(np.sum(z ** 2, axis=0))
+    return z
+
+
+def column_correlations(x, y):
+    """
+    Compute the Pearson correlation between each column of x and the corresponding column of y
+    """
+    return np.sum(zscore_columns(x) * zscore_columns(y), axis=0)
+
+
+def cross_correlations(x, y):
+    """
+    Compute the (symmetrized) correlations between every column of x and every column of y
+    """
+    r = np.dot(zscore_columns(x).T, zscore_columns(y))
+    return (r + r.T) / 2
+
+
+def leave_one_out(data, kernel):
+    """
+    Apply a kernel function to each subject's data and the mean of all *other* subjects' data.  The leave-one-out
+    means are computed from a single running sum, so that each subject's data are read exactly twice (once to
+    accumulate the sum and once to apply the kernel).  Iterables of subjects (e.g., generators of filenames) are
+    materialized first, since they are traversed twice.
+    """
+    data = list(data)
+    total = None
+    n = 0
+    for x in data:
+        x = load_subject(x)
+        if total is None:
+            total = x.astype(float)
+        else:
+            assert x.shape == total.shape, ValueError(f'all subjects must have the same shape (expected '
+                                                      f'{total.shape}, found {x.shape})')
+            total += x
+        n += 1
+    assert n > 1, ValueError('intersubject correlations require at least two subjects')
+
+    results = []
+    for x in data:
+        x = load_subject(x).astype(float)
+        results.append(kernel(x, (total - x) / (n - 1)))
+    return results
+
+
+def summarize(r, summary=None):
+    if summary is None:
+        return r
+    elif summary == 'mean':
+        with np.errstate(divide='ignore'):
+            return np.tanh(np.nanmean(np.arctanh(np.clip(r, -1, 1)), axis=0))
+    elif summary == 'median':
+        return np.nanmedian(r, axis=0)
+    raise ValueError(f'unknown summary: {summary}')
+
+
+def isc(data, summary=None):
+    """
+    Compute the leave-one-out intersubject correlation (ISC) of each feature.  Each subject's data are correlated
+    (feature by feature) with the mean of the remaining subjects' data.
+
+    Parameters
+    ----------
+    :param data: a list of same-shaped number-of-observations by number-of-features datasets (e.g., the output of
+      align), or any other iterable of subjects (e.g., a generator).  Subjects may also be specified as filenames, in
+      which case they are streamed from disk (.npy files are memory-mapped) rather than held in memory simultaneously.
+    :param summary: one of None (default; return each subject's correlations), 'mean' (the Fisher z-transformed mean
+      across subjects), or 'median'
+
+    Returns
+    -------
+    :return: a number-of-subjects by number-of-features DataFrame of correlations (or a Series of summarized
+      correlations, if a summary is specified)
+    """
+    r = np.vstack(leave_one_out(data, column_correlations))
+    if summary is None:
+        return pd.DataFrame(r)
+    return pd.Series(summarize(r, summary=summary))
+
+
+def isfc(data, summary=None):
+    """
+    Compute the leave-one-out intersubject functional correlation (ISFC) matrix.  Each subject's features are
+    correlated with every feature of the mean of the remaining subjects' data, and the resulting matrices are
+    symmetrized.
+
+    Parameters
+    ----------
+    :param data: a list of same-shaped number-of-observations by number-of-features datasets, or filenames (see isc)
+    :param summary: one of None (default; return each subject's matrix), 'mean' (the Fisher z-transformed mean
+      across subjects), or 'median'
+
+    Returns
+    -------
+    :return: a list of number-of-features by number-of-features DataFrames (one per subject), or a single DataFrame
+      if a summary is specified
+    """
+    r = np.stack(leave_one_out(data, cross_correlations), axis=0)
+    if summary is None:
+        return [pd.DataFrame(x) for x in r]
+    return pd.DataFrame(summarize(r, summary=summary))
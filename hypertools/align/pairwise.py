@@ -0,0 +1,138 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+from .common import trim_and_pad
+
+from ..core import get_default_options, eval_dict
+
+
+def rotation(source, target, reflection=True):
+    """
+    Compute the optimal orthogonal mapping from one (normalized) matrix onto another
+
+    Parameters
+    ----------
+    :param source: a number-of-observations by number-of-features numpy array
+    :param target: a numpy array with the same shape as source
+    :param reflection: if False, constrain the mapping to be a proper rotation (default: True)
+
+    Returns
+    -------
+    :return: a tuple containing the orthogonal mapping (source.dot(t) approximates target, up to scale) and the
+      sum of the (possibly sign-corrected) singular values of target.T.dot(source)
+    """
+    u, s, vh = np.linalg.svd(np.dot(target.T, source), full_matrices=False)
+    t = np.dot(vh.T, u.T)
+
+    if not reflection and np.linalg.det(t) < 0:
+        vh[-1, :] *= -1
+        s[-1] *= -1
+        t = np.dot(vh.T, u.T)
+    return t, np.sum(s)
+
+
+def correlation(x, y):
+    """
+    Compute the Pearson correlation between two (flattened) matrices
+    """
+    x = np.ravel(x) - np.mean(x)
+    y = np.ravel(y) - np.mean(y)
+    return np.dot(x, y) / np.sqrt(np.dot(x, x) * np.dot(y, y))
+
+
+def align_pairs(normed, norms, pairs, metric='disparity', scaling=True, reflection=True, return_projections=False):
+    results = []
+    for i, j in pairs:
+        t, trace = rotation(normed[i], normed[j], reflection=reflection)
+
+        if metric == 'disparity':
+            if scaling:
+                score = 1 - trace ** 2
+            else:
+                score = 2 - 2 * trace
+            scores = (score, score)
+        else:
+            scores = (correlation(np.dot(normed[i], t), normed[j]), correlation(np.dot(normed[j], t.T), normed[i]))
+
+        if return_projections:
+            if scaling:
+                projections = (trace * norms[j] / norms[i] * t, trace * norms[i] / norms[j] * t.T)
+            else:
+                projections = (t, t.T)
+        else:
+            projections = None
+        results.append((i, j, scores, projections))
+    return results
+
+
+@dw.decorate.funnel
+def pairwise_alignment(data, metric='disparity', return_projections=False, **kwargs):
+    """
+    Compute the quality of the Procrustean alignment between every pair of datasets.  Each dataset is normalized
+    once, and only the upper triangle of the pairwise matrix is fit (the optimal mapping from dataset j onto dataset
+    i is the inverse of the mapping from i onto j).  Pairs are split into batches and fit in parallel.
+
+    Parameters
+    ----------
+    :param data: a list of hypertools-compatible datasets.  Datasets are trimmed to their common rows and padded to
+      a common number of columns (as in align).
+    :param metric: one of 'disparity' (default; the sum of squared differences between the aligned datasets, after
+      scaling each to unit Frobenius norm) or 'correlation' (the correlation between each aligned dataset and its
+      target).  The datasets are not centered (so that the projections map the original data onto each other), so
+      disparities match those of scipy.spatial.procrustes only for mean-centered data.
+    :param return_projections: if True, also return the fitted projections (default: False)
+    :param kwargs: keyword arguments are first passed to datawrangler.decorate.funnel, and any remaining arguments
+      override the defaults in the [pairwise_alignment] section of config.ini:
+        - scaling: allow the mappings to scale the data (default: True)
+        - reflection: allow the mappings to include reflections (default: True)
+        - n_jobs: number of parallel workers (default: -1, i.e., one worker per core)
+        - backend: joblib backend used to run the workers (default: 'loky')
+
+    Returns
+    -------
+    :return: a number-of-datasets by number-of-datasets DataFrame whose entry (i, j) reflects how well dataset i
+      can be aligned to dataset j.  If return_projections is True, a nested list of projections is also returned,
+      where projections[i][j] maps dataset i onto dataset j (i.e., data[i].dot(projections[i][j]) approximates
+      data[j]).
+    """
+    opts = dw.core.update_dict(eval_dict(get_default_options()['pairwise_alignment']), kwargs)
+    assert metric in ['disparity', 'correlation'], ValueError(f'unknown metric: {metric}')
+
+    if type(data) is not list:
+        data = [data]
+    data = trim_and_pad(data)
+
+    n = len(data)
+    x = [d.values.astype(float) for d in data]
+    norms = [np.linalg.norm(d) for d in x]
+    for i, norm in enumerate(norms):
+        if norm <= np.finfo(x[i].dtype).eps:
+            raise ValueError(f'dataset {i} is invariant; cannot compute alignment')
+    normed = [d / norm for d, norm in zip(x, norms)]
+
+    pairs = np.vstack(np.triu_indices(n, k=1)).T
+    n_batches = max(1, min(len(pairs), 4 * effective_n_jobs(opts['n_jobs'])))
+    batches = [b for b in np.array_split(pairs, n_batches) if len(b) > 0]
+
+    results = Parallel(n_jobs=opts['n_jobs'], backend=opts['backend'])(
+        delayed(align_pairs)(normed, norms, b, metric=metric, scaling=opts['scaling'],
+                             reflection=opts['reflection'], return_projections=return_projections)
+        for b in batches)
+
+    scores = np.zeros([n, n]) if metric == 'disparity' else np.eye(n)
+    projections = [[None] * n for _ in range(n)]
+    for i, j, (s_ij, s_ji), p in [r for batch in results for r in batch]:
+        scores[i, j] = s_ij
+        scores[j, i] = s_ji
+        if return_projections:
+            projections[i][j], projections[j][i] = p
+
+    scores = pd.DataFrame(scores)
+    if return_projections:
+        for i in range(n):
+            projections[i][i] = np.eye(x[i].shape[1])
+        return scores, projections
+    return scores
@@ -0,0 +1,116 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from joblib import Parallel, delayed
+
+from .common import Aligner
+from .hyperalign import fitter as hyperalign_fitter
+from .procrustes import align
+
+from ..core import get_default_options, eval_dict
+
+
+def get_blocks(n_features, blocks=None, block_size=100):
+    """
+    Partition a set of features (columns) into blocks
+
+    Parameters
+    ----------
+    :param n_features: the total number of features
+    :param blocks: one of None (default; divide the features into contiguous blocks of approximately block_size
+      features), an integer (divide the features into that many contiguous blocks), or a list of lists of
+      (non-overlapping) column indices.  Any features that are not included in a block are left unaligned.
+    :param block_size: the approximate number of features per block, when blocks is None (default: 100)
+
+    Returns
+    -------
+    :return: a list of numpy arrays of column indices (one per block)
+    """
+    if blocks is None:
+        blocks = int(np.ceil(n_features / block_size))
+
+    if isinstance(blocks, (int, np.integer)):
+        assert 0 < blocks <= n_features, ValueError(f'cannot divide {n_features} features into {blocks} blocks')
+        return np.array_split(np.arange(n_features), blocks)
+
+    blocks = [np.asarray(b, dtype=int) for b in blocks]
+    assigned = np.concatenate(blocks)
+    assert np.all((assigned >= 0) & (assigned < n_features)), ValueError('block indices must be valid column indices')
+    assert len(np.unique(assigned)) == len(assigned), ValueError('blocks may not overlap')
+    return blocks
+
+
+def fit_block(data, model='HyperAlign', n_iter=10):
+    """
+    Align a single block of features across datasets and return a list of projection matrices (one per dataset)
+    """
+    if model == 'HyperAlign' and n_iter > 0 and len(data) > 1:
+        return [p.proj[0] for p in hyperalign_fitter(data, n_iter=n_iter)['proj']]
+    elif model == 'Procrustes':
+        opts = eval_dict(get_default_options()['Procrustes'])
+        opts.pop('target', None)
+        return [align(d, data[0], **opts) for d in data]
+    elif model == 'HyperAlign':
+        return [np.eye(d.shape[1]) for d in data]
+    raise ValueError(f'unsupported block model: {model}')
+
+
+def fitter(data, blocks=None, block_size=100, model='HyperAlign', n_iter=10, n_jobs=-1, backend='loky'):
+    assert type(data) is list, "data must be specified as a list"
+
+    n_features = data[0].shape[1]
+    blocks = get_blocks(n_features, blocks=blocks, block_size=block_size)
+
+    block_projs = Parallel(n_jobs=n_jobs, backend=backend)(
+        delayed(fit_block)([pd.DataFrame(d.values[:, b]) for d in data], model=model, n_iter=n_iter)
+        for b in blocks)
+
+    # assemble the block-diagonal projections (features outside of any block map onto themselves)
+    unassigned = np.setdiff1d(np.arange(n_features), np.concatenate(blocks))
+    proj = []
+    for i in range(len(data)):
+        rows = [np.repeat(b, len(b)) for b in blocks]
+        cols = [np.tile(b, len(b)) for b in blocks]
+        vals = [np.ravel(p[i]) for p in block_projs]
+        proj.append(sparse.csr_matrix((np.concatenate([*vals, np.ones(len(unassigned))]),
+                                       (np.concatenate([*rows, unassigned]), np.concatenate([*cols, unassigned]))),
+                                      shape=(n_features, n_features)))
+    return {'proj': proj, 'blocks': blocks}
+
+
+# noinspection PyUnusedLocal
+def transformer(data, proj=None, **kwargs):
+    assert proj is not None, "Transformer needs to be trained before use."
+    assert type(data) is list, "Data must be a list"
+    assert len(proj) == len(data), "Must have one projection per data matrix"
+    return [pd.DataFrame(data=np.asarray(d.values @ p), index=d.index) for p, d in zip(proj, data)]
+
+
+class PiecewiseHyperAlign(Aligner):
+    """
+    Base class for PiecewiseHyperAlign objects.  Features are partitioned into blocks (regions), each block is
+    aligned independently (in parallel), and the per-block projections are assembled into a sparse block-diagonal
+    projection for each dataset.  Takes the following keyword arguments:
+
+    :param blocks: None (default; contiguous blocks of approximately block_size features), an integer number of
+      contiguous blocks, or a list of lists of column indices
+    :param block_size: approximate number of features per block when blocks is None (default: 100)
+    :param model: how to align each block: 'HyperAlign' (default) or 'Procrustes'
+    :param n_iter: number of hyperalignment iterations (default: 10)
+    :param n_jobs: number of parallel workers (default: -1, i.e., one worker per core)
+    :param backend: joblib backend used to run the workers (default: 'loky')
+    """
+    def __init__(self, **kwargs):
+        opts = dw.core.update_dict(eval_dict(get_default_options()['PiecewiseHyperAlign']), kwargs)
+        assert opts['n_iter'] >= 0, 'Number of iterations must be non-negative'
+        required = ['proj', 'blocks']
+        super().__init__(required=required, fitter=fitter, transformer=transformer, data=None, **opts)
+
+        for k, v in opts.items():
+            setattr(self, k, v)
+        self.required = required
+        self.fitter = fitter
+        self.transformer = transformer
+        self.data = None
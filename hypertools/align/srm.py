@@ -31,7 +31,7 @@ def transformer(data, **kwargs):
     if model is None:
         raise NotFittedError('aligner model must be fit before data can be transformed')
 
-    return [pd.DataFrame(j.T, index=i) for i, j in zip(kwargs['indices'], model.transform([i.values.T for i in data]))]
+    return [pd.DataFrame(j.T, index=d.index) for d, j in zip(data, model.transform([d.values.T for d in data]))]
 
 
 def srm_fitter(data, **kwargs):
@@ -1 +1,2 @@
 from .cluster import cluster
+from .sweep import cluster_sweep
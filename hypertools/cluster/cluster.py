@@ -1,18 +1,55 @@
 # noinspection PyPackageRequirements
 import datawrangler as dw
 import pandas as pd
+from scipy import sparse
 
-from ..core import apply_model, get_default_options, eval_dict
+from ..core import apply_model, apply_neighbors_model, get_default_options, eval_dict, neighbor_options, apply_unique, \
+    dedup_options
+from .stream import stream_cluster
+from .subsample import subsample_cluster
+
+
+def cluster_stacked(data, model='KMeans', **kwargs):
+    # duplicate rows: cluster the distinct rows (weighted by their counts, if supported), and copy their labels to their
+    # duplicates
+    if dedup_options(kwargs.pop('dedup', None))['enabled']:
+        return apply_unique(cluster_stacked, data, model=model, dedup=False, **kwargs)
+
+    # subsample mode: fit the model to a subset of the observations and assign the rest to the fitted clusters
+    fit_sample = kwargs.pop('fit_sample', None)
+    fit_sample_opts = {k: kwargs.pop(k) for k in list(kwargs.keys()) if k.startswith('fit_sample_')}
+    if (fit_sample is not None) and (fit_sample < data.shape[0]):
+        return subsample_cluster(data, model, cluster_stacked, fit_sample=fit_sample, **fit_sample_opts, **kwargs)
+
+    search = ['sklearn.cluster', 'sklearn.mixture']
+    return_model = kwargs.pop('return_model', False)
+    use_neighbor_cache = neighbor_options(kwargs.pop('neighbor_cache', None))['enabled']
+    kwargs = dw.core.update_dict(eval_dict(get_default_options()['cluster']), kwargs)
+
+    # models that build nearest neighbor graphs can share cached graphs (see hypertools.core.neighbors)
+    result = None
+    if use_neighbor_cache:
+        result = apply_neighbors_model(data, model, search=search, return_model=True, **kwargs)
+    if result is None:
+        result = apply_model(data, model, search=search, return_model=True, **kwargs)
+    labels, info = result
+    labels = pd.DataFrame(labels, index=None if sparse.issparse(data) else data.index)
+
+    if len(labels) == 1:
+        labels = labels[0]
+    if return_model:
+        return labels, info
+    return labels
 
 
-@dw.decorate.apply_stacked
 def cluster(data, model='KMeans', **kwargs):
     """
     Cluster the data and return a list of cluster labels
 
     Parameters
     ----------
-    :param data: any hypertools-compatible dataset
+    :param data: any hypertools-compatible dataset.  scipy.sparse matrices (e.g., bag-of-words or one-hot encoded data)
+      are passed to the model without being densified (supported by, e.g., KMeans, MiniBatchKMeans, Birch, and DBSCAN).
     :param model: a string containing the name of any of the following scikit-learn (or compatible) models (default:
       'KMeans'):
        - A discrete cluster model: https://scikit-learn.org/stable/modules/classes.html#module-sklearn.cluster
@@ -24,17 +61,26 @@ def cluster(data, model='KMeans', **kwargs):
          - 'kwargs': a list of named keyword arguments
     :param kwargs: keyword arguments are first passed to datawrangler.decorate.funnel, and any remaining arguments
       are passed onto the model initialization function.  Keyword arguments override any model-specific parameters.
+      Pass neighbor_cache=True (or False) to override whether models that build nearest neighbor graphs (e.g.,
+      SpectralClustering) use the shared neighbor graph cache (see the [neighbors] section of config.ini), and
+      dedup=True (or False) to override whether duplicate rows are collapsed before clustering (see the [dedup]
+      section of config.ini).  Pass fit_sample=n to fit the model to a (stratified) subsample of n observations and
+      assign the remaining observations to the fitted clusters, in parallel chunks (see the [fit_sample] section of
+      config.ini); models without a predict method (e.g., AgglomerativeClustering and DBSCAN) assign each remaining
+      observation the label of its nearest neighbor in the subsample.  Pass return_model=True to also return the
+      fitted model.  Pass stream=True to cluster data that are too large to load into memory (e.g., memory-mapped
+      arrays, or a function that returns an iterator over chunks read from disk) with a model that supports partial_fit
+      (MiniBatchKMeans, the default in streaming mode, or Birch); see hypertools.cluster.stream.stream_cluster.
 
     Returns
     -------
-    :return: a DataFrame (or list of DataFrames) containing the cluster labels or mixture proportions
+    :return: a DataFrame (or list of DataFrames) containing the cluster labels or mixture proportions (and the fitted
+      model information, if return_model is True)
     """
-    labels = apply_model(data, model, search=['sklearn.cluster', 'sklearn.mixture'],
-                         **dw.core.update_dict(eval_dict(get_default_options()['cluster']), kwargs))
-    labels = pd.DataFrame(labels, index=data.index)
-
-    if len(labels) == 1:
-        return labels[0]
-    else:
-        return labels
+    # streaming mode: fit the model over chunks of the data (which are never stacked), and then label each chunk
+    if kwargs.pop('stream', False):
+        return stream_cluster(data, model='MiniBatchKMeans' if model == 'KMeans' else model, **kwargs)
 
+    if sparse.issparse(data):
+        return cluster_stacked(sparse.csr_matrix(data), model=model, **kwargs)
+    return dw.decorate.apply_stacked(cluster_stacked)(data, model=model, **kwargs)
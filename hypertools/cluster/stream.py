@@ -0,0 +1,126 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+
+from ..core import get_default_options, eval_dict, get_model, chunks
+
+
+def get_stream(data):
+    """
+    Return a function that starts a new pass over a dataset.  Arrays (including memory-mapped arrays), DataFrames, and
+    lists of chunks can be traversed repeatedly; chunk iterators are traversed once per call of a function that returns
+    a new iterator.
+    """
+    if callable(data):
+        return data
+    assert hasattr(data, 'shape') or (iter(data) is not data), \
+        ValueError('streams can only be traversed once; pass a function that returns a new chunk iterator instead')
+    return lambda: data
+
+
+def predict_chunks(fitted, data, batch_size=None):
+    """
+    Assign a dataset to the fitted model's clusters, one chunk at a time
+
+    Parameters
+    ----------
+    :param fitted: a fitted clustering model with a predict method
+    :param data: a 2D array (including memory-mapped arrays) or DataFrame, or an iterable of arrays or DataFrames
+    :param batch_size: the maximum number of rows per chunk (default: None; arrays are labeled whole, and each item of
+      an iterable is its own chunk)
+
+    Returns
+    -------
+    :return: a generator of (1D) label arrays, one per chunk
+    """
+    for chunk in chunks(data, batch_size):
+        yield fitted.predict(chunk)
+
+
+def stream_cluster(data, model='MiniBatchKMeans', out=None, return_model=False, **kwargs):
+    """
+    Cluster a dataset that is too large to load into memory.  The model is fit incrementally (via its partial_fit
+    method) over chunks of the data, and then a second pass assigns each chunk to the fitted clusters, so that only
+    one chunk is held in memory at a time.  Options are set in the [stream] section of config.ini (and may be
+    overridden via keyword arguments):
+        - batch_size: the maximum number of rows per chunk (None: arrays are processed whole, and each item of an
+          iterable is its own chunk)
+        - n_epochs: the number of passes over the data used to fit the model
+
+    Parameters
+    ----------
+    :param data: a 2D array (including memory-mapped arrays) or DataFrame, a list of arrays or DataFrames (treated as
+      separate datasets, as in cluster), or a function that returns a new iterator over arrays or DataFrames (e.g.,
+      chunks of a single dataset, read from disk) each time it is called
+    :param model: a clustering model that supports partial_fit, e.g. 'MiniBatchKMeans' (default) or 'Birch'.  Models
+      may also be specified as dictionaries with 'model', 'args', and 'kwargs' fields.
+    :param out: where to write the labels: None (default; return a DataFrame), the path of a .npy file (created as a
+      memory-mapped array), or a 1D array (or memory-mapped array) with one entry per observation
+    :param return_model: if True, also return the fitted model information (default: False)
+    :param kwargs: keyword arguments passed to the model's initializer, along with any [stream] options
+
+    Returns
+    -------
+    :return: the cluster labels (a DataFrame, or a list of DataFrames if data is a list; or the array they were
+      written to, with one entry per row of the stacked datasets), and the fitted model information if return_model
+      is True
+    """
+    opts = eval_dict(get_default_options()['stream'])
+    for k in opts.keys():
+        if k in kwargs.keys():
+            opts[k] = kwargs.pop(k)
+
+    if type(model) is dict:
+        kwargs = dw.core.update_dict(model['kwargs'], kwargs)
+        args = model['args']
+        model = model['model']
+    else:
+        args = []
+    fitted = dw.core.apply_defaults(get_model(model, search=['sklearn.cluster']), get_default_options())(*args,
+                                                                                                         **kwargs)
+    assert hasattr(fitted, 'partial_fit'), ValueError(f'streaming requires a model that supports partial_fit '
+                                                      f'(e.g., MiniBatchKMeans or Birch): {model}')
+
+    # Birch's global clustering step is deferred until every chunk has been added to its tree
+    n_clusters = None
+    if type(fitted).__name__ == 'Birch':
+        n_clusters = fitted.n_clusters
+        fitted.set_params(n_clusters=None)
+
+    stream = get_stream(data)
+    n_rows = 0
+    for epoch in range(opts['n_epochs']):
+        for chunk in chunks(stream(), opts['batch_size']):
+            fitted.partial_fit(chunk)
+            if epoch == 0:
+                n_rows += chunk.shape[0]
+
+    if n_clusters is not None:
+        fitted.set_params(n_clusters=n_clusters)
+        fitted.partial_fit()
+
+    if out is None:
+        labels = np.empty(n_rows, dtype=int)
+    elif type(out) is str:
+        labels = np.lib.format.open_memmap(out, mode='w+', dtype=int, shape=(n_rows,))
+    else:
+        labels = out
+        assert labels.shape[0] == n_rows, ValueError(f'out has {labels.shape[0]} rows, but the data have {n_rows}')
+
+    start = 0
+    for chunk_labels in predict_chunks(fitted, stream(), opts['batch_size']):
+        labels[start:(start + len(chunk_labels))] = chunk_labels
+        start += len(chunk_labels)
+    if isinstance(labels, np.memmap):
+        labels.flush()
+
+    if (out is None) and (type(data) is list):  # one DataFrame of labels per dataset
+        ends = np.cumsum([d.shape[0] for d in data])
+        labels = [pd.DataFrame(x, index=d.index if dw.zoo.is_dataframe(d) else None)
+                  for x, d in zip(np.split(labels, ends[:-1]), data)]
+    elif out is None:
+        labels = pd.DataFrame(labels, index=data.index if dw.zoo.is_dataframe(data) else None)
+    if return_model:
+        return labels, {'model': fitted, 'args': args, 'kwargs': kwargs}
+    return labels
@@ -0,0 +1,105 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy import sparse
+from sklearn.neighbors import NearestNeighbors
+
+from ..core import get_default_options, eval_dict, sample_rows
+from ..core.model import get_sklearn_method
+from ..core.neighbors import get_metric
+
+
+def get_assigner(fitted, mode, sample, labels):
+    """
+    Return a function that assigns new observations to clusters: the fitted model's own predict (or predict_proba)
+    method, if it has one (e.g., KMeans, MiniBatchKMeans, Birch, MeanShift, and mixture models); otherwise (e.g., for
+    AgglomerativeClustering, DBSCAN, OPTICS, and SpectralClustering) each observation is assigned the label (or mixture
+    proportions) of its nearest neighbor in the fitted subsample
+
+    Parameters
+    ----------
+    :param fitted: the fitted model
+    :param mode: the mode the model was fit with (e.g., 'fit_predict' or 'fit_predict_proba')
+    :param sample: the subsample the model was fit to
+    :param labels: the subsample's labels (or mixture proportions)
+
+    Returns
+    -------
+    :return: a tuple (f, inductive), where f is a function that maps a number-of-observations by number-of-features
+      array onto labels (or mixture proportions), and inductive is True if f is the model's own method
+    """
+    try:
+        f = get_sklearn_method(fitted, mode.replace('fit_', ''))
+    except ValueError:
+        f = None
+    if callable(f) and not f.__name__.startswith('fit'):
+        return f, True
+
+    metric = get_metric(fitted)
+    search = NearestNeighbors(n_neighbors=1, metric='euclidean' if metric in [None, 'precomputed'] else metric)
+    search.fit(sample)
+    return (lambda x: labels[search.kneighbors(x, return_distance=False)[:, 0]]), False
+
+
+def subsample_cluster(data, model, clusterer, fit_sample=10000, return_model=False, **kwargs):
+    """
+    Cluster a (stacked) dataset by fitting the given model to a subsample of its observations, and then assigning every
+    other observation to a cluster (see get_assigner).  Observations are assigned in chunks, in parallel.  Options are
+    set in the [fit_sample] section of config.ini (and may be overridden via keyword arguments prefixed with
+    "fit_sample_", e.g. fit_sample_method='random'):
+        - method: how the subsample is selected (see hypertools.core.sample_rows)
+        - chunk_size: number of observations assigned at a time, per worker
+        - n_jobs: number of parallel workers
+        - backend: joblib backend used to run the workers (the default, 'threading', shares one copy of the data)
+        - random_state: seed used to select the subsample
+
+    Parameters
+    ----------
+    :param data: a (possibly MultiIndex) DataFrame or a scipy.sparse (CSR) matrix
+    :param model: a single clustering model (string, class, or dictionary)
+    :param clusterer: the cluster function used to fit the model to the subsample
+    :param fit_sample: the number of observations the model is fit to (default: 10000)
+    :param return_model: if True, also return the fitted model, along with the subsample's indices and whether the
+      remaining observations were assigned using the model's own predict method ('inductive')
+    :param kwargs: keyword arguments passed to the clusterer, along with any fit_sample options
+
+    Returns
+    -------
+    :return: a DataFrame of cluster labels or mixture proportions (and the fitted model information, if return_model
+      is True)
+    """
+    assert type(model) is not list, ValueError('fit_sample mode supports only a single clustering model')
+    opts = eval_dict(get_default_options()['fit_sample'])
+    for k in list(kwargs.keys()):
+        if k.startswith('fit_sample_'):
+            opts[k[len('fit_sample_'):]] = kwargs.pop(k)
+
+    inds = sample_rows(data, fit_sample, method=opts['method'], random_state=opts['random_state'])
+    is_sparse = sparse.issparse(data)
+    if kwargs.get('sample_weight', None) is not None:
+        kwargs['sample_weight'] = np.asarray(kwargs['sample_weight'])[inds]
+
+    values = data if is_sparse else data.values
+    sample_labels, info = clusterer(data[inds] if is_sparse else data.iloc[inds], model=model, return_model=True,
+                                    **kwargs)
+    sample_labels = np.asarray(sample_labels)
+
+    mode = dw.core.update_dict(eval_dict(get_default_options()['cluster']), kwargs)['mode']
+    assign, inductive = get_assigner(info['model'], mode, values[inds], sample_labels)
+
+    others = np.setdiff1d(np.arange(data.shape[0]), inds)
+    chunk_size = max(1, min(opts['chunk_size'], int(np.ceil(len(others) / effective_n_jobs(opts['n_jobs'])))))
+    chunks = [others[start:(start + chunk_size)] for start in range(0, len(others), chunk_size)]
+    assigned = Parallel(n_jobs=opts['n_jobs'], backend=opts['backend'])(delayed(assign)(values[c]) for c in chunks)
+
+    labels = np.empty([data.shape[0], *sample_labels.shape[1:]], dtype=sample_labels.dtype)
+    labels[inds] = sample_labels
+    for c, x in zip(chunks, assigned):
+        labels[c] = np.asarray(x).reshape([len(c), *sample_labels.shape[1:]])
+
+    labels = pd.DataFrame(labels, index=None if is_sparse else data.index)
+    if return_model:
+        return labels, dw.core.update_dict(info, {'fit_sample': inds, 'inductive': inductive})
+    return labels
@@ -0,0 +1,185 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import inspect
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.metrics import silhouette_score
+
+from ..core import get_default_options, eval_dict, get_model, sample_rows
+from ..core.model import get_sklearn_method
+from ..core.neighbors import get_model_name
+
+search = ['sklearn.cluster', 'sklearn.mixture']
+
+# the best candidate maximizes (silhouette) or minimizes (bic, inertia) each selection criterion
+criteria = {'silhouette': np.argmax, 'bic': np.argmin, 'inertia': np.argmin}
+
+
+def get_candidates(models, n_clusters, covariance_types, random_state=None):
+    """
+    Expand a list of models into a grid of candidate models: one per number of clusters (for models with an
+    n_clusters or n_components parameter) and covariance type (for models with a covariance_type parameter)
+    """
+    candidates = []
+    for m in models:
+        if type(m) is dict:
+            model, args, kwargs = m['model'], m['args'], m['kwargs']
+        else:
+            model, args, kwargs = m, [], {}
+
+        params = inspect.signature(get_model(model, search=search)).parameters.keys()
+        k_param = next((p for p in ['n_clusters', 'n_components'] if p in params), None)
+        for k in (n_clusters if k_param is not None else [None]):
+            for c in (covariance_types if 'covariance_type' in params else [None]):
+                candidate_kwargs = kwargs.copy()
+                if k is not None:
+                    candidate_kwargs[k_param] = k
+                if c is not None:
+                    candidate_kwargs['covariance_type'] = c
+                if ('random_state' in params) and ('random_state' not in kwargs.keys()):
+                    candidate_kwargs['random_state'] = random_state
+
+                candidates.append({'model': model, 'args': args, 'kwargs': candidate_kwargs,
+                                   'n_clusters': k, 'covariance_type': c})
+    return candidates
+
+
+def inertia(values, labels):
+    """
+    Compute the sum of squared distances between each observation and the centroid of its cluster
+    """
+    groups, inds = np.unique(labels, return_inverse=True)
+    membership = sparse.csr_matrix((np.ones(len(inds)), (np.arange(len(inds)), np.ravel(inds))),
+                                   shape=(len(inds), len(groups)))
+    sums = membership.T @ values
+    if sparse.issparse(sums):
+        sums = sums.toarray()
+    squared_norms = values.multiply(values).sum() if sparse.issparse(values) else np.sum(values ** 2)
+    return float(squared_norms - np.sum(np.sum(sums ** 2, axis=1) / np.asarray(membership.sum(axis=0)).ravel()))
+
+
+def fit_candidate(values, candidate, sample):
+    """
+    Fit a candidate model and score its clusters.  Candidates that cannot be fit (e.g., models that require dense data,
+    given a sparse matrix) are given NaN scores, along with the error message.
+
+    Parameters
+    ----------
+    :param values: a number-of-observations by number-of-features array or scipy.sparse matrix
+    :param candidate: a candidate model (see get_candidates)
+    :param sample: indices of the observations used to compute the silhouette score
+
+    Returns
+    -------
+    :return: a tuple (scores, labels), where scores is a dictionary and labels is an array of cluster labels (or None,
+      if the candidate could not be fit)
+    """
+    scores = {'model': get_model_name(candidate['model']), 'n_clusters': candidate['n_clusters'],
+              'covariance_type': candidate['covariance_type'], 'inertia': np.nan, 'bic': np.nan,
+              'silhouette': np.nan, 'error': None}
+    try:
+        model = dw.core.apply_defaults(get_model(candidate['model'], search=search),
+                                       get_default_options())(*candidate['args'], **candidate['kwargs'])
+        labels = np.asarray(get_sklearn_method(model, 'fit_predict')(values)).ravel()
+    except Exception as e:
+        scores['error'] = f'{type(e).__name__}: {e}'
+        return scores, None
+
+    n_labels = len(np.unique(labels[sample]))
+    if candidate['n_clusters'] is None:
+        scores['n_clusters'] = len(np.unique(labels))
+    scores['inertia'] = inertia(values, labels)
+    scores['bic'] = model.bic(values) if hasattr(model, 'bic') else np.nan
+    scores['silhouette'] = silhouette_score(values[sample], labels[sample]) if 1 < n_labels < len(sample) else np.nan
+    return scores, labels
+
+
+def cluster_sweep(data, models=None, n_clusters=None, covariance_types=None, criterion='silhouette', **kwargs):
+    """
+    Fit a grid of clustering models (e.g., to choose the number of clusters) in parallel, and score each model's
+    clusters.  The data are wrangled and stacked once, and every worker shares a single read-only copy (joblib
+    memory-maps large arrays rather than copying them to each worker).  Each model is scored by:
+        - inertia: the sum of squared distances between each observation and the centroid of its cluster
+        - bic: the Bayesian information criterion (mixture models only)
+        - silhouette: the mean silhouette coefficient, computed on a (stratified) subsample of the observations that
+          is shared across models
+    Candidates that cannot be fit (e.g., GaussianMixture models, given sparse data) are given NaN scores, and the
+    error is recorded in the scores' error column.
+
+    Parameters
+    ----------
+    :param data: any hypertools-compatible dataset, or a scipy.sparse matrix
+    :param models: a list of clustering models (strings, classes, or dictionaries; default: ['KMeans',
+      'GaussianMixture'])
+    :param n_clusters: the numbers of clusters to try, for models with an n_clusters (or n_components) parameter
+      (default: 2 through 10)
+    :param covariance_types: the covariance types to try, for models with a covariance_type parameter (default:
+      ['full'])
+    :param criterion: the score used to select the best model: 'silhouette' (default; largest is best), 'bic', or
+      'inertia' (smallest is best).  Candidates without a score (e.g., the bic of non-mixture models) are ignored.
+    :param kwargs: keyword arguments are first passed to datawrangler.decorate.funnel, and any remaining arguments
+      override the defaults in the [cluster_sweep] section of config.ini:
+        - silhouette_sample: number of observations used to compute silhouette scores
+        - n_jobs: number of parallel workers (default: -1, i.e., one worker per core)
+        - backend: joblib backend used to run the workers (default: 'loky')
+        - random_state: seed used to select the silhouette subsample and to initialize the models
+
+    Returns
+    -------
+    :return: a tuple (labels, scores), where labels contains the best model's cluster labels (formatted like the
+      output of cluster), and scores is a DataFrame with one row per candidate model (columns: model, n_clusters,
+      covariance_type, inertia, bic, silhouette, and error)
+    """
+    assert criterion in criteria.keys(), ValueError(f'unknown criterion: {criterion}')
+    if models is None:
+        models = ['KMeans', 'GaussianMixture']
+    elif type(models) is not list:
+        models = [models]
+    if n_clusters is None:
+        n_clusters = list(range(2, 11))
+    if covariance_types is None:
+        covariance_types = ['full']
+
+    opts = eval_dict(get_default_options()['cluster_sweep'])
+    for k in opts.keys():
+        if k in kwargs.keys():
+            opts[k] = kwargs.pop(k)
+
+    # noinspection PyUnusedLocal
+    @dw.decorate.funnel
+    def wrangle(x, **wrangle_kwargs):
+        return x
+
+    if sparse.issparse(data):
+        stacked, values, unstack = data, sparse.csr_matrix(data), False
+    else:
+        data = wrangle(data, **kwargs)
+        unstack = type(data) is list
+        stacked = dw.stack(data) if unstack else data
+        values = stacked.values
+
+    sample = sample_rows(stacked, opts['silhouette_sample'], method='stratified', random_state=opts['random_state'])
+    candidates = get_candidates(models, n_clusters, covariance_types, random_state=opts['random_state'])
+
+    # results are consumed as they finish, so that only the best labels so far are kept in memory
+    results = Parallel(n_jobs=opts['n_jobs'], backend=opts['backend'], return_as='generator')(
+        delayed(fit_candidate)(values, c, sample) for c in candidates)
+
+    scores = []
+    best, best_labels = None, None
+    for next_scores, labels in results:
+        scores.append(next_scores)
+        score = next_scores[criterion]
+        if (labels is None) or np.isnan(score):
+            continue
+        if (best is None) or (criteria[criterion]([best, score]) == 1):
+            best, best_labels = score, labels
+    assert best_labels is not None, ValueError(f'no candidate model could be scored by {criterion}')
+
+    scores = pd.DataFrame(scores)
+    labels = pd.DataFrame(best_labels, index=None if sparse.issparse(stacked) else stacked.index)
+    if unstack:
+        labels = dw.unstack(labels)
+    return labels, scores
@@ -2,3 +2,7 @@ from .model import get_model, apply_model, has_all_attributes, has_any_attribute
 from .configurator import get_default_options
 from .util import get, fullfact, eval_dict
 from .shared import RobustDict
+from .sampling import sample_rows, chunks
+from .cache import cached, fingerprint
+from .neighbors import neighbor_graph, apply_neighbors_model, neighbor_options
+from .duplicates import unique_rows, apply_unique, dedup_options
@@ -0,0 +1,311 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import functools
+import hashlib
+import importlib.metadata
+import json
+import numpy as np
+import os
+import pandas as pd
+import pickle
+import scipy
+import shutil
+import sklearn
+from scipy import sparse
+import tempfile
+import time
+
+from .configurator import get_default_options, __version__
+from .util import eval_dict
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+def cache_options():
+    """
+    Return the disk cache options (see the [cache] section of config.ini), with the cache directory resolved to an
+    absolute path (by default, a "cache" folder within the [data] datadir directory)
+    """
+    opts = eval_dict(get_default_options()['cache'])
+    if opts.get('cachedir', None) is None:
+        datadir = eval_dict(get_default_options()['data'], context={'os': os})['datadir']
+        opts['cachedir'] = os.path.join(datadir, 'cache')
+    return opts
+
+
+def fingerprint(data, digest=None):
+    """
+    Compute a content-based fingerprint of a dataset
+
+    Parameters
+    ----------
+    :param data: a DataFrame, numpy array, scipy.sparse matrix, or scalar, or a (possibly nested) list, tuple, or
+      dictionary of any of these
+    :param digest: an existing hashlib object to update (default: None; start a new digest)
+
+    Returns
+    -------
+    :return: a hex string, if digest is None (otherwise the updated digest object)
+    """
+    top = digest is None
+    if top:
+        digest = hashlib.blake2b(digest_size=20)
+
+    if dw.zoo.is_dataframe(data):
+        digest.update(b'frame')
+        digest.update(pd.util.hash_pandas_object(data.index, index=False).values.tobytes())
+        digest.update(repr(list(data.columns)).encode())
+        fingerprint(data.values, digest)
+    elif isinstance(data, np.ndarray):
+        digest.update(f'array{data.shape}{data.dtype}'.encode())
+        if data.dtype.kind == 'O':
+            digest.update(pd.util.hash_array(np.ravel(data)).tobytes())
+        else:
+            digest.update(np.ascontiguousarray(data).data)
+    elif sparse.issparse(data):
+        data = sparse.csr_matrix(data)
+        if not data.has_canonical_format:  # equal matrices have equal fingerprints, regardless of storage order
+            data = data.copy()
+            data.sum_duplicates()
+        digest.update(f'sparse{data.shape}'.encode())
+        for a in [data.indptr, data.indices, data.data]:
+            fingerprint(a, digest)
+    elif type(data) in [list, tuple]:
+        digest.update(f'{type(data).__name__}{len(data)}'.encode())
+        for d in data:
+            fingerprint(d, digest)
+    elif type(data) is dict:
+        digest.update(b'dict')
+        for k in sorted(data.keys(), key=repr):
+            digest.update(repr(k).encode())
+            fingerprint(data[k], digest)
+    else:
+        digest.update(pickle.dumps(data))
+
+    if top:
+        return digest.hexdigest()
+    return digest
+
+
+def describe(x):
+    """
+    Return a JSON-serializable description of a model specification (names, classes, dictionaries, or estimators)
+    """
+    if type(x) in [list, tuple]:
+        return [describe(i) for i in x]
+    elif type(x) is dict:
+        return {str(k): describe(v) for k, v in x.items()}
+    elif isinstance(x, type) or (callable(x) and hasattr(x, '__qualname__')):
+        return f'{getattr(x, "__module__", "")}.{x.__qualname__}'
+    elif hasattr(x, 'get_params'):
+        return {'class': describe(type(x)), 'params': describe(x.get_params(deep=False))}
+    elif isinstance(x, (np.ndarray, pd.DataFrame)):
+        return fingerprint(x)
+    return repr(x)
+
+
+# config.ini sections that don't affect computed results (plotting, file locations, and the cache itself)
+uncached_sections = ['plot', 'animate', 'cache', 'data']
+
+# packages whose versions are included in cache keys, in addition to hypertools, numpy, pandas, scipy, and sklearn
+# (looked up without importing them)
+keyed_packages = ['umap-learn', 'pydata-wrangler']
+
+
+def package_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def cache_key(name, data, *args, **kwargs):
+    """
+    Compute a cache key from an operation's name, a fingerprint of its data, its (model) arguments, the default
+    options in config.ini (which models are initialized with), and the versions of hypertools and its numerical
+    dependencies
+    """
+    options = get_default_options()
+    spec = json.dumps({'name': name, 'args': describe(args), 'kwargs': describe(kwargs),
+                       'options': describe({k: v for k, v in options.items() if k not in uncached_sections}),
+                       'versions': [__version__.version, np.__version__, pd.__version__, scipy.__version__,
+                                    sklearn.__version__, *[package_version(p) for p in keyed_packages]]},
+                      sort_keys=True)
+    return hashlib.blake2b(f'{fingerprint(data)}{spec}'.encode(), digest_size=20).hexdigest()
+
+
+class Lock(object):
+    """
+    An exclusive, inter-process lock on a file (held while in a "with" block)
+    """
+    def __init__(self, fname, timeout=60):
+        self.fname = fname
+        self.timeout = timeout
+        self.fd = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.fname), exist_ok=True)
+        if fcntl is not None:
+            self.fd = os.open(self.fname, os.O_CREAT | os.O_RDWR)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            return self
+
+        start = time.time()
+        while True:
+            try:
+                self.fd = os.open(self.fname, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+                return self
+            except FileExistsError:
+                if time.time() - start > self.timeout:  # assume the lock was left behind by a crashed process
+                    os.remove(self.fname)
+                time.sleep(0.01)
+
+    def __exit__(self, *args):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        else:
+            os.close(self.fd)
+            os.remove(self.fname)
+        self.fd = None
+
+
+def pack(result):
+    """
+    Split a DataFrame (or list of DataFrames) into a single stacked array of values and the metadata needed to
+    rebuild it
+    """
+    if type(result) is list:
+        frames = [pd.DataFrame(r) for r in result]
+    else:
+        frames = [pd.DataFrame(result)]
+    meta = {'list': type(result) is list, 'lengths': [f.shape[0] for f in frames],
+            'indices': [f.index for f in frames], 'columns': [f.columns for f in frames]}
+    return np.concatenate([f.values for f in frames], axis=0), meta
+
+
+def unpack(values, meta):
+    """
+    Rebuild the DataFrame (or list of DataFrames) described by the given values and metadata (see pack).  Each
+    DataFrame is a view of values (e.g., a memory-mapped array).
+    """
+    edges = np.cumsum([0, *meta['lengths']])
+    frames = [pd.DataFrame(values[a:b], index=i, columns=c, copy=False)
+              for a, b, i, c in zip(edges[:-1], edges[1:], meta['indices'], meta['columns'])]
+    if meta['list']:
+        return frames
+    return frames[0]
+
+
+def read(key, cachedir=None):
+    """
+    Load a cached result (or return None if the key isn't in the cache).  The values are memory-mapped, so loading is
+    nearly instant regardless of the result's size.  The mapping is copy-on-write: results can be modified (like
+    freshly computed results), and modifications are never written back to the cache.
+    """
+    if cachedir is None:
+        cachedir = cache_options()['cachedir']
+    entry = os.path.join(cachedir, key)
+
+    try:
+        with open(os.path.join(entry, 'meta.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+        values = np.load(os.path.join(entry, 'values.npy'), mmap_mode='c')
+        os.utime(entry)  # mark the entry as recently used
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+    return unpack(values, meta)
+
+
+def entry_size(entry):
+    return sum([os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)])
+
+
+def evict(cachedir, max_size):
+    """
+    Remove the least recently used cache entries until the cache occupies at most max_size bytes.  Must be called
+    while holding the cache's lock.
+    """
+    entries = [os.path.join(cachedir, e) for e in os.listdir(cachedir) if not e.startswith('.')]
+    entries = sorted([e for e in entries if os.path.isdir(e)], key=os.path.getmtime)
+    sizes = [entry_size(e) for e in entries]
+
+    total = np.sum(sizes)
+    for e, s in zip(entries, sizes):
+        if total <= max_size:
+            break
+        shutil.rmtree(e, ignore_errors=True)
+        total -= s
+
+
+def write(key, result, cachedir=None, max_size=None):
+    """
+    Store a result (a DataFrame or list of DataFrames) in the cache.  Entries are written to a temporary directory and
+    then atomically moved into place, so concurrent readers never see partially written entries.
+    """
+    opts = cache_options()
+    if cachedir is None:
+        cachedir = opts['cachedir']
+    if max_size is None:
+        max_size = opts['max_size']
+
+    values, meta = pack(result)
+    if (values.dtype.kind not in 'biuf') or (values.nbytes > max_size):  # only numeric arrays can be memory-mapped
+        return
+
+    os.makedirs(cachedir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=cachedir)
+    try:
+        np.save(os.path.join(tmp, 'values.npy'), np.ascontiguousarray(values))
+        with open(os.path.join(tmp, 'meta.pkl'), 'wb') as f:
+            pickle.dump(meta, f)
+
+        with Lock(os.path.join(cachedir, '.lock')):
+            entry = os.path.join(cachedir, key)
+            if os.path.exists(entry):  # another process got here first
+                shutil.rmtree(tmp, ignore_errors=True)
+            else:
+                os.rename(tmp, entry)
+            evict(cachedir, max_size)
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cached(name):
+    """
+    Decorate a function (e.g., reduce or align) so that its results are stored in (and loaded from) a persistent,
+    content-addressed disk cache.  The decorated function accepts an additional cache keyword argument (default: set
+    by the "enabled" option in the [cache] section of config.ini).  Results are keyed by a fingerprint of the data, the
+    function's other arguments, the default options in config.ini, and the installed library versions.  Calls that
+    request the fitted model (return_model=True) bypass the cache.
+
+    Parameters
+    ----------
+    :param name: a name for the operation (included in the cache key)
+
+    Returns
+    -------
+    :return: a decorator
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapped(data, *args, **kwargs):
+            opts = cache_options()
+            if not kwargs.pop('cache', opts['enabled']) or kwargs.get('return_model', False):
+                return f(data, *args, **kwargs)
+
+            key = cache_key(name, data, *args, **kwargs)
+            result = read(key, cachedir=opts['cachedir'])
+            if result is not None:
+                return result
+
+            result = f(data, *args, **kwargs)
+            if dw.zoo.is_dataframe(result) or (type(result) is list and all([dw.zoo.is_dataframe(r) for r in result])):
+                write(key, result, cachedir=opts['cachedir'], max_size=opts['max_size'])
+            return result
+        return wrapped
+    return decorator
@@ -0,0 +1,124 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .configurator import get_default_options
+from .util import eval_dict
+
+
+def dedup_options(enabled=None):
+    """
+    Return the duplicate row options (see the [dedup] section of config.ini), optionally overriding whether duplicate
+    rows are collapsed
+    """
+    opts = eval_dict(get_default_options()['dedup'])
+    if enabled is not None:
+        opts['enabled'] = enabled
+    return opts
+
+
+def row_hashes(data):
+    """
+    Compute a 64-bit hash of each row of a DataFrame, 2D numpy array, or scipy.sparse matrix.  Rows with equal values
+    have equal hashes; for a dataset with 10^7 distinct rows, the chance that any two distinct rows share a hash is
+    roughly 3 in a million.
+    """
+    if sparse.issparse(data):
+        data = sparse.csr_matrix(data)
+        if not data.has_canonical_format:
+            data = data.copy()
+            data.sum_duplicates()
+        data.eliminate_zeros()
+
+        # hash each nonzero entry (with its column), and then sum the hashes in each row (wrapping around on overflow)
+        entries = pd.util.hash_array(data.data) ^ (pd.util.hash_array(data.indices) * np.uint64(0x9E3779B97F4A7C15))
+        totals = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(entries, dtype=np.uint64)])
+        return pd.util.hash_array((totals[data.indptr[1:]] - totals[data.indptr[:-1]]) ^ np.diff(data.indptr).astype(
+            np.uint64))
+    elif not dw.zoo.is_dataframe(data):
+        data = pd.DataFrame(np.asarray(data))
+    return pd.util.hash_pandas_object(data, index=False).values
+
+
+def unique_rows(data):
+    """
+    Find the distinct rows of a dataset
+
+    Parameters
+    ----------
+    :param data: a DataFrame, 2D numpy array, or scipy.sparse matrix
+
+    Returns
+    -------
+    :return: a tuple (first, inverse, counts), where first contains the (sorted) indices of the first occurrence of
+      each distinct row, inverse maps each row onto its distinct row (so that data[first][inverse] reproduces data),
+      and counts contains the number of times each distinct row occurs
+    """
+    _, first, inverse, counts = np.unique(row_hashes(data), return_index=True, return_inverse=True,
+                                          return_counts=True)
+
+    # order the distinct rows by their first occurrences
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[np.ravel(inverse)], counts[order]
+
+
+def take_rows(data, inds):
+    if sparse.issparse(data):
+        return data[inds]
+    elif dw.zoo.is_dataframe(data):
+        return data.iloc[inds]
+    return np.asarray(data)[inds]
+
+
+def apply_unique(f, data, *args, return_model=False, **kwargs):
+    """
+    Apply a function (e.g., a stacked reduce or cluster function) to the distinct rows of a dataset, and then copy each
+    distinct row's result to each of its duplicates.  The number of times each distinct row occurs (or, if a
+    sample_weight keyword argument is given, the total weight of its copies) is passed to f as a sample_weight keyword
+    argument, which is used by models whose fit methods accept sample weights (e.g., KMeans).  Initializations given
+    for every row (init arrays) are restricted to the distinct rows.
+
+    Parameters
+    ----------
+    :param f: a function that takes a (stacked) dataset and returns a DataFrame with one row per observation (and the
+      fitted model information, if return_model is True)
+    :param data: a (stacked) DataFrame or scipy.sparse matrix
+    :param args: positional arguments for f
+    :param return_model: passed to f (default: False).  The model information is extended to include the distinct
+      rows' indices ('unique_rows') and counts ('counts').
+    :param kwargs: keyword arguments for f
+
+    Returns
+    -------
+    :return: a DataFrame with one row per row of data (and the fitted model information, if return_model is True)
+    """
+    first, inverse, counts = unique_rows(data)
+    if len(first) == data.shape[0]:
+        return f(data, *args, return_model=return_model, **kwargs)
+
+    sample_weight = kwargs.pop('sample_weight', None)
+    if sample_weight is None:
+        sample_weight = counts
+    else:
+        sample_weight = np.bincount(inverse, weights=np.asarray(sample_weight, dtype=float), minlength=len(first))
+
+    # initializations given for every row (e.g., from an earlier embedding) are restricted to the distinct rows
+    init = kwargs.get('init', None)
+    if isinstance(init, np.ndarray) and (init.ndim == 2) and (init.shape[0] == data.shape[0]):
+        kwargs['init'] = init[first]
+
+    result = f(take_rows(data, first), *args, return_model=return_model, sample_weight=sample_weight, **kwargs)
+    if return_model:
+        result, info = result
+    else:
+        info = None
+
+    index = data.index if dw.zoo.is_dataframe(data) else None
+    result = pd.DataFrame(np.asarray(result)[inverse], index=index, columns=getattr(result, 'columns', None))
+    if return_model:
+        return result, dw.core.update_dict(info, {'unique_rows': first, 'counts': counts})
+    return result
@@ -6,7 +6,9 @@ import numpy as np
 import pandas as pd
 import os
 import importlib
+import inspect
 import sklearn
+from scipy import sparse
 # import flair
 
 if int(sklearn.__version__.split('.')[0]) < 1:
@@ -27,7 +29,7 @@ sklearn_modules = ['calibration', 'cluster', 'compose', 'covariance', 'cross_dec
 sklearn_modules = [f'sklearn.{m}' for m in sklearn_modules]
 sklearn_modules.append('umap')
 flair_embeddings = []  # [f'flair.embeddings.{f}' for f in dir(flair.embeddings) if 'embedding' in f.lower()]
-externals = ['ppca', 'brainiak']
+externals = ['hypertools.external.ppca', 'hypertools.external.brainiak']
 
 
 def has_all_attributes(x, attributes):
@@ -141,6 +143,21 @@ def get_sklearn_method(x, mode):
         return helper(mode)
 
 
+def fit_kwargs(f, sample_weight=None):
+    """
+    Return the keyword arguments needed to pass sample weights to a model's fit (or fit_transform, fit_predict, etc.)
+    method, or an empty dictionary if no weights are given or the method doesn't accept sample weights
+    """
+    if sample_weight is None:
+        return {}
+    try:
+        if 'sample_weight' in inspect.signature(f).parameters.keys():
+            return {'sample_weight': sample_weight}
+    except (TypeError, ValueError):
+        pass
+    return {}
+
+
 # noinspection PyIncorrectDocstring
 def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
     """
@@ -149,8 +166,9 @@ def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
 
     Parameters
     ----------
-    :param data: a pandas DataFrame, 2D numpy array, or a list of DataFrames or arrays (must have the same numbers of
-      columns).  Only numerical data is supported.
+    :param data: a pandas DataFrame, 2D numpy array, scipy.sparse matrix, or a list of DataFrames or arrays (must have
+      the same numbers of columns).  Only numerical data is supported.  Sparse matrices are passed to the model(s)
+      without being densified.
     :param model: any scikit-learn compatible model, any hugging-face model, any string (naming a scikit-learn or
       hugging-face model), or a list of models to be applied in sequence (each model fits and then transforms the output
       of the previous step in the pipeline).  For additional customization, models may be specified as dictionaries
@@ -166,6 +184,8 @@ def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
     :param mode: one of: 'fit', 'predict', 'predict_proba', 'embed', 'fit_transform', 'fit_predict', or
       'fit_predict_proba' (default: 'fit_transform').  Specifies whether to fit (only), transform/predict/embed (only),
       or fit AND transform/predict.
+    :param sample_weight: (optional) a weight for each observation, passed to the fit methods of models that accept
+      sample weights (and otherwise ignored)
 
     Returns
     -------
@@ -191,7 +211,16 @@ def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
             data = x[0]
         else:
             data = x
-        if type(template) is list:
+
+        # sparse outputs (e.g., from feature extraction models) are returned as is, rather than densified, and
+        # (low-dimensional) dense outputs of models applied to sparse data are wrapped in DataFrames
+        if sparse.issparse(data):
+            return x
+        elif sparse.issparse(template):
+            if dw.zoo.is_array(data):
+                return safe_df(x, pd.RangeIndex(template.shape[0]), return_model)
+            return x
+        elif type(template) is list:
             if type(data) is list:
                 return x
             elif dw.zoo.is_multiindex_dataframe(x):
@@ -218,16 +247,23 @@ def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
         stacked_data = data
     elif dw.zoo.is_array(data):
         stacked_data = pd.DataFrame(data)
+    elif sparse.issparse(data):
+        stacked_data = data
     else:
         raise ValueError(f'unsupported datatype: {type(data)}')
 
     if type(model) is list:
+        index = stacked_data.index if dw.zoo.is_dataframe(stacked_data) else None
         fitted_models = []
         for m in model:
             stacked_data, next_fitted = apply_model(stacked_data, m, return_model=True, **kwargs)
             fitted_models.append(next_fitted)
+
+        # steps applied to sparse intermediate outputs don't carry the original index
+        if (index is not None) and dw.zoo.is_dataframe(stacked_data) and (stacked_data.shape[0] == len(index)):
+            stacked_data.index = index
         if return_model:
-            return unpack_result(stacked_data, data, return_model), fitted_models
+            return unpack_result(stacked_data, data, False), fitted_models
         else:
             return unpack_result(stacked_data, data, return_model)
 
@@ -250,6 +286,7 @@ def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
         else:
             return unpack_result(transformed_data, data, return_model)
     else:
+        sample_weight = kwargs.pop('sample_weight', None)
         model = dw.core.apply_defaults(get_model(model, search=search), get_default_options())(*args, **kwargs)
         if dw.zoo.text.is_hugging_face_model(model):
             return unpack_result(dw.zoo.text.apply_text_model(model, stacked_data, *args, mode=mode,
@@ -257,10 +294,10 @@ def apply_model(data, model, *args, return_model=False, search=None, **kwargs):
         f = get_sklearn_method(model, mode)
         if type(f) is list:
             assert len(f) == 2, ValueError(f'bad mode: {mode}')
-            f[0](stacked_data)
+            f[0](stacked_data, **fit_kwargs(f[0], sample_weight))
             transformed_data = f[1](stacked_data)
         else:
-            transformed_data = f(stacked_data)
+            transformed_data = f(stacked_data, **fit_kwargs(f, sample_weight))
 
         if return_model:
             return unpack_result(transformed_data, data, False), {'model': model, 'args': args, 'kwargs': kwargs}
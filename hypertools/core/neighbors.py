@@ -0,0 +1,219 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+import threading
+from collections import OrderedDict
+from scipy.sparse import csr_matrix, issparse
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import NearestNeighbors
+
+from .cache import fingerprint
+from .configurator import get_default_options
+from .model import get_model, get_sklearn_method, fit_kwargs
+from .util import eval_dict
+
+# in-memory cache of neighbor graphs, keyed by (data fingerprint, metric); see neighbor_graph
+graphs = OrderedDict()
+graphs_lock = threading.Lock()
+
+
+def neighbor_options(enabled=None):
+    """
+    Return the neighbor graph cache options (see the [neighbors] section of config.ini), optionally overriding whether
+    the cache is enabled
+    """
+    opts = eval_dict(get_default_options()['neighbors'])
+    if enabled is not None:
+        opts['enabled'] = enabled
+    return opts
+
+
+def compute_neighbors(values, n_neighbors, metric='euclidean', index=False, opts=None):
+    """
+    Find each observation's nearest neighbors, using a tree-based (exact) search, or (for large datasets, or if a
+    search index is needed) pynndescent's approximate nearest neighbor descent
+    """
+    if opts is None:
+        opts = neighbor_options()
+
+    algorithm = opts['algorithm']
+    if algorithm == 'auto':
+        approximate = index or (values.shape[0] > opts['approximate_min_samples'])
+        algorithm = 'nndescent' if approximate else 'auto'
+
+    if algorithm == 'nndescent':
+        # noinspection PyPackageRequirements
+        from pynndescent import NNDescent
+
+        # same settings as UMAP
+        n_trees = min(64, 5 + int(round(values.shape[0] ** 0.5 / 20.0)))
+        n_iters = max(5, int(round(np.log2(values.shape[0]))))
+        search_index = NNDescent(values, n_neighbors=n_neighbors, metric=metric, random_state=opts['random_state'],
+                                 n_trees=n_trees, n_iters=n_iters, max_candidates=60, compressed=False)
+        indices, distances = search_index.neighbor_graph
+        return indices, distances, search_index
+
+    distances, indices = NearestNeighbors(n_neighbors=n_neighbors, metric=metric,
+                                          algorithm=algorithm).fit(values).kneighbors(values)
+    return indices, distances, None
+
+
+def neighbor_graph(data, n_neighbors, metric='euclidean', index=False):
+    """
+    Return each observation's nearest neighbors (including the observation itself), computing them only if they are
+    not already in the neighbor graph cache.  Graphs are cached by a fingerprint of the data and the distance metric; a
+    cached graph is reused for any number of neighbors up to the number it was computed with.  The cache holds up to
+    max_graphs graphs (see the [neighbors] section of config.ini), and the least recently used graphs are evicted first.
+
+    Parameters
+    ----------
+    :param data: a DataFrame, 2D numpy array, or scipy.sparse matrix
+    :param n_neighbors: the number of neighbors (including the observation itself)
+    :param metric: the distance metric (default: 'euclidean')
+    :param index: if True, also return a pynndescent search index (used to place new observations)
+
+    Returns
+    -------
+    :return: a tuple (indices, distances, search_index), where indices and distances are number-of-observations by
+      n_neighbors arrays, and search_index is an NNDescent object (or None)
+    """
+    if issparse(data):
+        values = csr_matrix(data)
+    else:
+        values = np.asarray(data.values if dw.zoo.is_dataframe(data) else data)
+    n_neighbors = min(n_neighbors, values.shape[0])
+    opts = neighbor_options()
+    key = (fingerprint(values), metric)
+
+    with graphs_lock:
+        cached = graphs.get(key, None)
+        if cached is not None:
+            graphs.move_to_end(key)
+
+    if (cached is None) or (cached[0].shape[1] < n_neighbors) or (index and cached[2] is None):
+        cached = compute_neighbors(values, n_neighbors, metric=metric, index=index, opts=opts)
+        with graphs_lock:
+            graphs[key] = cached
+            while len(graphs) > opts['max_graphs']:
+                graphs.popitem(last=False)
+
+    indices, distances, search_index = cached
+    return indices[:, :n_neighbors], distances[:, :n_neighbors], search_index
+
+
+def distance_graph(data, n_neighbors, metric='euclidean'):
+    """
+    Return a sparse number-of-observations by number-of-observations matrix of the distances between each observation
+    and its n_neighbors nearest neighbors (including the observation itself, as an explicitly stored zero), as accepted
+    by scikit-learn models with precomputed metrics or affinities
+    """
+    indices, distances, _ = neighbor_graph(data, n_neighbors, metric=metric)
+    n, k = indices.shape
+    return csr_matrix((distances.ravel(), indices.ravel(), np.arange(0, n * k + 1, k)), shape=(n, n))
+
+
+def get_metric(model):
+    metric = getattr(model, 'metric', 'euclidean')
+    if (metric == 'minkowski') and (getattr(model, 'p', 2) == 2):
+        return 'euclidean'
+    elif (type(metric) is str) and (getattr(model, 'metric_params', None) is None) and \
+            not getattr(model, 'metric_kwds', None):
+        return metric
+    return None
+
+
+def umap_neighbors(model, data):
+    metric = get_metric(model)
+    if (metric is None) or model.unique:
+        return None
+    model.set_params(precomputed_knn=neighbor_graph(data, model.n_neighbors, metric=metric, index=True))
+    return data
+
+
+def isomap_neighbors(model, data):
+    metric = get_metric(model)
+    if (metric is None) or (model.n_neighbors is None) or (model.radius is not None):
+        return None
+    graph = distance_graph(data, model.n_neighbors + 1, metric=metric)  # Isomap excludes each observation itself
+
+    # Isomap connects disconnected neighbor graphs using the original data, which precomputed graphs don't provide
+    if connected_components(graph, directed=False)[0] > 1:
+        return None
+    model.set_params(metric='precomputed')
+    return graph
+
+
+def spectral_neighbors(model, data):
+    if model.affinity != 'nearest_neighbors':
+        return None
+    n_neighbors = model.n_neighbors
+    if n_neighbors is None:  # SpectralEmbedding's default
+        n_neighbors = max(int(data.shape[0] / 10), 1)
+    graph = distance_graph(data, n_neighbors)
+    model.set_params(affinity='precomputed_nearest_neighbors', n_neighbors=n_neighbors)
+    return graph
+
+
+# models that accept precomputed neighbor graphs, along with a function that configures the model to use a cached
+# graph and returns the data the model should be fit to (or None if the model's settings are incompatible with a
+# cached graph, e.g. spectral methods with non-neighbor-based affinities)
+handlers = {'UMAP': umap_neighbors, 'Isomap': isomap_neighbors, 'SpectralEmbedding': spectral_neighbors,
+            'SpectralClustering': spectral_neighbors}
+
+
+def get_model_name(model):
+    if type(model) is dict:
+        return get_model_name(model.get('model', None))
+    elif type(model) is str:
+        return model
+    return getattr(model, '__name__', None)
+
+
+def apply_neighbors_model(data, model, search=None, return_model=False, mode='fit_transform', **kwargs):
+    """
+    Apply a model that builds a nearest neighbor graph (UMAP, Isomap, SpectralEmbedding, or SpectralClustering) using a
+    cached graph (see neighbor_graph), so that the graph is computed once and shared across models and calls.  The
+    cache is disabled by default; it may be enabled using the "enabled" option in the [neighbors] section of config.ini.
+
+    Parameters
+    ----------
+    :param data: a (stacked) DataFrame or a scipy.sparse matrix
+    :param model: a single model (string, class, or dictionary)
+    :param search: modules to search for the model (passed to get_model)
+    :param return_model: if True, also return the fitted model information (default: False)
+    :param mode: 'fit_transform' or 'fit_predict' (default: 'fit_transform')
+    :param kwargs: keyword arguments passed to the model's initializer
+
+    Returns
+    -------
+    :return: None if the model does not support cached neighbor graphs (with its current settings); otherwise the
+      transformed data (or labels) as a DataFrame (and the fitted model information, if return_model is True)
+    """
+    name = get_model_name(model)
+    if name not in handlers.keys():
+        return None
+    sample_weight = kwargs.pop('sample_weight', None)
+    if type(model) is dict:
+        kwargs = dw.core.update_dict(model['kwargs'], kwargs)
+        args = model['args']
+        model = model['model']
+    else:
+        args = []
+
+    fitted = dw.core.apply_defaults(get_model(model, search=search), get_default_options())(*args, **kwargs)
+    fit_data = handlers[name](fitted, data if issparse(data) else data.values)
+    if fit_data is None:
+        return None
+
+    f = get_sklearn_method(fitted, mode)
+    if type(f) is list:
+        f[0](fit_data, **fit_kwargs(f[0], sample_weight))
+        transformed = f[1](fit_data)
+    else:
+        transformed = f(fit_data, **fit_kwargs(f, sample_weight))
+
+    transformed = pd.DataFrame(transformed, index=None if issparse(data) else data.index)
+    if return_model:
+        return transformed, {'model': fitted, 'args': args, 'kwargs': kwargs}
+    return transformed
@@ -0,0 +1,123 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import kmeans_plusplus
+
+
+def get_strata(data):
+    """
+    Return an integer stratum label for each row of a dataset: the outermost index level of a MultiIndex DataFrame
+    (e.g., one stratum per stacked dataset), or a single stratum otherwise
+    """
+    if dw.zoo.is_multiindex_dataframe(data):
+        return np.asarray(data.index.codes[0])
+    return np.zeros(data.shape[0], dtype=int)
+
+
+def stratified_sample(strata, n, random_state=None):
+    """
+    Sample n indices without replacement, allocating samples to each stratum in proportion to its size (and, when
+    possible, at least one sample per stratum)
+    """
+    rng = np.random.RandomState(random_state)
+    labels, counts = np.unique(strata, return_counts=True)
+
+    quotas = n * counts / np.sum(counts)
+    allocated = np.minimum(np.floor(quotas).astype(int), counts)
+    if n >= len(labels):
+        allocated = np.maximum(allocated, 1)
+
+    # distribute any remaining samples by largest remainder (or remove excess samples from the largest strata)
+    remaining = n - np.sum(allocated)
+    order = np.argsort(allocated - quotas)
+    while remaining > 0:
+        for i in order:
+            if remaining > 0 and allocated[i] < counts[i]:
+                allocated[i] += 1
+                remaining -= 1
+    while remaining < 0:
+        for i in order[::-1]:
+            if remaining < 0 and allocated[i] > 1:
+                allocated[i] -= 1
+                remaining += 1
+
+    inds = [rng.choice(np.flatnonzero(strata == x), size=k, replace=False) for x, k in zip(labels, allocated)]
+    return np.sort(np.concatenate(inds))
+
+
+def sample_rows(data, n, method='kmeans++', oversample=10, random_state=None):
+    """
+    Select a representative subset of a dataset's rows
+
+    Parameters
+    ----------
+    :param data: a DataFrame (if data has a MultiIndex, the outermost index level defines the strata used by stratified
+      sampling), a 2D numpy array, or a scipy.sparse matrix
+    :param n: the number of rows to select
+    :param method: one of:
+        - 'kmeans++' (default): k-means++ seeding, which spreads the selected rows across the data's support.  To keep
+          the cost proportional to n (rather than to the number of rows), seeds are chosen from a stratified pool of
+          oversample * n candidate rows.
+        - 'stratified': sample rows from each stratum in proportion to its size
+        - 'random': sample rows uniformly at random
+    :param oversample: size of the k-means++ candidate pool, as a multiple of n (default: 10)
+    :param random_state: a seed for the random number generator (default: None)
+
+    Returns
+    -------
+    :return: a sorted numpy array of (n) row indices
+    """
+    n_rows = data.shape[0]
+    if n >= n_rows:
+        return np.arange(n_rows)
+
+    if dw.zoo.is_dataframe(data):
+        strata = get_strata(data)
+        values = data.values
+    elif sparse.issparse(data):
+        strata = np.zeros(n_rows, dtype=int)
+        values = sparse.csr_matrix(data)
+    else:
+        strata = np.zeros(n_rows, dtype=int)
+        values = np.asarray(data)
+
+    if method == 'random':
+        return np.sort(np.random.RandomState(random_state).choice(n_rows, size=n, replace=False))
+    elif method == 'stratified':
+        return stratified_sample(strata, n, random_state=random_state)
+    elif method == 'kmeans++':
+        pool = stratified_sample(strata, min(n_rows, oversample * n), random_state=random_state)
+        candidates = values[pool].astype(float) if sparse.issparse(values) else np.asarray(values[pool], dtype=float)
+        _, inds = kmeans_plusplus(candidates, n, random_state=random_state)
+        return np.sort(pool[inds])
+    raise ValueError(f'unknown sampling method: {method}')
+
+
+def chunks(data, batch_size=None):
+    """
+    Iterate over row chunks of a dataset
+
+    Parameters
+    ----------
+    :param data: a 2D array (including memory-mapped arrays) or DataFrame, or an iterable (e.g., a list or generator)
+      of arrays or DataFrames
+    :param batch_size: the maximum number of rows per chunk (default: None; arrays are returned whole, and each item of
+      an iterable is its own chunk)
+
+    Returns
+    -------
+    :return: a generator of 2D float arrays
+    """
+    if isinstance(data, pd.DataFrame):
+        data = data.values
+
+    if hasattr(data, 'shape') and len(data.shape) == 2:
+        if batch_size is None:
+            batch_size = max(data.shape[0], 1)
+        for start in range(0, data.shape[0], batch_size):
+            yield np.asarray(data[start:(start + batch_size)], dtype=float)
+    else:
+        for chunk in data:
+            yield from chunks(chunk, batch_size)
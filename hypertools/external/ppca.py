@@ -1,22 +1,81 @@
 # source: https://github.com/allentran/pca-magic/blob/master/ppca/_ppca.py
+#
+# Restructured for speed and memory use: explicit inverses are replaced with Cholesky solves, the missing values are
+# located once, the reconstruction is only evaluated at the missing entries (the error is computed from d x d
+# summaries), the data are filled in place in a single working copy, the final (symmetric) covariance is decomposed with
+# eigh, and the caller's data are never modified.
 
 from __future__ import division
 from __future__ import print_function
 
-from builtins import object
-import os
-
 import numpy as np
-from scipy.linalg import orth
+from scipy.linalg import cho_factor, cho_solve, orth
+from sklearn.utils.extmath import randomized_svd
+
+from ..core.sampling import chunks
+
+
+def spd_inverse(a):
+    """
+    Invert a symmetric positive definite matrix via its Cholesky factorization
+
+    Returns
+    -------
+    :return: a tuple containing the inverse and the log of its determinant
+    """
+    factor = cho_factor(a)
+    return cho_solve(factor, np.eye(a.shape[0])), -2 * np.sum(np.log(np.diag(factor[0])))
+
+
+def spd_solve(a, b):
+    """
+    Compute b a^-1 for a symmetric positive (semi-)definite matrix a, falling back on a pseudoinverse if a is singular
+    """
+    try:
+        return cho_solve(cho_factor(a), b.T).T
+    except np.linalg.LinAlgError:
+        return np.dot(b, np.linalg.pinv(a))
+
+
+def reconstruct(X, C, inds, chunk_size=2 ** 18):
+    """
+    Compute the entries of np.dot(X, C.T) at the given (sorted) flat indices, without forming the full product
+
+    Parameters
+    ----------
+    :param X: an N by d array of latent coordinates
+    :param C: a D by d array of loadings
+    :param inds: sorted flat (row-major) indices into the N by D product
+    :param chunk_size: maximum number of entries of the product computed at once (default: 2 ** 18)
+
+    Returns
+    -------
+    :return: a numpy array with one value per index
+    """
+    values = np.empty(len(inds))
+    D = C.shape[0]
+    step = max(1, chunk_size // D)
+    edges = np.searchsorted(inds, np.arange(0, X.shape[0] + step, step) * D)
+    for i, start in enumerate(range(0, X.shape[0], step)):
+        if edges[i + 1] > edges[i]:
+            block = np.dot(X[start:(start + step)], C.T)
+            values[edges[i]:edges[i + 1]] = np.take(block, inds[edges[i]:edges[i + 1]] - start * D)
+    return values
 
 
 class PPCA:
-    def __init__(self):
+    def __init__(self, n_components=None, tol=1e-4, min_obs=10, verbose=False):
+        self.n_components = n_components
+        self.tol = tol
+        self.min_obs = min_obs
+        self.verbose = verbose
+
         self.raw = None
         self.data = None
         self.C = None
         self.means = None
         self.stds = None
+        self.valid_series = None
 
     def _standardize(self, X):
 
@@ -25,24 +84,40 @@ class PPCA:
 
         return (X - self.means) / self.stds
 
-    def fit(self, data, d=None, tol=1e-4, min_obs=10, verbose=False):
-
-        self.raw = data
-        self.raw[np.isinf(self.raw)] = np.max(self.raw[np.isfinite(self.raw)])
-
+    def fit(self, data, d=None, tol=None, min_obs=None, verbose=None):
+        # fitting options default to the values passed to the constructor
+        if d is None:
+            d = self.n_components
+        if tol is None:
+            tol = self.tol
+        if min_obs is None:
+            min_obs = self.min_obs
+        if verbose is None:
+            verbose = self.verbose
+
+        self.raw = np.asarray(data, dtype=float)
         valid_series = np.sum(~np.isnan(self.raw), axis=0) >= min_obs
 
-        data = self.raw[:, valid_series].copy()
+        # copy the valid columns (the caller's data are left untouched)
+        data = np.compress(valid_series, self.raw, axis=1)
+        infs = np.isinf(data)
+        if np.any(infs):
+            data[infs] = np.max(self.raw[np.isfinite(self.raw)])
         N = data.shape[0]
         D = data.shape[1]
 
-        self.means = np.nanmean(data, axis=0)
-        self.stds = np.nanstd(data, axis=0)
+        # standardize in place (the missing values are set to 0 so that they don't contribute to the sums)
+        missing_inds = np.flatnonzero(np.isnan(data))
+        missing = len(missing_inds)
+        np.put(data, missing_inds, 0)
+        counts = N - np.bincount(missing_inds % D, minlength=D)
 
-        data = self._standardize(data)
-        observed = ~np.isnan(data)
-        missing = np.sum(~observed)
-        data[~observed] = 0
+        self.means = np.sum(data, axis=0) / counts
+        data -= self.means
+        np.put(data, missing_inds, 0)
+        self.stds = np.sqrt(np.einsum('ij,ij->j', data, data) / counts)
+        self.valid_series = valid_series
+        data /= self.stds
 
         # initial
 
@@ -54,38 +129,45 @@ class PPCA:
         else:
             C = self.C
         CC = np.dot(C.T, C)
-        X = np.dot(np.dot(data, C), np.linalg.inv(CC))
-        recon = np.dot(X, C.T)
-        recon[~observed] = 0
-        ss = np.sum((recon - data)**2)/(N*D - missing)
+        X = spd_solve(CC, np.dot(data, C))
+
+        # the reconstruction error is computed from d x d summaries (sum of squared residuals across all entries of the
+        # data matrix = |data|^2 - 2 tr(C' data' X) + tr(X'X C'C), corrected for the missing entries), so the full
+        # N x D reconstruction is never formed-- only its values at the missing entries are computed
+        observed_norm = np.dot(data.ravel(), data.ravel())
+        DX = np.dot(data.T, X)
+        recon = reconstruct(X, C, missing_inds)
+        ss = (observed_norm - 2*np.sum(C*DX) + np.sum(np.dot(X.T, X)*CC) - np.dot(recon, recon)) / (N*D - missing)
 
         v0 = np.inf
         counter = 0
 
         while True:
 
-            Sx = np.linalg.inv(np.eye(d) + CC/ss)
+            Sx, log_det = spd_inverse(np.eye(d) + CC/ss)
 
             # e-step
             ss0 = ss
-            if missing > 0:
-                proj = np.dot(X, C.T)
-                data[~observed] = proj[~observed]
+            np.put(data, missing_inds, recon)
             X = np.dot(np.dot(data, C), Sx) / ss
 
             # m-step
             XX = np.dot(X.T, X)
-            C = np.dot(np.dot(data.T, X), np.linalg.pinv(XX + N*Sx))
+            DX = np.dot(data.T, X)
+            C = spd_solve(XX + N*Sx, DX)
             CC = np.dot(C.T, C)
-            recon = np.dot(X, C.T)
-            recon[~observed] = 0
-            ss = (np.sum((recon-data)**2) + N*np.sum(CC*Sx) + missing*ss0)/(N*D)
+
+            # the missing entries are excluded from the reconstruction (i.e., their error is the filled-in value)
+            filled = recon
+            filled_norm = np.dot(filled, filled)
+            recon = reconstruct(X, C, missing_inds)
+            change = np.subtract(recon, filled, out=filled)
+            resid = (observed_norm + filled_norm) - 2*np.sum(C*DX) + np.sum(XX*CC) \
+                - np.dot(change, change) + filled_norm
+            ss = (resid + N*np.sum(CC*Sx) + missing*ss0)/(N*D)
 
             # calc diff for convergence
-            det = np.log(np.linalg.det(Sx))
-            if np.isinf(det):
-                det = abs(np.linalg.slogdet(Sx)[1])
-            v1 = N*(D*np.log(ss) + np.trace(Sx) - det) \
+            v1 = N*(D*np.log(ss) + np.trace(Sx) - log_det) \
                 + np.trace(XX) - missing*np.log(ss0)
             diff = abs(v1/v0 - 1)
             if verbose:
@@ -96,9 +178,8 @@ class PPCA:
             counter += 1
             v0 = v1
 
-
         C = orth(C)
-        vals, vecs = np.linalg.eig(np.cov(np.dot(data, C).T))
+        vals, vecs = np.linalg.eigh(np.atleast_2d(np.cov(np.dot(data, C).T)))
         order = np.flipud(np.argsort(vals))
         vecs = vecs[:, order]
         vals = vals[order]
@@ -109,27 +190,349 @@ class PPCA:
         self.C = C
         self.data = data
         self.eig_vals = vals
+        self.n_iter = counter + 1
         self._calc_var()
 
     def transform(self, data=None):
+        """
+        Project data onto the fitted components.  If data is None, the (standardized, gap-filled) training data are
+        projected; otherwise the new data are standardized using the training statistics, and any missing values are
+        replaced with the training means before projecting.
+        """
         if self.C is None:
             raise RuntimeError('Fit the data model first.')
         if data is None:
             return np.dot(self.data, self.C)
+
+        data = self._standardize(np.asarray(data, dtype=float)[:, self.valid_series])
+        data[np.isnan(data)] = 0
         return np.dot(data, self.C)
 
     def fit_transform(self, data=None, **kwargs):
         self.fit(data, **kwargs)
-        return self.transform(data)
+        return self.transform()
 
     def _calc_var(self):
 
         if self.data is None:
             raise RuntimeError('Fit the data model first.')
 
-        data = self.data.T
-
-        # variance calc
-        var = np.nanvar(data, axis=1)
-        total_var = var.sum()
+        # variance calc (the fitted data contain no missing values)
+        means = np.mean(self.data, axis=0)
+        total_var = np.dot(self.data.ravel(), self.data.ravel()) / self.data.shape[0] - np.dot(means, means)
         self.var_exp = self.eig_vals.cumsum() / total_var
+
+
+def posterior(x, observed, W, ss):
+    """
+    Compute the posterior mean and covariance of each observation's latent coordinates given its observed values,
+    under the PPCA model x = W z + e (with z ~ N(0, I) and e ~ N(0, ss I))
+
+    Parameters
+    ----------
+    :param x: an n by D array of standardized data, with missing values set to 0
+    :param observed: an n by D boolean array indicating which values were observed
+    :param W: a D by d array of loadings
+    :param ss: the noise variance
+
+    Returns
+    -------
+    :return: an n by d array of posterior means and an n by d by d array of posterior covariances
+    """
+    d = W.shape[1]
+
+    # each observation's precision matrix only involves the loadings of its observed features
+    M = np.dot(observed.astype(float), np.einsum('jk,jl->jkl', W, W).reshape(W.shape[0], d * d)).reshape(-1, d, d)
+    M += ss * np.eye(d)
+    M_inv = np.linalg.inv(M)
+    return np.einsum('nkl,nl->nk', M_inv, np.dot(x, W)), ss * M_inv
+
+
+def sufficient_statistics(x, observed, W, ss):
+    """
+    Compute the (expected) sufficient statistics needed to update a PPCA model's loadings and noise variance, summed
+    over a chunk of observations.  For each feature j, the statistics are:
+        - A[j]: the sum of E[z z'] over observations where feature j was observed
+        - B[j]: the sum of x_j E[z] over those observations
+        - q[j]: the sum of x_j ** 2 over those observations
+        - count[j]: the number of those observations
+    along with the sum of E[z z'] over all observations (S) and the number of observations (n).
+    """
+    Ez, cov = posterior(x, observed, W, ss)
+    Ezz = cov + Ez[:, :, None] * Ez[:, None, :]
+
+    d = W.shape[1]
+    return {'A': np.dot(observed.T.astype(float), Ezz.reshape(-1, d * d)).reshape(-1, d, d),
+            'B': np.dot(x.T, Ez),
+            'q': np.einsum('ij,ij->j', x, x),
+            'count': np.sum(observed, axis=0),
+            'S': np.sum(Ezz, axis=0),
+            'n': x.shape[0]}
+
+
+def maximize(stats):
+    """
+    Compute the loadings and noise variance that maximize the expected log likelihood, given the sufficient statistics
+    computed by sufficient_statistics.  The loadings are then rescaled so that the latent coordinates have unit
+    covariance (parameter-expanded EM; Liu, Rubin, & Wu, 1998).  With missing values, plain EM only adjusts the
+    loadings' scale very slowly (the prior is the only thing that pins it down), whereas the rescaled updates typically
+    converge within a few iterations.
+    """
+    observed = stats['count'] > 0
+    W = np.zeros(stats['B'].shape)
+    W[observed] = np.linalg.solve(stats['A'][observed], stats['B'][observed][:, :, None])[:, :, 0]
+
+    ss = (np.sum(stats['q']) - np.sum(W * stats['B'])) / np.sum(stats['count'])
+    return np.dot(W, np.linalg.cholesky(stats['S'] / stats['n'])), max(ss, 1e-12)
+
+
+def covariance_change(W0, W1):
+    """
+    Compute the relative change in the loadings' contribution to the model covariance (|W1 W1' - W0 W0'| / |W0 W0'|,
+    using Frobenius norms).  Unlike the change in the loadings themselves, this is unaffected by rotations of the
+    latent space.
+    """
+    before = np.sum(np.dot(W0.T, W0) ** 2)
+    change = np.sum(np.dot(W1.T, W1) ** 2) - 2 * np.sum(np.dot(W1.T, W0) ** 2) + before
+    return np.sqrt(max(change, 0) / before)
+
+
+class MiniBatchPPCA:
+    """
+    Probabilistic PCA for datasets with missing values that are too large to process at once.  Data are processed in
+    chunks of batch_size rows: each EM iteration accumulates the sufficient statistics of the loadings and noise
+    variance over chunks, and missing values are integrated out of each observation's posterior (rather than being
+    filled in), so the memory used depends on the batch size rather than the number of observations.
+
+    Datasets that can be traversed repeatedly (arrays, memory-mapped arrays, DataFrames, and lists of chunks) are fit
+    using exact (batch) EM, where each iteration is one pass through the data.  Streams (iterators, e.g. generators)
+    can only be traversed once; they are fit using stepwise (online) EM, in which the sufficient statistics are
+    updated with each chunk (as in partial_fit).
+
+    Parameters
+    ----------
+    :param n_components: the number of components (default: None; use all features)
+    :param batch_size: the number of rows per chunk (default: None; use 5 * the number of features, or each item of an
+      iterable as its own chunk)
+    :param max_iter: the maximum number of passes through the data (default: 100)
+    :param tol: convergence threshold, applied to the relative changes in the model covariance and noise variance
+      (default: 1e-4)
+    :param min_obs: minimum number of observed values required to use a feature (default: 10)
+    :param learning_decay: controls the step size of stepwise EM updates; the statistics from the t-th chunk are
+      weighted by (t + 1) ** -learning_decay (default: 0.7; should be between 0.5 and 1)
+    :param random_state: seed used to initialize the loadings when there are fewer observations than components
+    :param verbose: if True, print the change in the parameters after each iteration (default: False)
+    """
+    def __init__(self, n_components=None, batch_size=None, max_iter=100, tol=1e-4, min_obs=10, learning_decay=0.7,
+                 random_state=None, verbose=False):
+        self.n_components = n_components
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+        self.min_obs = min_obs
+        self.learning_decay = learning_decay
+        self.random_state = random_state
+        self.verbose = verbose
+        self._reset()
+
+    def _reset(self):
+        self.W = None
+        self.ss = None
+        self.C = None
+        self.counts = None
+        self.means = None
+        self.m2 = None
+        self.stds = None
+        self.valid_series = None
+        self.stats = None
+        self.n_batches = 0
+        self.n_iter = 0
+
+    def _get_batch_size(self, data):
+        if self.batch_size is not None:
+            return self.batch_size
+        elif hasattr(data, 'shape') and len(data.shape) == 2:
+            return 5 * data.shape[1]
+        return None
+
+    def _update_moments(self, chunk):
+        """
+        Update the running per-feature counts, means, and sums of squared deviations with a chunk of data (ignoring
+        missing values), using Chan et al.'s parallel algorithm
+        """
+        observed = ~np.isnan(chunk)
+        n = np.sum(observed, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(n > 0, np.sum(np.where(observed, chunk, 0), axis=0) / n, 0)
+        deviations = np.where(observed, chunk - means, 0)
+        m2 = np.einsum('ij,ij->j', deviations, deviations)
+
+        if self.counts is None:
+            self.counts, self.means, self.m2 = n, means, m2
+        else:
+            total = self.counts + n
+            delta = means - self.means
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weight = np.where(total > 0, n / total, 0)
+            self.means = self.means + delta * weight
+            self.m2 = self.m2 + m2 + delta ** 2 * self.counts * weight
+            self.counts = total
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.stds = np.sqrt(self.m2 / self.counts)
+        self.stds[~(self.stds > 0)] = 1
+        self.valid_series = self.counts >= self.min_obs
+
+    def _standardize(self, chunk):
+        """
+        Standardize a chunk of data, returning the standardized values (with missing values, and values of features
+        with too few observations, set to 0) and a boolean array indicating which values should be used
+        """
+        if self.means is None:
+            raise RuntimeError('Fit the data model first.')
+
+        x = (chunk - self.means) / self.stds
+        observed = ~np.isnan(x)
+        observed[:, ~self.valid_series] = False
+        x[~observed] = 0
+        return x, observed
+
+    def _initialize(self, x):
+        """
+        Initialize the loadings and noise variance using the principal components of a (standardized) chunk
+        """
+        n, D = x.shape
+        d = D if self.n_components is None else self.n_components
+
+        k = min(d, n, D)
+        _, s, v = randomized_svd(x, k, random_state=self.random_state)
+        variances = s ** 2 / max(n, 1)
+        total = np.einsum('ij,ij->', x, x) / max(n, 1)
+
+        self.ss = max((total - np.sum(variances)) / max(D - k, 1), 1e-6 * total / D, 1e-12)
+        self.W = v.T * np.sqrt(np.maximum(variances - self.ss, 0))
+        if k < d:
+            rng = np.random.RandomState(self.random_state)
+            self.W = np.hstack([self.W, np.sqrt(self.ss) * rng.randn(D, d - k)])
+
+    def _components(self):
+        """
+        Compute an orthonormal basis for the loadings' subspace, ordered by the variance explained by each component
+        """
+        u, s, _ = np.linalg.svd(self.W, full_matrices=False)
+        self.C = u
+        self.eig_vals = s ** 2 + self.ss
+        self.var_exp = np.cumsum(self.eig_vals) / max(np.sum(self.valid_series), 1)
+
+    def fit(self, data, y=None):
+        """
+        Fit the model to a dataset
+
+        Parameters
+        ----------
+        :param data: a 2D array (including memory-mapped arrays) or DataFrame, or an iterable (e.g., a list or
+          generator) of arrays or DataFrames
+        :param y: ignored
+
+        Returns
+        -------
+        :return: the fitted model
+        """
+        self._reset()
+        if iter(data) is data:  # streams can only be traversed once
+            for chunk in chunks(data, self.batch_size):
+                self.partial_fit(chunk)
+            return self
+
+        batch_size = self._get_batch_size(data)
+        for chunk in chunks(data, batch_size):
+            self._update_moments(chunk)
+
+        for i in range(self.max_iter):
+            stats = None
+            for chunk in chunks(data, batch_size):
+                x, observed = self._standardize(chunk)
+                if self.W is None:
+                    self._initialize(x)
+
+                next_stats = sufficient_statistics(x, observed, self.W, self.ss)
+                if stats is None:
+                    stats = next_stats
+                else:
+                    stats = {k: stats[k] + next_stats[k] for k in stats.keys()}
+
+            W, ss = maximize(stats)
+            diff = max(covariance_change(self.W, W), abs(ss / self.ss - 1))
+            self.W, self.ss = W, ss
+            self.n_iter = i + 1
+
+            if self.verbose:
+                print(diff)
+            if diff < self.tol:
+                break
+
+        self._components()
+        return self
+
+    def partial_fit(self, data, y=None):
+        """
+        Update the model with a single chunk of data, using a stepwise EM update: the chunk's (per-observation)
+        sufficient statistics are blended into the running statistics with weight (t + 1) ** -learning_decay, where t is
+        the number of chunks seen so far.  The standardization statistics are also updated with each chunk.
+
+        Parameters
+        ----------
+        :param data: a 2D array or DataFrame
+        :param y: ignored
+
+        Returns
+        -------
+        :return: the updated model
+        """
+        chunk = next(chunks(data))
+        self._update_moments(chunk)
+        x, observed = self._standardize(chunk)
+        if self.W is None:
+            self._initialize(x)
+
+        stats = {k: v / max(x.shape[0], 1) for k, v in sufficient_statistics(x, observed, self.W, self.ss).items()}
+        if self.stats is None:
+            self.stats = stats
+        else:
+            step = (self.n_batches + 1) ** -self.learning_decay
+            self.stats = {k: (1 - step) * self.stats[k] + step * stats[k] for k in stats.keys()}
+
+        self.W, self.ss = maximize(self.stats)
+        self.n_batches += 1
+        self.n_iter = self.n_batches
+        self._components()
+        return self
+
+    def transform(self, data):
+        """
+        Project data onto the fitted components.  Missing values are replaced with their expected values (given each
+        observation's observed values) before projecting.
+
+        Parameters
+        ----------
+        :param data: a 2D array (including memory-mapped arrays) or DataFrame, or an iterable of arrays or DataFrames
+
+        Returns
+        -------
+        :return: a number-of-observations by number-of-components array
+        """
+        if self.C is None:
+            raise RuntimeError('Fit the data model first.')
+
+        projected = []
+        for chunk in chunks(data, self._get_batch_size(data)):
+            x, observed = self._standardize(chunk)
+            expected = np.dot(posterior(x, observed, self.W, self.ss)[0], self.W.T)
+            x[~observed] = expected[~observed]
+            projected.append(np.dot(x, self.C))
+        return np.concatenate(projected, axis=0)
+
+    def fit_transform(self, data, y=None):
+        assert iter(data) is not data, ValueError('streams can only be traversed once; use fit (or partial_fit) '
+                                                  'followed by transform')
+        return self.fit(data).transform(data)
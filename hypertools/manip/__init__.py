@@ -3,4 +3,4 @@ from .common import Manipulator
 from .normalize import Normalize
 from .zscore import ZScore
 from .resample import Resample
-from .smooth import Smooth
+from .smooth import Smooth, StreamingSmooth
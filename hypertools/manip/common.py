@@ -1,21 +1,113 @@
 # noinspection PyPackageRequirements
 import datawrangler as dw
+import numpy as np
+import pandas as pd
 from sklearn.base import BaseEstimator
 from sklearn.exceptions import NotFittedError
 
 
+def group_slices(data):
+    """
+    Find the (contiguous) blocks of rows that belong to each group of a stacked dataset
+
+    Parameters
+    ----------
+    :param data: a DataFrame.  If data has a MultiIndex, groups are defined by the outermost index level; otherwise
+      all rows are treated as a single group.
+
+    Returns
+    -------
+    :return: a list of slice objects (one per block of rows)
+    """
+    if not dw.zoo.is_multiindex_dataframe(data):
+        return [slice(0, data.shape[0])]
+
+    codes = np.asarray(data.index.codes[0])
+    edges = [0, *(np.flatnonzero(np.diff(codes)) + 1), len(codes)]
+    return [slice(a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def group_batches(groups):
+    """
+    Bucket blocks of rows (e.g., returned by group_slices) by length, so that equal-length groups can be processed
+    together in a single vectorized call
+
+    Parameters
+    ----------
+    :param groups: a list of slice objects (with explicit start and stop values)
+
+    Returns
+    -------
+    :return: a list of (rows, members) tuples (one per distinct group length).  Each rows entry is a number-of-groups
+      by group-length array of row indices (so that values[rows] stacks every group in the bucket into a 3D array),
+      or a slice if the bucket contains a single group (so that values[rows] is a view rather than a copy).  Each
+      members entry lists the positions (in groups) of the bucket's groups.
+    """
+    lengths = np.array([g.stop - g.start for g in groups])
+    starts = np.array([g.start for g in groups])
+
+    batches = []
+    for length in np.unique(lengths):
+        members = np.flatnonzero(lengths == length)
+        if len(members) == 1:
+            batches.append((groups[members[0]], members))
+        else:
+            batches.append((starts[members][:, np.newaxis] + np.arange(length), members))
+    return batches
+
+
+def get_values(data, inplace=False):
+    """
+    Return a float array containing a DataFrame's values, which may be safely modified
+
+    Parameters
+    ----------
+    :param data: a DataFrame
+    :param inplace: if True and the DataFrame is backed by a single writeable float array, return that array (so that
+      modifying it also modifies the DataFrame).  Otherwise (default) return a copy.
+
+    Returns
+    -------
+    :return: a numpy array
+    """
+    values = data.values
+    if inplace and values.dtype.kind == 'f' and values.flags.writeable and np.shares_memory(values, data.values):
+        return values
+    return np.array(values, dtype=float)
+
+
+def set_values(data, values, inplace=False):
+    """
+    Package an array of manipulated values (e.g., the output of get_values) as a DataFrame with the same index and
+    columns as the original data.  If inplace is True, the original DataFrame is updated (if needed) and returned.
+    """
+    if inplace:
+        if not np.shares_memory(values, data.values):
+            data.loc[:, :] = values
+        return data
+    return pd.DataFrame(values, index=data.index, columns=data.columns)
+
+
 # noinspection DuplicatedCode
 class Manipulator(BaseEstimator):
+    """
+    Base class for Manipulator objects.  Fitting a manipulator computes (only) the parameters needed to transform
+    data; the fitted manipulator may then be applied to new data via transform(data).  By default the training data
+    are not retained (keep_data=False); if keep_data is True, calling transform() with no arguments transforms the
+    training data.
+    """
     def __init__(self, **kwargs):
         self.data = kwargs.pop('data', None)
         self.fitter = kwargs.pop('fitter', None)
         self.transformer = kwargs.pop('transformer', None)
+        self.partial_fitter = kwargs.pop('partial_fitter', None)
         self.required = kwargs.pop('required', [])
+        self.keep_data = kwargs.pop('keep_data', False)
         self.kwargs = kwargs
 
     def fit(self, data):
         assert data is not None, ValueError('cannot manipulate an empty dataset')
-        self.data = data
+        self.data = data if self.keep_data else None
 
         if self.fitter is None:
             NotFittedError('null fit function; returning without fitting manipulator')
@@ -27,19 +119,45 @@ class Manipulator(BaseEstimator):
                                                                             'returned')
         for k, v in params.items():
             setattr(self, k, v)
+        return self
+
+    def partial_fit(self, data):
+        """
+        Update the fitted parameters using an additional chunk of data.  Only the fitted parameters (e.g., running
+        statistics) are retained, so arbitrarily long streams of data may be processed in constant memory.
+        """
+        assert data is not None, ValueError('cannot manipulate an empty dataset')
+        if self.partial_fitter is None:
+            raise NotImplementedError(f'{type(self).__name__} does not support partial_fit')
+
+        if all([hasattr(self, r) for r in self.required]):
+            previous = {r: getattr(self, r) for r in self.required}
+        else:
+            previous = None
+
+        params = self.partial_fitter(data, previous, **self.kwargs)
+        assert type(params) is dict, ValueError('partial fit function must return a dictionary')
+        assert all([r in params.keys() for r in self.required]), ValueError('one or more required fields not'
+                                                                            'returned')
+        for k, v in params.items():
+            setattr(self, k, v)
+        return self
 
-    def transform(self, *_):
-        assert self.data is not None, NotFittedError('must fit manipulator before transforming data')
+    def transform(self, data=None):
         for r in self.required:
             assert hasattr(self, r), NotFittedError(f'missing fitted attribute: {r}')
+        if data is None:
+            data = self.data
+        assert data is not None, ValueError('must specify data to transform (training data are only retained if '
+                                            'keep_data=True)')
 
         if self.transformer is None:
             RuntimeWarning('null transform function; returning without manipulating data')
-            return self.data
+            return data
 
         required_params = {r: getattr(self, r) for r in self.required}
-        return self.transformer(self.data, **dw.core.update_dict(required_params, self.kwargs))
+        return self.transformer(data, **dw.core.update_dict(required_params, self.kwargs))
 
     def fit_transform(self, data):
         self.fit(data)
-        return self.transform()
+        return self.transform(data)
@@ -0,0 +1,127 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+
+from . import normalize, smooth, zscore
+from .common import group_slices
+from .normalize import Normalize
+from .smooth import Smooth
+from .zscore import ZScore
+
+
+# noinspection PyUnusedLocal
+def zscore_step(m, values, labels, groups):
+    params = zscore.fit_params(values, axis=m.axis, index=labels[m.axis])
+    zscore.transform_array(values, params['mean'].values, params['std'].values, axis=m.axis, out=values)
+    return params
+
+
+# noinspection PyUnusedLocal
+def normalize_step(m, values, labels, groups):
+    assert m.min < m.max, ValueError('minimum must be strictly less than maximum')
+    params = normalize.fit_params(values, axis=m.axis, min=m.min, max=m.max, index=labels[m.axis])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalize.transform_array(values, params['baseline'].values, params['peak'].values, min=m.min, max=m.max,
+                                  axis=m.axis, out=values)
+    return params
+
+
+def smooth_step(m, values, labels, groups):
+    params = smooth.fit_params(values, axis=m.axis, kernel_width=m.kernel_width, order=m.order,
+                               maintain_bounds=m.maintain_bounds, index=labels[m.axis])
+    if m.maintain_bounds:
+        bounds = {'min': params['min'].values, 'max': params['max'].values}
+    else:
+        bounds = {}
+    smooth.transform_array(values, smooth.check_kernel_width(m.kernel_width), m.order, axis=m.axis, groups=groups,
+                           out=values, **bounds)
+    return params
+
+
+# in-place fit + transform kernels for each manipulator that may be fused into a chain
+kernels = {ZScore: zscore_step, Normalize: normalize_step, Smooth: smooth_step}
+
+
+def plan(model, **kwargs):
+    """
+    Decide whether a sequence of manipulators can be fused into a single pass over one buffer
+
+    Parameters
+    ----------
+    :param model: a list of (unpacked) manipulators, specified as classes or as dictionaries with 'model', 'args', and
+      'kwargs' keys
+    :param kwargs: keyword arguments that would otherwise be passed to apply_model
+
+    Returns
+    -------
+    :return: a list of dictionaries (one per step, each with 'model', 'args', and 'kwargs' keys, where 'model' is an
+      unfitted manipulator instance) if the chain can be fused, or None if the chain must be applied step by step
+    """
+    kwargs = {k: v for k, v in kwargs.items() if k not in ['search', 'return_model']}
+    if kwargs.pop('mode', 'fit_transform') != 'fit_transform' or kwargs.pop('custom', False):
+        return None
+    if type(model) is not list or len(model) < 2:
+        return None
+
+    steps = []
+    for m in model:
+        if type(m) is dict:
+            if len(m['args']) > 0 or any([k in m['kwargs'] for k in ['mode', 'custom', 'return_model']]):
+                return None
+            m, m_kwargs = m['model'], dw.core.update_dict(m['kwargs'], kwargs)
+        else:
+            m_kwargs = kwargs
+
+        if m not in kernels.keys():
+            return None
+        instance = m(**m_kwargs)
+        if instance.axis not in [0, 1]:
+            return None
+        steps.append({'model': instance, 'args': [], 'kwargs': m_kwargs})
+    return steps
+
+
+def apply_chain(data, steps, return_model=False):
+    """
+    Fit and apply a fused sequence of manipulators (see plan).  The data are copied into a single contiguous float
+    buffer, and every step fits its parameters on (and then transforms) that buffer in place, so that the whole chain
+    makes exactly one output allocation.  Each step's manipulator is left in the same fitted state as if it had been
+    fit on its own.
+
+    Parameters
+    ----------
+    :param data: a DataFrame, 2D numpy array, or a list of DataFrames or arrays
+    :param steps: a list of steps returned by plan
+    :param return_model: if True, also return the list of fitted steps (default: False)
+
+    Returns
+    -------
+    :return: the manipulated data (in the same format apply_model would return), and the fitted steps if return_model
+      is True
+    """
+    if type(data) is list:
+        stacked_data = dw.stack(data)
+    elif dw.zoo.is_dataframe(data):
+        stacked_data = data
+    elif dw.zoo.is_array(data):
+        stacked_data = pd.DataFrame(data)
+    else:
+        raise ValueError(f'unsupported datatype: {type(data)}')
+
+    values = np.array(stacked_data.values, dtype=float)
+    labels = [stacked_data.columns, stacked_data.index]
+    groups = group_slices(stacked_data)
+
+    for s in steps:
+        params = kernels[type(s['model'])](s['model'], values, labels, groups)
+        for k, v in params.items():
+            setattr(s['model'], k, v)
+
+    result = pd.DataFrame(values, index=stacked_data.index, columns=stacked_data.columns)
+    if type(data) is list:
+        result = dw.unstack(result)
+
+    if return_model:
+        return result, steps
+    return result
@@ -3,18 +3,25 @@ import datawrangler as dw
 
 from .normalize import Normalize
 from .resample import Resample
-from .smooth import Smooth
+from .smooth import Smooth, StreamingSmooth
 from .zscore import ZScore
 from .common import Manipulator
+from .fuse import plan, apply_chain
 
 from ..core import get_default_options, get_model, apply_model
 from ..core.shared import unpack_model
 
 
 def manip(data, model='ZScore', **kwargs):
-    manipulators = [Normalize, Resample, Smooth, ZScore]
+    manipulators = [Normalize, Resample, Smooth, StreamingSmooth, ZScore]
     opts = dw.core.update_dict(get_default_options()['manip'], kwargs)
     opts['search'] = ['sklearn.preprocessing']
 
     model = unpack_model(model, valid=manipulators, parent_class=Manipulator)
+
+    # chains of ZScore, Normalize, and Smooth steps are run in a single pass over one buffer
+    if opts.pop('fuse', True):
+        steps = plan(model, **opts)
+        if steps is not None:
+            return apply_chain(data, steps, return_model=opts.get('return_model', False))
     return apply_model(data, model, **opts)
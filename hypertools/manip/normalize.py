@@ -3,64 +3,99 @@ import datawrangler as dw
 import numpy as np
 import pandas as pd
 
-from .common import Manipulator
+from .common import Manipulator, get_values, set_values
 
 
-# noinspection PyShadowingBuiltins
-@dw.decorate.apply_stacked
-def fitter(data, axis=0, min=0, max=1):
-    assert min < max, ValueError('minimum must be strictly less than maximum')
+def fit_array(values, axis=0):
+    """
+    Compute the minimum and range of an array along the given axis, ignoring NaNs
+    """
+    baseline = np.min(values, axis=axis)
+    peak = np.max(values, axis=axis)
+    if np.any(np.isnan(baseline)):
+        baseline = np.nanmin(values, axis=axis)
+        peak = np.nanmax(values, axis=axis)
+    return baseline, peak - baseline
 
+
+# noinspection PyShadowingBuiltins
+def transform_array(values, baseline, peak, min=0, max=1, axis=0, out=None):
+    """
+    Rescale an array so that each baseline maps onto min and each baseline + peak maps onto max (broadcast along
+    the given axis).  If out is specified, the result is written into it (out may be values itself).
+    """
+    baseline = np.asarray(baseline)
+    scale = (max - min) / np.asarray(peak)
     if axis == 1:
-        return dw.core.update_dict(fitter(data.T, axis=0, min=min, max=max), {'transpose': True})
-    elif axis != 0:
-        raise ValueError('axis must be either 0 or 1')
+        baseline = baseline[:, np.newaxis]
+        scale = scale[:, np.newaxis]
 
-    baseline = pd.Series(index=data.columns)
-    peak = pd.Series(index=data.columns)
+    out = np.subtract(values, baseline, out=out)
+    np.multiply(out, scale, out=out)
+    return np.add(out, min, out=out)
 
-    z = data.copy()
-    for c in z.columns:
-        baseline[c] = z[c].min(axis=0)
-        z[c] -= baseline[c]
 
-        peak[c] = z[c].max(axis=0)
+# noinspection PyShadowingBuiltins,PyUnusedLocal
+def fitter(data, axis=0, min=0, max=1, inplace=False):
+    assert min < max, ValueError('minimum must be strictly less than maximum')
+    if axis not in [0, 1]:
+        raise ValueError('axis must be either 0 or 1')
 
-    return {'baseline': baseline, 'peak': peak, 'axis': axis, 'transpose': False, 'min': min, 'max': max}
+    return fit_params(data.values, axis=axis, min=min, max=max, index=data.columns if axis == 0 else data.index)
+
+
+# noinspection PyShadowingBuiltins
+def fit_params(values, axis=0, min=0, max=1, index=None):
+    """
+    Compute the fitted parameters of a Normalize manipulator from an array of values (index labels the columns, if
+    axis is 0, or the rows, if axis is 1)
+    """
+    baseline, peak = fit_array(values, axis=axis)
+    return {'baseline': pd.Series(baseline, index=index), 'peak': pd.Series(peak, index=index), 'axis': axis,
+            'min': min, 'max': max}
+
+
+# noinspection PyShadowingBuiltins,PyUnusedLocal
+def partial_fitter(data, previous=None, axis=0, min=0, max=1, inplace=False):
+    if axis != 0:
+        raise ValueError('partial_fit is only supported for axis=0')
+    params = fitter(data, axis=axis, min=min, max=max)
+    if previous is None:
+        return params
+
+    baseline = np.fmin(previous['baseline'].values, params['baseline'].values)
+    top = np.fmax((previous['baseline'] + previous['peak']).values, (params['baseline'] + params['peak']).values)
+    return dw.core.update_dict(params, {'baseline': pd.Series(baseline, index=data.columns),
+                                        'peak': pd.Series(top - baseline, index=data.columns)})
 
 
 # noinspection DuplicatedCode
-@dw.decorate.apply_stacked
 def transformer(data, **kwargs):
-    transpose = kwargs.pop('transpose', False)
     assert 'axis' in kwargs.keys(), ValueError('Must specify axis')
+    assert kwargs['axis'] in [0, 1], ValueError('invalid transformation')
+    inplace = kwargs.get('inplace', False)
 
-    if transpose:
-        return transformer(data.T, **dw.core.update_dict(kwargs, {'axis': int(not kwargs['axis'])})).T
-
-    assert kwargs['axis'] == 0, ValueError('invalid transformation')
-
-    z = data.copy()
-    for c in z.columns:
-        z[c] -= kwargs['baseline'][c]
-        z[c] /= kwargs['peak'][c]
-
-    z *= (kwargs['max'] - kwargs['min'])
-    z += kwargs['min']
-    return z
+    values = get_values(data, inplace=inplace)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        transform_array(values, kwargs['baseline'], kwargs['peak'], min=kwargs['min'], max=kwargs['max'],
+                        axis=kwargs['axis'], out=values)
+    return set_values(data, values, inplace=inplace)
 
 
 class Normalize(Manipulator):
     # noinspection PyShadowingBuiltins
-    def __init__(self, min=0, max=1, axis=0):
-        required = ['min', 'max', 'transpose', 'baseline', 'peak', 'axis']
-        super().__init__(min=min, max=max, axis=axis, fitter=fitter, transformer=transformer, data=None,
-                         required=required)
+    def __init__(self, min=0, max=1, axis=0, inplace=False, keep_data=False):
+        required = ['min', 'max', 'baseline', 'peak', 'axis']
+        super().__init__(min=min, max=max, axis=axis, inplace=inplace, fitter=fitter, transformer=transformer,
+                         partial_fitter=partial_fitter, data=None, keep_data=keep_data, required=required)
 
         self.min = min
         self.max = max
         self.axis = axis
+        self.inplace = inplace
         self.fitter = fitter
         self.transformer = transformer
+        self.partial_fitter = partial_fitter
         self.data = None
+        self.keep_data = keep_data
         self.required = required
@@ -4,96 +4,141 @@ import numpy as np
 import pandas as pd
 import scipy.interpolate as interpolate
 
-from .common import Manipulator
+from .common import Manipulator, group_slices
 
-from ..core import get
 
+def fit_array(x, values, axis=0):
+    """
+    Fit piecewise cubic Hermite interpolating polynomials (PCHIP) to every column (axis=0) or row (axis=1) of an
+    array (or to every trailing slice of an N-dimensional array, if axis=0) in a single call
 
-def fitter(data, **kwargs):
-    def listify_dicts(dicts):
-        if len(dicts) == 0:
-            return {}
-        ld = {}
-        for d in dicts:
-            for k in d.keys():
-                if k not in ld.keys():
-                    ld[k] = [d[k]]
-                else:
-                    ld[k].append(d[k])
-        return ld
+    Parameters
+    ----------
+    :param x: a 1D array of (strictly increasing) sample positions along the given axis
+    :param values: an array of sampled values
+    :param axis: the axis of values that corresponds to x (default: 0)
 
-    if dw.zoo.is_multiindex_dataframe(data):
-        return listify_dicts([fitter(d, **kwargs) for d in dw.unstack(data)])
-    elif type(data) is list:
-        return listify_dicts([fitter(d, **kwargs) for d in data])
+    Returns
+    -------
+    :return: the polynomial coefficients (with shape (4, len(x) - 1, ...)); see scipy.interpolate.PPoly
+    """
+    return interpolate.PchipInterpolator(x, values, axis=axis).c
 
-    transpose = kwargs.pop('transpose', False)
-    assert 'axis' in kwargs.keys(), ValueError('Must specify axis')
 
-    if kwargs['axis'] == 1:
-        return fitter(data.T, **dw.core.update_dict(kwargs, {'axis': int(not kwargs['axis']), 'transpose': True}))
+def transform_array(x, coefs, resampled_x):
+    """
+    Evaluate piecewise polynomials (e.g., returned by fit_array) at new sample positions
 
-    assert kwargs['axis'] == 0, ValueError('invalid transformation')
+    Parameters
+    ----------
+    :param x: the breakpoints used to fit the polynomials
+    :param coefs: the polynomial coefficients
+    :param resampled_x: the new sample positions
 
-    if dw.zoo.is_multiindex_dataframe(data):
-        x = np.array(data.index.levels[-1])
-    else:
-        x = data.index.values
+    Returns
+    -------
+    :return: an array with shape (len(resampled_x), ...)
+    """
+    return interpolate.PPoly.construct_fast(coefs, x, extrapolate=True)(resampled_x)
 
-    resampled_x = np.linspace(np.min(x), np.max(x), num=kwargs['n_samples'])
-    pchip = pd.Series(index=data.columns)
-    for c in data.columns:
-        pchip[c] = interpolate.pchip(x, data[c].values)
 
-    return {'x': x, 'resampled_x': resampled_x, 'pchip': pchip, 'transpose': transpose, 'axis': kwargs['axis'],
-            'n_samples': kwargs['n_samples']}
+def get_x(data):
+    if dw.zoo.is_multiindex_dataframe(data):
+        return np.asarray(data.index.get_level_values(-1), dtype=float)
+    return np.asarray(data.index.values, dtype=float)
+
+
+def fit_batches(data, axis=0, n_samples=100):
+    """
+    Fit interpolating polynomials to a dataset, batching together groups that are sampled at identical positions
+
+    Parameters
+    ----------
+    :param data: a DataFrame (if data has a MultiIndex and axis is 0, each group is interpolated separately)
+    :param axis: the axis to resample along (default: 0)
+    :param n_samples: the number of (evenly spaced) samples to resample each group to (default: 100)
+
+    Returns
+    -------
+    :return: a dictionary with the following fields (each a list, with one entry per batch):
+        - 'x': the original sample positions
+        - 'coefs': the polynomial coefficients (see fit_array)
+        - 'batches': the positions (in group_slices(data)) of the groups in the batch
+        - 'resampled_x': the new sample positions
+    """
+    if axis == 1:
+        x = np.asarray(data.columns.values, dtype=float)
+        return {'x': [x], 'resampled_x': [np.linspace(np.min(x), np.max(x), num=n_samples)],
+                'coefs': [fit_array(x, data.values, axis=1)], 'batches': [np.array([0])]}
+    elif axis != 0:
+        raise ValueError('invalid transformation')
+
+    groups = group_slices(data)
+    positions = get_x(data)
+    batches = {}
+    for i, g in enumerate(groups):
+        x = positions[g]
+        batches.setdefault((len(x), x.tobytes()), (x, []))[1].append(i)
+
+    values = data.values
+    xs, coefs, members = [], [], []
+    for x, inds in batches.values():
+        xs.append(x)
+        coefs.append(fit_array(x, np.stack([values[groups[i]] for i in inds], axis=1), axis=0))
+        members.append(np.array(inds))
+
+    return {'x': xs, 'coefs': coefs, 'batches': members,
+            'resampled_x': [np.linspace(np.min(x), np.max(x), num=n_samples) for x in xs]}
+
+
+# noinspection PyUnusedLocal
+def fitter(data, axis=0, n_samples=100):
+    if axis not in [0, 1]:
+        raise ValueError('invalid transformation')
+    return {'axis': axis, 'n_samples': n_samples}
 
 
 def transformer(data, **kwargs):
-    if dw.zoo.is_multiindex_dataframe(data):
-        stack_result = True
-        data = dw.unstack(data)
-    else:
-        stack_result = False
-
-    if type(data) is list:
-        transformed_data = []
-        for i, d in enumerate(data):
-            next_kwargs = {k: get(v, i) for k, v in kwargs.items()}
-            transformed_data.append(transformer(d, **next_kwargs))
-        if stack_result:
-            return dw.stack(transformed_data)
-        else:
-            return transformed_data
-
-    # noinspection DuplicatedCode
-    transpose = kwargs.pop('transpose', False)
     assert 'axis' in kwargs.keys(), ValueError('Must specify axis')
+    n_samples = kwargs['n_samples']
+    fitted = fit_batches(data, axis=kwargs['axis'], n_samples=n_samples)
 
-    if transpose:
-        return transformer(data.T, **dw.core.update_dict(kwargs, {'axis': int(not kwargs['axis'])})).T
+    if kwargs['axis'] == 1:
+        resampled = transform_array(fitted['x'][0], fitted['coefs'][0], fitted['resampled_x'][0])
+        return pd.DataFrame(resampled.T, index=data.index, columns=fitted['resampled_x'][0])
 
-    assert kwargs['axis'] == 0, ValueError('invalid transformation')
-    resampled = pd.DataFrame(index=kwargs['resampled_x'], columns=data.columns)
+    groups = group_slices(data)
+    resampled = np.empty([len(groups), n_samples, data.shape[1]])
+    resampled_x = np.empty([len(groups), n_samples])
+    for x, coefs, inds, rx in zip(fitted['x'], fitted['coefs'], fitted['batches'], fitted['resampled_x']):
+        resampled[inds] = np.swapaxes(transform_array(x, coefs, rx), 0, 1)
+        resampled_x[inds] = rx
 
-    for c in data.columns:
-        try:
-            resampled[c] = kwargs['pchip'][c](kwargs['resampled_x'])
-        except IndexError:
-            resampled[c] = kwargs['pchip'][int(c)](kwargs['resampled_x'])
-    return resampled
+    if dw.zoo.is_multiindex_dataframe(data):
+        keys = data.index.levels[0][np.asarray(data.index.codes[0])[[g.start for g in groups]]]
+        index = pd.MultiIndex.from_arrays([np.repeat(keys, n_samples), resampled_x.ravel()],
+                                          names=data.index.names[:1] + data.index.names[-1:])
+    else:
+        index = pd.Index(resampled_x[0], name=data.index.name)
+    return pd.DataFrame(resampled.reshape([-1, data.shape[1]]), index=index, columns=data.columns)
 
 
 class Resample(Manipulator):
+    """
+    Resample data to a fixed number of evenly spaced samples using piecewise cubic Hermite interpolation.  Resampling
+    has no data-dependent parameters; each dataset passed to transform is interpolated (in batches of identically
+    sampled groups) and resampled to n_samples samples.
+    """
     # noinspection PyShadowingBuiltins
-    def __init__(self, axis=0, n_samples=100):
-        required = ['transpose', 'axis', 'n_samples', 'x', 'resampled_x', 'pchip']
+    def __init__(self, axis=0, n_samples=100, keep_data=False):
+        required = ['axis', 'n_samples']
         super().__init__(axis=axis, fitter=fitter, transformer=transformer, data=None, n_samples=n_samples,
-                         required=required)
+                         keep_data=keep_data, required=required)
 
         self.axis = axis
         self.fitter = fitter
         self.transformer = transformer
         self.data = None
+        self.keep_data = keep_data
         self.n_samples = n_samples
         self.required = required
@@ -2,72 +2,258 @@
 import datawrangler as dw
 import numpy as np
 import pandas as pd
-import scipy.interpolate as interpolate
-from scipy.signal import savgol_filter
+from scipy.signal import lfilter, savgol_coeffs, savgol_filter
 
 import warnings
 
-from .common import Manipulator
+from .common import Manipulator, group_batches, group_slices
 
 
-@dw.decorate.apply_stacked
-def fitter(data, **kwargs):
-    data_max = data.max(axis=kwargs['axis'])
-    data_min = data.min(axis=kwargs['axis'])
+def check_kernel_width(kernel_width):
+    if kernel_width != int(np.round(kernel_width)):
+        warnings.warn('Rounding smoothing kernel width to the nearest integer')
+        kernel_width = int(kernel_width)
+    if kernel_width % 2 != 1:
+        warnings.warn('Increasing smoothing kernel width by 1 (must be odd)')
+        kernel_width += 1
+    assert kernel_width > 0, ValueError('smoothing kernel width must be a positive odd integer')
+    return kernel_width
 
-    return {'axis': kwargs['axis'], 'kernel_width': kwargs['kernel_width'], 'order': kwargs['order'], 'max': data_max,
-            'min': data_min, 'maintain_bounds': kwargs['maintain_bounds']}
 
+# noinspection PyShadowingBuiltins
+def transform_array(values, kernel_width, order, axis=0, min=None, max=None, groups=None, out=None):
+    """
+    Apply a Savitzky-Golay filter to an array along the given axis, optionally clipping the result to the given
+    bounds (broadcast along the given axis)
 
-@dw.decorate.apply_stacked
-def transformer(data, **kwargs):
-    assert 'axis' in kwargs.keys(), ValueError('Must specify axis')
-    axis = kwargs.pop('axis', None)
+    Parameters
+    ----------
+    :param values: a 2D numpy array
+    :param kernel_width: the filter's window length (a positive odd integer)
+    :param order: the order of the polynomial used to fit the samples in each window
+    :param axis: the axis to smooth along (default: 0)
+    :param min: (optional) lower bounds; one per column (if axis is 0) or row (if axis is 1)
+    :param max: (optional) upper bounds; one per column (if axis is 0) or row (if axis is 1)
+    :param groups: (optional) a list of slices specifying blocks of rows that are smoothed independently (only used
+      if axis is 0).  Equal-length blocks are smoothed together, in a single call.
+    :param out: (optional) array to write the result into
+
+    Returns
+    -------
+    :return: the smoothed array
+    """
+    if out is None:
+        out = np.empty(values.shape, dtype=float)
+    if axis != 0:
+        mode = 'interp' if values.shape[axis] >= kernel_width else 'nearest'
+        out[:] = savgol_filter(values, kernel_width, order, axis=axis, mode=mode)
+    else:
+        if groups is None:
+            groups = [slice(0, values.shape[0])]
 
-    transpose = False
-    if axis == 1:
-        transpose = not transpose
-        axis = int(not axis)
-    elif axis != 0:
+        # rows are the second-to-last axis of both single blocks (2D) and stacked equal-length blocks (3D)
+        for rows, _ in group_batches(groups):
+            x = values[rows]
+            mode = 'interp' if x.shape[-2] >= kernel_width else 'nearest'
+            out[rows] = savgol_filter(x, kernel_width, order, axis=-2, mode=mode)
+
+    if (min is not None) and (max is not None):
+        min = np.asarray(min)
+        max = np.asarray(max)
+        if axis == 1:
+            min = min[:, np.newaxis]
+            max = max[:, np.newaxis]
+        np.clip(out, min, max, out=out)
+    return out
+
+
+def fitter(data, **kwargs):
+    axis = kwargs['axis']
+    if axis not in [0, 1]:
         raise ValueError(f'Invalid smoothing axis: {axis}')
 
-    if kwargs['kernel_width'] != int(np.round(kwargs['kernel_width'])):
-        warnings.warn('Rounding smoothing kernel width to the nearest integer')
-        kwargs['kernel_width'] = int(kwargs['kernel_width'])
-    if kwargs['kernel_width'] % 2 != 1:
-        warnings.warn('Increasing smoothing kernel width by 1 (must be odd)')
-        kwargs['kernel_width'] += 1
-    assert kwargs['kernel_width'] > 0, ValueError('smoothing kernel width must be a positive odd integer')
+    return fit_params(data.values, axis=axis, kernel_width=kwargs['kernel_width'], order=kwargs['order'],
+                      maintain_bounds=kwargs['maintain_bounds'], index=data.columns if axis == 0 else data.index)
+
+
+def fit_params(values, axis=0, kernel_width=11, order=3, maintain_bounds=True, index=None):
+    """
+    Compute the fitted parameters of a Smooth manipulator from an array of values (index labels the columns, if axis
+    is 0, or the rows, if axis is 1)
+    """
+    data_max = np.max(values, axis=axis)
+    data_min = np.min(values, axis=axis)
+    if np.any(np.isnan(data_max)):
+        data_max = np.nanmax(values, axis=axis)
+        data_min = np.nanmin(values, axis=axis)
 
-    if transpose:
-        return transformer(data.T, **dw.core.update_dict(kwargs, {'axis': axis})).T
+    return {'axis': axis, 'kernel_width': kernel_width, 'order': order, 'max': pd.Series(data_max, index=index),
+            'min': pd.Series(data_min, index=index), 'maintain_bounds': maintain_bounds}
 
-    assert axis == 0, ValueError('invalid transformation')
 
-    smoothed = data.copy()
-    for c in data.columns:
-        smoothed[c] = savgol_filter(data[c].values, kwargs['kernel_width'], kwargs['order'])
+def transformer(data, **kwargs):
+    assert 'axis' in kwargs.keys(), ValueError('Must specify axis')
+    axis = kwargs['axis']
+    if axis not in [0, 1]:
+        raise ValueError(f'Invalid smoothing axis: {axis}')
 
-        if kwargs['maintain_bounds']:
-            smoothed[c].loc[smoothed[c] > kwargs['max'][c]] = kwargs['max'][c]
-            smoothed[c].loc[smoothed[c] < kwargs['min'][c]] = kwargs['min'][c]
+    kernel_width = check_kernel_width(kwargs['kernel_width'])
+    if kwargs['maintain_bounds']:
+        bounds = {'min': kwargs['min'], 'max': kwargs['max']}
+    else:
+        bounds = {}
 
-    return smoothed
+    smoothed = transform_array(data.values, kernel_width, kwargs['order'], axis=axis, groups=group_slices(data),
+                               **bounds)
+    return pd.DataFrame(smoothed, index=data.index, columns=data.columns)
 
 
 class Smooth(Manipulator):
     # noinspection PyShadowingBuiltins
-    def __init__(self, axis=0, kernel_width=11, order=3, maintain_bounds=True):
+    def __init__(self, axis=0, kernel_width=11, order=3, maintain_bounds=True, keep_data=False):
         required = ['axis', 'min', 'max', 'kernel_width', 'order', 'maintain_bounds']
         super().__init__(axis=axis, fitter=fitter, transformer=transformer, data=None, kernel_width=kernel_width,
-                         order=order, maintain_bounds=maintain_bounds,
+                         order=order, maintain_bounds=maintain_bounds, keep_data=keep_data,
                          required=required)
 
         self.axis = axis
         self.fitter = fitter
         self.transformer = transformer
         self.data = None
+        self.keep_data = keep_data
         self.kernel_width = kernel_width
         self.order = order
         self.maintain_bounds = maintain_bounds
         self.required = required
+
+
+def init_history(values, method='savgol', kernel_width=11):
+    """
+    Initialize the streaming state (see stream_array) of a new stream from its first rows, by treating the first
+    sample as though it had been observed for the entire history
+    """
+    if method == 'savgol':
+        return np.repeat(values[..., :1, :], kernel_width - 1, axis=-2)
+    return values[..., :1, :]
+
+
+# noinspection PyShadowingBuiltins
+def stream_array(values, history=None, method='savgol', kernel_width=11, order=3, alpha=0.3):
+    """
+    Causally smooth the rows of an array (each output row depends only on the current and preceding rows), picking up
+    where a previous call left off
+
+    Parameters
+    ----------
+    :param values: a number-of-new-rows by number-of-columns numpy array, or a number-of-streams by
+      number-of-new-rows by number-of-columns array (to advance several independent streams at once)
+    :param history: the state returned by the previous call (or None to start a new stream).  For the 'savgol'
+      method this contains the last kernel_width - 1 input rows; for the 'exponential' method it contains the last
+      output row.
+    :param method: 'savgol' (default; a causal Savitzky-Golay filter that fits a polynomial of the given order to the
+      last kernel_width samples and evaluates it at the newest sample) or 'exponential' (an exponentially weighted
+      moving average with smoothing factor alpha)
+    :param kernel_width: Savitzky-Golay window length (a positive odd integer; default: 11)
+    :param order: Savitzky-Golay polynomial order (default: 3)
+    :param alpha: exponential smoothing factor, between 0 (no updating) and 1 (no smoothing); default: 0.3
+
+    Returns
+    -------
+    :return: a tuple containing the smoothed rows and the updated history
+    """
+    if values.shape[-2] == 0:
+        return np.empty(values.shape, dtype=float), history
+    if method not in ['savgol', 'exponential']:
+        raise ValueError(f'unknown streaming smoothing method: {method}')
+    if history is None:
+        history = init_history(values, method=method, kernel_width=kernel_width)
+
+    if method == 'savgol':
+        padded = np.concatenate([history, values], axis=-2)
+        weights = savgol_coeffs(kernel_width, order, pos=kernel_width - 1, use='dot')
+        smoothed = lfilter(weights[::-1], [1.0], padded, axis=-2)[..., (kernel_width - 1):, :]
+        return smoothed, padded[..., (padded.shape[-2] - kernel_width + 1):, :]
+
+    assert 0 < alpha <= 1, ValueError('exponential smoothing factor must be in (0, 1]')
+    smoothed, _ = lfilter([alpha], [1.0, alpha - 1.0], values, axis=-2, zi=(1 - alpha) * history)
+    return smoothed, smoothed[..., -1:, :]
+
+
+# noinspection PyUnusedLocal
+def streaming_fitter(data, **kwargs):
+    if kwargs['axis'] != 0:
+        raise ValueError('streaming smoothing is only supported for axis=0')
+    return {'axis': 0, 'kernel_width': kwargs['kernel_width'], 'order': kwargs['order'],
+            'method': kwargs['method'], 'alpha': kwargs['alpha'], 'history': {}}
+
+
+def streaming_transformer(data, **kwargs):
+    history = dict(kwargs['history'])
+    kernel_width = check_kernel_width(kwargs['kernel_width'])
+    opts = {'method': kwargs['method'], 'kernel_width': kernel_width}
+    values = data.values
+    smoothed = np.empty(values.shape, dtype=float)
+
+    groups = group_slices(data)
+    if dw.zoo.is_multiindex_dataframe(data):
+        level = data.index.levels[0]
+        keys = [level[c] for c in np.asarray(data.index.codes[0])[[g.start for g in groups]]]
+    else:
+        keys = [None]
+
+    # equal-length streams are advanced together, unless a stream is split across several blocks of rows (in which
+    # case each block must pick up where the previous one left off)
+    if len(set(keys)) == len(keys):
+        batches = group_batches(groups)
+    else:
+        batches = [(g, np.array([i])) for i, g in enumerate(groups)]
+
+    for rows, members in batches:
+        x = values[rows]
+        if x.ndim == 2:
+            previous = history.get(keys[members[0]])
+        else:
+            previous = np.stack([history[keys[i]] if keys[i] in history else
+                                 init_history(x[j], **opts) for j, i in enumerate(members)])
+        smoothed[rows], h = stream_array(x, history=previous, order=kwargs['order'], alpha=kwargs['alpha'], **opts)
+        if x.ndim == 2:
+            history[keys[members[0]]] = h
+        else:
+            history.update({keys[i]: h[j] for j, i in enumerate(members)})
+    return pd.DataFrame(smoothed, index=data.index, columns=data.columns), history
+
+
+class StreamingSmooth(Manipulator):
+    """
+    Causal, stateful smoothing for incrementally arriving data.  Fitting resets the stream; each call to transform
+    smooths the given (new) rows, continuing from the rows seen in previous calls, and the work done is proportional
+    to the number of new rows.  For stacked (MultiIndex) data, each group (outermost index level) is treated as a
+    separate stream.
+
+    :param kernel_width: Savitzky-Golay window length (default: 11)
+    :param order: Savitzky-Golay polynomial order (default: 3)
+    :param method: 'savgol' (default; causal Savitzky-Golay filter) or 'exponential' (exponentially weighted moving
+      average)
+    :param alpha: exponential smoothing factor (default: 0.3)
+    """
+    # noinspection PyShadowingBuiltins
+    def __init__(self, axis=0, kernel_width=11, order=3, method='savgol', alpha=0.3, keep_data=False):
+        required = ['axis', 'kernel_width', 'order', 'method', 'alpha', 'history']
+        super().__init__(axis=axis, fitter=streaming_fitter, transformer=streaming_transformer, data=None,
+                         kernel_width=kernel_width, order=order, method=method, alpha=alpha, keep_data=keep_data,
+                         required=required)
+
+        self.axis = axis
+        self.fitter = streaming_fitter
+        self.transformer = streaming_transformer
+        self.data = None
+        self.keep_data = keep_data
+        self.kernel_width = kernel_width
+        self.order = order
+        self.method = method
+        self.alpha = alpha
+        self.required = required
+
+    def transform(self, data=None):
+        smoothed, self.history = super().transform(data)
+        return smoothed
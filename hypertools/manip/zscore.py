@@ -1,54 +1,125 @@
-# noinspection PyPackageRequirements
-import datawrangler as dw
 import numpy as np
 import pandas as pd
 
-from .common import Manipulator
+from .common import Manipulator, get_values, set_values
 
 
-# noinspection PyShadowingBuiltins
-def fitter(data, axis=0):
+def fit_array(values, axis=0):
+    """
+    Compute the mean and (unbiased) standard deviation of an array along the given axis, ignoring NaNs
+    """
+    mean = np.mean(values, axis=axis)
+    std = np.std(values, axis=axis, ddof=1)
+    if np.any(np.isnan(mean)):
+        mean = np.nanmean(values, axis=axis)
+        std = np.nanstd(values, axis=axis, ddof=1)
+    return mean, std
+
+
+def combine_stats(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """
+    Combine the running statistics (counts, means, and sums of squared deviations from the mean) of two chunks of
+    data, using the pairwise update of Chan, Golub, & LeVeque (1979)
+    """
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(count > 0, count_b / count, 0)
+        mean = mean_a + delta * weight
+        m2 = m2_a + m2_b + delta ** 2 * count_a * weight
+    return count, mean, m2
+
+
+def chunk_stats(values):
+    """
+    Compute the number of (non-NaN) observations, mean, and sum of squared deviations from the mean of each column
+    """
+    count = np.full(values.shape[1], values.shape[0], dtype=float)
+    mean = np.mean(values, axis=0)
+    if np.any(np.isnan(mean)):
+        count = np.sum(~np.isnan(values), axis=0).astype(float)
+        with np.errstate(invalid='ignore'):
+            mean = np.nanmean(values, axis=0)
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+    else:
+        m2 = np.sum((values - mean) ** 2, axis=0)
+    return count, mean, m2
+
+
+def transform_array(values, mean, std, axis=0, out=None):
+    """
+    Z-score an array using the given means and standard deviations (broadcast along the given axis).  If out is
+    specified, the result is written into it (out may be values itself).
+    """
+    mean = np.asarray(mean)
+    std = np.asarray(std)
     if axis == 1:
-        return dw.core.update_dict(fitter(data.T, axis=0), {'transpose': True})
-    elif axis != 0:
+        mean = mean[:, np.newaxis]
+        std = std[:, np.newaxis]
+
+    out = np.subtract(values, mean, out=out)
+    return np.divide(out, std, out=out)
+
+
+# noinspection PyShadowingBuiltins,PyUnusedLocal
+def fitter(data, axis=0, inplace=False):
+    if axis not in [0, 1]:
         raise ValueError('axis must be either 0 or 1')
 
-    mean = pd.Series(index=data.columns)
-    std = pd.Series(index=data.columns)
+    return fit_params(data.values, axis=axis, index=data.columns if axis == 0 else data.index)
+
+
+def fit_params(values, axis=0, index=None):
+    """
+    Compute the fitted parameters of a ZScore manipulator from an array of values (index labels the columns, if
+    axis is 0, or the rows, if axis is 1)
+    """
+    mean, std = fit_array(values, axis=axis)
+    count = np.sum(~np.isnan(values), axis=axis).astype(float)
+    return {'mean': pd.Series(mean, index=index), 'std': pd.Series(std, index=index), 'axis': axis,
+            'count': pd.Series(count, index=index), 'm2': pd.Series(std ** 2 * (count - 1), index=index)}
+
 
-    for c in data.columns:
-        mean[c] = data[c].mean(axis=0)
-        std[c] = data[c].std(axis=0)
+# noinspection PyShadowingBuiltins,PyUnusedLocal
+def partial_fitter(data, previous=None, axis=0, inplace=False):
+    if axis != 0:
+        raise ValueError('partial_fit is only supported for axis=0')
 
-    return {'mean': mean, 'std': std, 'axis': axis, 'transpose': False}
+    count, mean, m2 = chunk_stats(data.values)
+    if previous is not None:
+        count, mean, m2 = combine_stats(previous['count'].values, previous['mean'].values, previous['m2'].values,
+                                        count, mean, m2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(m2 / (count - 1))
+    index = data.columns
+    return {'mean': pd.Series(mean, index=index), 'std': pd.Series(std, index=index), 'axis': axis,
+            'count': pd.Series(count, index=index), 'm2': pd.Series(m2, index=index)}
 
 
 # noinspection DuplicatedCode
 def transformer(data, **kwargs):
-    transpose = kwargs.pop('transpose', False)
     assert 'axis' in kwargs.keys(), ValueError('Must specify axis')
+    assert kwargs['axis'] in [0, 1], ValueError('invalid transformation')
+    inplace = kwargs.get('inplace', False)
 
-    if transpose:
-        return transformer(data.T, **dw.core.update_dict(kwargs, {'axis': int(not kwargs['axis'])})).T
-
-    assert kwargs['axis'] == 0, ValueError('invalid transformation')
-
-    z = data.copy()
-    for c in z.columns:
-        z[c] -= kwargs['mean'][c]
-        z[c] /= kwargs['std'][c]
-    return z
+    values = get_values(data, inplace=inplace)
+    transform_array(values, kwargs['mean'], kwargs['std'], axis=kwargs['axis'], out=values)
+    return set_values(data, values, inplace=inplace)
 
 
 class ZScore(Manipulator):
     # noinspection PyShadowingBuiltins
-    def __init__(self, axis=0):
-        required = ['transpose', 'mean', 'std', 'axis']
-        super().__init__(axis=axis, fitter=fitter, transformer=transformer, data=None,
-                         required=required)
+    def __init__(self, axis=0, inplace=False, keep_data=False):
+        required = ['mean', 'std', 'axis', 'count', 'm2']
+        super().__init__(axis=axis, inplace=inplace, fitter=fitter, transformer=transformer,
+                         partial_fitter=partial_fitter, data=None, keep_data=keep_data, required=required)
 
         self.axis = axis
+        self.inplace = inplace
         self.fitter = fitter
         self.transformer = transformer
+        self.partial_fitter = partial_fitter
         self.data = None
+        self.keep_data = keep_data
         self.required = required
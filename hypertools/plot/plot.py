@@ -12,7 +12,7 @@ import sys
 
 from scipy.spatial.distance import pdist, squareform
 
-from ..core import get_default_options, apply_model, get, has_all_attributes, eval_dict
+from ..core import get_default_options, apply_model, get, has_all_attributes, eval_dict, unique_rows, dedup_options
 from ..align import align, pad
 from ..cluster import cluster
 from ..manip import manip
@@ -104,7 +104,7 @@ def mat2colors(m, **kwargs):
             colors[bins == i, :] = cmap[i, :]
         return colors
 
-    reducer = kwargs.pop('reduce', 'IncrementalPCA')
+    reducer = kwargs.pop('reduce', 'auto')
     if type(reduce) is not dict:
         reducer = {'model': reducer, 'args': [], 'kwargs': {'n_components': 3}}
     else:
@@ -132,6 +132,8 @@ def labels2colors(c, **kwargs):
     # Convert list of labels to DataFrame if needed
     if isinstance(c, list) and len(c) > 0 and isinstance(c[0], str):
         c = pd.DataFrame({'label': c})
+    elif dw.zoo.is_array(c):  # e.g., labels written to a memory-mapped array by hypertools.cluster.stream
+        c = pd.DataFrame(np.reshape(c, [c.shape[0], -1]))
     
     stacked_labels = dw.stack(c)
     if stacked_labels.shape[1] == 1:  # discrete labels
@@ -190,6 +192,45 @@ def get_colors(data):
         return helper(data)
 
 
+def collapse_duplicates(data, color, labels=None, markersize=None, max_scale=4):
+    """
+    Draw each distinct point (i.e., each distinct combination of coordinates and color) only once, scaling its marker
+    by the square root of the number of times it occurs (up to max_scale times the original marker size)
+
+    Parameters
+    ----------
+    :param data: a DataFrame or list of DataFrames (one row per point)
+    :param color: the points' colors (see static_plot)
+    :param labels: a DataFrame (or list of DataFrames) of legend labels (see labels2colors), or None
+    :param markersize: the original marker size (default: None; use the default marker size)
+    :param max_scale: the largest marker scale factor (default: 4)
+
+    Returns
+    -------
+    :return: a tuple (data, color, labels, markersize) containing the distinct points, their colors and labels, and
+      their marker sizes (a list of arrays for list data, or an array otherwise)
+    """
+    if markersize is None:
+        markersize = eval(defaults['plot']['markersize'])
+
+    if type(data) is list:
+        collapsed = [collapse_duplicates(d, color[i] if type(color) is list else color,
+                                         labels=None if labels is None else labels[i], markersize=markersize,
+                                         max_scale=max_scale) for i, d in enumerate(data)]
+        return tuple(list(x) for x in zip(*collapsed))
+
+    color = get(color, range(data.shape[0]), axis=0)
+    if np.ndim(color) == 2:
+        first, _, counts = unique_rows(np.hstack([data.values, np.asarray(color, dtype=float)]))
+        color = np.asarray(color)[first]
+    else:
+        first, _, counts = unique_rows(data)
+
+    if labels is not None:
+        labels = labels.iloc[first]
+    return data.iloc[first], color, labels, markersize * np.minimum(np.sqrt(counts), max_scale)
+
+
 def parse_helper(x, codex):
     for k in codex:
         if k in x:
@@ -433,11 +474,14 @@ def plot(original_data, *fmt, **kwargs):
     if max_dims <= 3:
         reducers = kwargs.pop('reduce', None)
     else:
-        reducers = kwargs.pop('reduce', {'model': 'IncrementalPCA', 'args': [], 'kwargs': {'n_components': 3}})
+        reducers = kwargs.pop('reduce', {'model': 'auto', 'args': [], 'kwargs': {'n_components': 3}})
     
     clusterers = kwargs.pop('cluster', None)
     post = kwargs.pop('post', None)
 
+    dedup = kwargs.pop('dedup', None)
+    dedup_kwargs = {} if dedup is None else {'dedup': dedup}
+
     assert len(fmt) == 0 or len(fmt) == 1 or len(fmt) == len(data), ValueError(f'invalid format: {fmt}')
     if len(fmt) == 1:
         kwargs = dw.core.update_dict(parse_style(fmt[0]), kwargs)
@@ -452,7 +496,7 @@ def plot(original_data, *fmt, **kwargs):
         data = align(data, model=aligners)
 
     if reducers is not None:
-        data = reduce(data, model=reducers)
+        data = reduce(data, model=reducers, **dedup_kwargs)
     
     if post is not None:
         data = manip(data, model=post)
@@ -464,7 +508,7 @@ def plot(original_data, *fmt, **kwargs):
     hue = kwargs.pop('hue', None)
     
     if clusterers is not None:
-        cluster_labels = cluster(data, model=clusterers)
+        cluster_labels = cluster(data, model=clusterers, **dedup_kwargs)
         colors, kwargs['legend_override'] = labels2colors(cluster_labels, cmap=cmap,
                                                           **dw.core.update_dict(kwargs, color_kwargs))
     elif hue is not None:
@@ -507,6 +551,16 @@ def plot(original_data, *fmt, **kwargs):
     if bounding_box:
         kwargs['fig'] = plot_bounding_box(get_bounds(data), fig=kwargs['fig'])
     
+    # draw each distinct point once (lines connect consecutive observations, so they're drawn in full)
+    opts = dedup_options(dedup)
+    if opts['enabled'] and ('line' not in kwargs.get('mode', eval(defaults['plot']['mode']))):
+        labels = kwargs['legend_override']['labels'] if 'legend_override' in kwargs.keys() else None
+        data, kwargs['color'], labels, kwargs['markersize'] = \
+            collapse_duplicates(data, kwargs['color'], labels=labels, markersize=kwargs.get('markersize', None),
+                                max_scale=opts['max_marker_scale'])
+        if 'legend_override' in kwargs.keys():
+            kwargs['legend_override'] = dw.core.update_dict(kwargs['legend_override'], {'labels': labels})
+
     # Handle save_path parameter
     save_path = kwargs.pop('save_path', None)
     fig = static_plot(data, **kwargs)
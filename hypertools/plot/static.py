@@ -227,7 +227,12 @@ def static_plot(data, **kwargs):
     if type(data) is list:
         names = kwargs.pop('name', [str(d) for d in range(len(data))])
         for i, d in enumerate(data):
-            opts = {'color': get(color, i), 'fig': fig, 'name': get(names, i), 'legendgroup': get(names, i)}
+            # per-dataset colors (and marker sizes) may have different lengths, so they're indexed without being
+            # converted into a single array
+            opts = {'color': color[i % len(color)] if type(color) is list else get(color, i), 'fig': fig,
+                    'name': get(names, i), 'legendgroup': get(names, i)}
+            if type(kwargs['markersize']) is list:
+                opts['markersize'] = kwargs['markersize'][i % len(kwargs['markersize'])]
 
             if legend_override is not None:
                 lo = legend_override.copy()
@@ -241,6 +246,13 @@ def static_plot(data, **kwargs):
     kwargs = dw.core.update_dict({'name': ''}, kwargs)
 
     color = get(color, range(data.shape[0]), axis=0)
+
+    # per-observation marker sizes (e.g., for collapsed duplicate points; see plot)
+    sizes = None
+    if np.ndim(kwargs['markersize']) > 0:
+        sizes = np.asarray(kwargs['markersize'], dtype=float)
+        kwargs['markersize'] = defaults['markersize']
+
     if dw.zoo.is_multiindex_dataframe(data):
         color_df = pd.DataFrame(color, index=data.index)
         group_means = group_mean(data)
@@ -310,6 +322,8 @@ def static_plot(data, **kwargs):
                                 group_opts['legendgroup'] = str(k)
                     else:
                         group_opts['legendgroup'] = legend_override['names'][k]
+                    if sizes is not None:
+                        group_opts['markersize'] = list(sizes[group_inds])
                     fig.add_trace(get_plotly_shape(data.values[group_inds, :],
                                                    **dw.core.update_dict(kwargs, group_opts),
                                                    color=mpl2plotly_color(c)))
@@ -317,6 +331,8 @@ def static_plot(data, **kwargs):
                 if max(inds) < data.shape[0] - 1:
                     inds = np.append(inds, [max(inds) + 1])
 
+                if sizes is not None:
+                    opts['markersize'] = list(sizes[inds])
                 fig.add_trace(get_plotly_shape(data.values[inds, :],
                                                **dw.core.update_dict(kwargs, opts),
                                                color=mpl2plotly_color(c)))
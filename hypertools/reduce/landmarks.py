@@ -0,0 +1,155 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.neighbors import NearestNeighbors
+
+from ..core import get_default_options, eval_dict, sample_rows
+
+
+def knn_placement(fitted, landmarks, embedding, data, n_neighbors=10):
+    """
+    Place new observations in an embedding as inverse-distance-weighted averages of their nearest landmarks'
+    coordinates (used for models without an out-of-sample extension, like TSNE and MDS)
+
+    Parameters
+    ----------
+    :param fitted: the fitted model (ignored)
+    :param landmarks: a number-of-landmarks by number-of-features array of the landmarks' (original) coordinates
+    :param embedding: a number-of-landmarks by number-of-components array of the landmarks' embedded coordinates
+    :param data: a number-of-observations by number-of-features array of new observations
+    :param n_neighbors: the number of landmarks used to place each observation (default: 10)
+
+    Returns
+    -------
+    :return: a number-of-observations by number-of-components array
+    """
+    n_neighbors = min(n_neighbors, landmarks.shape[0])
+    distances, neighbors = NearestNeighbors(n_neighbors=n_neighbors).fit(landmarks).kneighbors(data)
+
+    with np.errstate(divide='ignore'):
+        weights = 1 / distances
+    exact = np.isinf(weights)
+    weights[np.any(exact, axis=1)] = exact[np.any(exact, axis=1)]
+    weights /= np.sum(weights, axis=1, keepdims=True)
+    return np.einsum('ij,ijk->ik', weights, embedding[neighbors])
+
+
+def nystrom_placement(fitted, landmarks, embedding, data, **kwargs):
+    """
+    Nystrom extension of a spectral embedding: each new observation's coordinates are computed from its affinities to
+    the landmarks (using the fitted model's affinity function), via y(x) = P(x, landmarks) Y / mu, where P is the
+    row-normalized (random walk) affinity, Y contains the landmarks' coordinates, and mu contains the eigenvalues of
+    P associated with each embedding dimension.  Falls back on knn_placement for affinities that cannot be evaluated on
+    new observations.
+    """
+    if fitted.affinity == 'rbf':
+        affinity = np.exp(-fitted.gamma_ * euclidean_distances(data, landmarks, squared=True))
+    elif fitted.affinity == 'nearest_neighbors':
+        n_neighbors = min(fitted.n_neighbors_, landmarks.shape[0])
+        affinity = NearestNeighbors(n_neighbors=n_neighbors).fit(landmarks).kneighbors_graph(data).toarray()
+    else:
+        return knn_placement(fitted, landmarks, embedding, data, **kwargs)
+
+    # Rayleigh quotients of the landmarks' random walk matrix give the eigenvalue associated with each dimension
+    landmark_affinity = fitted.affinity_matrix_
+    if hasattr(landmark_affinity, 'toarray'):
+        landmark_affinity = landmark_affinity.toarray()
+    walk = landmark_affinity / np.sum(landmark_affinity, axis=1, keepdims=True)
+    mu = np.sum(embedding * (walk @ embedding), axis=0) / np.sum(embedding ** 2, axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        walk = np.nan_to_num(affinity / np.sum(affinity, axis=1, keepdims=True))
+    return (walk @ embedding) / mu
+
+
+# noinspection PyUnusedLocal
+def transform_placement(fitted, landmarks, embedding, data, **kwargs):
+    """
+    Place new observations using the fitted model's own out-of-sample extension (its transform method; for kernel
+    methods like KernelPCA this is a Nystrom extension)
+    """
+    return fitted.transform(data)
+
+
+extensions = {'knn': knn_placement, 'nystrom': nystrom_placement, 'transform': transform_placement}
+
+
+def get_extension(fitted, extension='auto'):
+    """
+    Choose how to place non-landmark observations: the model's own transform method, if it has one (e.g., KernelPCA,
+    Isomap, LocallyLinearEmbedding, UMAP, PCA); a Nystrom extension for spectral embeddings; or (otherwise, e.g., for
+    TSNE and MDS, or models fit to precomputed distances) kNN-weighted placement
+    """
+    if extension != 'auto':
+        assert extension in extensions.keys(), ValueError(f'unknown landmark extension: {extension}')
+        return extension
+    elif type(fitted).__name__ == 'SpectralEmbedding':
+        return 'nystrom'
+    elif hasattr(fitted, 'transform') and (getattr(fitted, 'metric', None) != 'precomputed'):
+        return 'transform'
+    return 'knn'
+
+
+def landmark_reduce(data, model, reducer, landmarks=1000, return_model=False, **kwargs):
+    """
+    Reduce a (stacked) dataset by fitting the given model to a subset of landmark observations, and then placing the
+    remaining observations by out-of-sample extension.  The model's fitting cost therefore scales with the number of
+    landmarks rather than with the number of observations.  Options are set in the [landmarks] section of config.ini
+    (and may be overridden via keyword arguments prefixed with "landmark_", e.g. landmark_method='stratified'):
+        - method: how landmarks are selected (see hypertools.core.sample_rows)
+        - extension: 'auto', 'transform', 'nystrom', or 'knn' (see get_extension)
+        - n_neighbors: number of landmarks used by kNN placement
+        - chunk_size: number of observations placed at a time (bounds the memory used by the extension)
+        - random_state: seed used to select landmarks
+
+    Parameters
+    ----------
+    :param data: a (possibly MultiIndex) DataFrame or a scipy.sparse (CSR) matrix
+    :param model: a single reduction model (string, class, or dictionary)
+    :param reducer: the reduce function used to fit the model to the landmarks
+    :param landmarks: the number of landmarks (default: 1000)
+    :param return_model: if True, also return the fitted model, along with the landmark indices and extension used
+    :param kwargs: keyword arguments passed to the reducer, along with any landmark options
+
+    Returns
+    -------
+    :return: the reduced DataFrame (and the fitted model information, if return_model is True)
+    """
+    assert type(model) is not list, ValueError('landmark mode supports only a single reduction model')
+    opts = eval_dict(get_default_options()['landmarks'])
+    for k in list(kwargs.keys()):
+        if k.startswith('landmark_'):
+            opts[k[len('landmark_'):]] = kwargs.pop(k)
+
+    inds = sample_rows(data, landmarks, method=opts['method'], random_state=opts['random_state'])
+    is_sparse = sparse.issparse(data)
+    if kwargs.get('sample_weight', None) is not None:
+        kwargs['sample_weight'] = np.asarray(kwargs['sample_weight'])[inds]
+
+    # initializations given for every observation (e.g., from an earlier embedding) are restricted to the landmarks
+    init = kwargs.get('init', None)
+    if isinstance(init, np.ndarray) and (init.ndim == 2) and (init.shape[0] == data.shape[0]):
+        kwargs['init'] = init[inds]
+    embedded, info = reducer(data[inds] if is_sparse else data.iloc[inds], model=model, return_model=True, **kwargs)
+    embedded = np.asarray(embedded.values if dw.zoo.is_dataframe(embedded) else embedded)
+
+    extension = get_extension(info['model'], opts['extension'])
+    place = extensions[extension]
+
+    values = data if is_sparse else data.values
+    landmark_values = values[inds]
+    reduced = np.empty([data.shape[0], embedded.shape[1]])
+    reduced[inds] = embedded
+
+    others = np.setdiff1d(np.arange(data.shape[0]), inds)
+    for start in range(0, len(others), opts['chunk_size']):
+        chunk = others[start:(start + opts['chunk_size'])]
+        reduced[chunk] = place(info['model'], landmark_values, embedded, values[chunk], n_neighbors=opts['n_neighbors'])
+
+    reduced = pd.DataFrame(reduced, index=None if is_sparse else data.index)
+    if return_model:
+        return reduced, dw.core.update_dict(info, {'landmarks': inds, 'extension': extension})
+    return reduced
@@ -0,0 +1,204 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import functools
+import numpy as np
+import threading
+from scipy import sparse
+
+from ..core import get_default_options, eval_dict
+
+
+def tsne_init(embedding):
+    """
+    Scale an embedding for use as a TSNE initialization (scikit-learn scales its PCA initialization so that the first
+    dimension has a standard deviation of 1e-4; larger initial scales slow down TSNE's optimization)
+    """
+    return embedding / np.std(embedding[:, 0]) * 1e-4
+
+
+# models that can be initialized from an earlier embedding (via their init parameter), along with a function for
+# preparing the initialization
+initializers = {'UMAP': lambda embedding: embedding, 'TSNE': tsne_init}
+
+# models that run parallel numba code
+numba_models = ['UMAP']
+
+
+@functools.lru_cache(maxsize=None)
+def start_numba_threads():
+    """
+    Start numba's threading layer (by running a trivial parallel function).  This must happen in the main thread: some
+    threading layers (e.g., TBB) hang when the interpreter exits if they were started from a background thread.
+    """
+    import numba
+
+    @numba.njit(parallel=True)
+    def count(n):
+        total = 0
+        for i in numba.prange(n):
+            total += 1
+        return total
+
+    return count(2)
+
+
+def get_name(model):
+    if type(model) is dict:
+        return get_name(model.get('model', None))
+    elif type(model) is str:
+        return model
+    return getattr(model, '__name__', type(model).__name__)
+
+
+def stacked_values(embedding):
+    if type(embedding) is list:
+        return dw.stack(embedding).values
+    return np.asarray(embedding)
+
+
+class ProgressiveEmbedding(object):
+    """
+    A handle to an embedding that is refined in a background thread (see progressive_reduce).  Similar to a
+    concurrent.futures.Future:
+        - embedding: the latest (most refined) embedding, formatted like reduce's output
+        - model: the fitted model information (as returned by reduce with return_model=True) for the latest embedding
+        - stage: the name of the latest completed stage
+        - stages: the names of all stages, in order
+        - done(): True if refinement has finished (or failed, or was cancelled)
+        - result(timeout=None): wait for refinement to finish and return the final (or, if cancelled, latest) embedding
+        - exception(timeout=None): wait for refinement to finish and return the exception it raised (or None)
+        - cancel(): stop refining once the current stage finishes
+        - add_callback(f): call f(embedding, stage) each time a stage finishes (and immediately, for the latest stage).
+          Callbacks are run in the refinement thread.
+    """
+    def __init__(self, stages):
+        self.stages = stages
+        self.embedding = None
+        self.model = None
+        self.stage = None
+
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._cancelled = False
+        self._exception = None
+
+    def _update(self, embedding, model, stage):
+        with self._lock:
+            self.embedding, self.model, self.stage = embedding, model, stage
+            callbacks = list(self._callbacks)
+        for f in callbacks:
+            f(embedding, stage)
+
+    def add_callback(self, f):
+        with self._lock:
+            self._callbacks.append(f)
+            embedding, stage = self.embedding, self.stage
+        if stage is not None:
+            f(embedding, stage)
+
+    def cancel(self):
+        self._cancelled = True
+        return not self.done()
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._finished.is_set()
+
+    def exception(self, timeout=None):
+        if not self._finished.wait(timeout):
+            raise TimeoutError('refinement is still running')
+        return self._exception
+
+    def result(self, timeout=None):
+        exception = self.exception(timeout)
+        if exception is not None:
+            raise exception
+        return self.embedding
+
+
+def progressive_reduce(data, model, reducer, preview_components=3, callback=None, **kwargs):
+    """
+    Reduce a dataset progressively: a cheap preview (randomized PCA fit to a random subsample of the observations) is
+    computed immediately, and then the embedding is refined in a background thread.  Refinement stages are:
+        - 'preview': randomized PCA (or, for sparse data, truncated SVD), fit to preview_size observations (the others
+          are projected onto its components)
+        - 'landmarks': the requested model, fit to a subset of landmark observations (the others are placed by
+          out-of-sample extension; see landmark_reduce).  Skipped if landmarks is None or there are too few
+          observations.
+        - 'full': the requested model, fit to all of the observations
+    Models that support initialization from an existing embedding (UMAP and TSNE) are initialized using the previous
+    stage's embedding (unless an init or prior embedding is given).  Options are set in the [progressive] section of
+    config.ini, and may be overridden via keyword arguments prefixed with "progressive_" (e.g.,
+    progressive_landmarks=None).
+
+    Parameters
+    ----------
+    :param data: data to reduce (any format supported by reduce)
+    :param model: the reduction model (string, class, or dictionary)
+    :param reducer: the reduce function used to compute each stage
+    :param preview_components: the number of dimensions of the preview embedding (default: 3; should match the model's
+      number of components)
+    :param callback: a function of the form f(embedding, stage) to call each time a stage finishes (default: None)
+    :param kwargs: keyword arguments passed to the reducer for the landmark and full stages, along with any progressive
+      options
+
+    Returns
+    -------
+    :return: a ProgressiveEmbedding handle, whose embedding attribute already contains the preview
+    """
+    opts = eval_dict(get_default_options()['progressive'])
+    for k in list(kwargs.keys()):
+        if k.startswith('progressive_'):
+            opts[k[len('progressive_'):]] = kwargs.pop(k)
+    kwargs.pop('return_model', None)
+
+    if sparse.issparse(data):
+        preview_model = {'model': 'TruncatedSVD', 'args': [],
+                         'kwargs': {'algorithm': 'randomized', 'n_components': preview_components,
+                                    'random_state': opts['random_state']}}
+    else:
+        preview_model = {'model': 'PCA', 'args': [],
+                         'kwargs': {'svd_solver': 'randomized', 'n_components': preview_components,
+                                    'random_state': opts['random_state']}}
+    preview, info = reducer(data, model=preview_model, return_model=True, landmarks=opts['preview_size'],
+                            landmark_method='random', landmark_random_state=opts['random_state'])
+    n_rows = stacked_values(preview).shape[0]
+
+    stages = [('preview', None)]
+    if (opts['landmarks'] is not None) and (n_rows > opts['landmarks']):
+        stages.append(('landmarks', {'landmarks': opts['landmarks'], 'landmark_random_state': opts['random_state']}))
+    stages.append(('full', {}))
+
+    handle = ProgressiveEmbedding([s[0] for s in stages])
+    handle._update(preview, info, 'preview')
+    if callback is not None:
+        handle.add_callback(callback)
+
+    name = get_name(model)
+    explicit_init = any([k in kwargs.keys() for k in ['init', 'prior']]) or \
+        (type(model) is dict and 'init' in model.get('kwargs', {}).keys())
+
+    def refine():
+        try:
+            for stage, stage_kwargs in stages[1:]:
+                if handle.cancelled():
+                    break
+
+                stage_kwargs = dw.core.update_dict(kwargs, stage_kwargs)
+                if (name in initializers.keys()) and not explicit_init:
+                    stage_kwargs['init'] = initializers[name](stacked_values(handle.embedding))
+
+                embedding, fitted = reducer(data, model=model, return_model=True, **stage_kwargs)
+                handle._update(embedding, fitted, stage)
+        except Exception as e:
+            handle._exception = e
+        finally:
+            handle._finished.set()
+
+    if (name in numba_models) and (threading.current_thread() is threading.main_thread()):
+        start_numba_threads()
+    threading.Thread(target=refine, daemon=True).start()
+    return handle
@@ -1,9 +1,16 @@
 # noinspection PyPackageRequirements
 import datawrangler as dw
 import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .landmarks import landmark_reduce
+from .progressive import progressive_reduce
+from .solvers import select_solver
+from .warm_start import warm_start
 
 from ..core.model import apply_model
-from ..core import get_default_options
+from ..core import get_default_options, cached, apply_neighbors_model, neighbor_options, apply_unique, dedup_options
 from ..align.common import pad
 
 
@@ -30,25 +37,83 @@ def get_n_components(model, **kwargs):
         return None
 
 
-@dw.decorate.apply_stacked
-def reduce(data, model='IncrementalPCA', **kwargs):
+def reduce_stacked(data, model='auto', **kwargs):
+    # warm start: initialize the model from a prior embedding of (an earlier version of) the dataset
+    prior = kwargs.pop('prior', None)
+    if prior is not None:
+        n_components = get_n_components(model, **kwargs)
+        if type(n_components) is str:
+            n_components = int(eval(n_components))
+        kwargs = warm_start(data, model, prior, kwargs, n_components=n_components)
+
+    # duplicate rows: fit the model to the distinct rows, and copy their embeddings to their duplicates
+    if dedup_options(kwargs.pop('dedup', None))['enabled']:
+        return apply_unique(reduce_stacked, data, model=model, dedup=False, **kwargs)
+
+    # landmark mode: fit the model to a subset of the observations and place the rest by out-of-sample extension
+    landmarks = kwargs.pop('landmarks', None)
+    landmark_opts = {k: kwargs.pop(k) for k in list(kwargs.keys()) if k.startswith('landmark_')}
+    if (landmarks is not None) and (landmarks < data.shape[0]):
+        return landmark_reduce(data, model, reduce, landmarks=landmarks, **landmark_opts, **kwargs)
+
+    # choose a size-appropriate solver for model='auto' (and for models with several solvers, like PCA and TSNE)
+    model, solver = select_solver(model, *data.shape, is_sparse=sparse.issparse(data),
+                                  **{k: v for k, v in kwargs.items() if k != 'return_model'})
+
     # noinspection PyTypeChecker
     n_components = get_n_components(model, **kwargs)
 
     if type(n_components) is str:
         n_components = int(eval(n_components))
 
+    return_model = kwargs.pop('return_model', False)
+    use_neighbor_cache = neighbor_options(kwargs.pop('neighbor_cache', None))['enabled']
     if (n_components is None) or (data.shape[1] > n_components):
-        return apply_model(data, model, search=['sklearn.decomposition', 'sklearn.manifold', 'sklearn.mixture',
-                                                'umap', 'ppca'],
-                           **dw.core.update_dict(get_default_options()['reduce'], kwargs))
+        search = ['sklearn.decomposition', 'sklearn.manifold', 'sklearn.mixture', 'umap', 'hypertools.external.ppca']
+        kwargs = dw.core.update_dict(get_default_options()['reduce'], kwargs)
+
+        # models that build nearest neighbor graphs can share cached graphs (see hypertools.core.neighbors)
+        result = None
+        if use_neighbor_cache:
+            result = apply_neighbors_model(data, model, search=search, return_model=return_model, **kwargs)
+        if result is None:
+            result = apply_model(data, model, search=search, return_model=return_model, **kwargs)
+        if return_model and solver is not None:
+            result[1]['solver'] = solver
+        return result
+    elif sparse.issparse(data):  # the data are already low-dimensional
+        transformed_data = pad(pd.DataFrame(data.toarray()), c=n_components)
     elif data.shape[1] == n_components:
         transformed_data = data.copy()
     else:
         transformed_data = pad(data, c=n_components)
 
-    return_model = kwargs.pop('return_model', False)
     if return_model:
-        return transformed_data, {'model': model, 'args': [], 'kwargs': kwargs}
+        info = {'model': model, 'args': [], 'kwargs': kwargs}
+        if solver is not None:
+            info['solver'] = solver
+        return transformed_data, info
     else:
         return transformed_data
+
+
+@cached('reduce')
+def reduce(data, model='auto', **kwargs):
+    # progressive mode: return a handle to a quick preview embedding, which is refined in a background thread
+    if kwargs.pop('progressive', False):
+        n_components = get_n_components(model, **kwargs)
+        if type(n_components) is str:
+            n_components = int(eval(n_components))
+        return progressive_reduce(data, model, reduce, preview_components=3 if n_components is None else n_components,
+                                  **kwargs)
+
+    # sparse matrices (e.g., bag-of-words or one-hot encoded data) are passed to the model without being densified;
+    # only the (low-dimensional) embedding is stored densely
+    if sparse.issparse(data):
+        return reduce_stacked(sparse.csr_matrix(data), model=model, **kwargs)
+
+    # memory-mapped arrays are wrapped in (rather than copied into) a DataFrame, so that models that process data in
+    # chunks (e.g., MiniBatchPPCA) can reduce datasets that are too large to load into memory
+    if isinstance(data, np.memmap) and (data.ndim == 2):
+        return reduce_stacked(pd.DataFrame(data, copy=False), model=model, **kwargs)
+    return dw.decorate.apply_stacked(reduce_stacked)(data, model=model, **kwargs)
@@ -0,0 +1,134 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+import os
+
+from ..core import get_default_options, eval_dict
+
+
+def memory_budget(memory=None, memory_fraction=0.5):
+    """
+    Determine how much memory (in bytes) reducers may use
+
+    Parameters
+    ----------
+    :param memory: a memory budget, in bytes.  If None (default), the budget is set to a fraction of the machine's
+      total physical memory (rather than the memory that is currently free, so that the same data and options always
+      lead to the same solver).
+    :param memory_fraction: the fraction of total physical memory to use when memory is None (default: 0.5)
+
+    Returns
+    -------
+    :return: the memory budget, in bytes (or None, if it cannot be determined)
+    """
+    if memory is not None:
+        return memory
+
+    try:
+        total = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+    return int(memory_fraction * total)
+
+
+def svd_solver(n_samples, n_features, n_components, full_svd_max_size=500, randomized_svd_max_ratio=0.8, **kwargs):
+    """
+    Choose between exact ('full') and approximate ('randomized') singular value decompositions.  Full SVDs scale
+    cubically with the smaller of the data's dimensions, whereas randomized SVDs scale with the number of components.
+    """
+    smallest = min(n_samples, n_features)
+    if (smallest <= full_svd_max_size) or (n_components >= randomized_svd_max_ratio * smallest):
+        return 'full'
+    return 'randomized'
+
+
+def batch_size(n_samples, n_features, n_components, memory=None, memory_fraction=0.5, working_copies=3, **kwargs):
+    """
+    Choose how many rows to process at a time so that a dataset's working copies fit within the memory budget (see
+    memory_budget).  Returns None if the full dataset fits.
+    """
+    budget = memory_budget(memory=memory, memory_fraction=memory_fraction)
+    row_size = working_copies * n_features * np.dtype(float).itemsize
+    if (budget is None) or (n_samples * row_size <= budget):
+        return None
+    return max(int(budget // row_size), n_components)
+
+
+def select_solver(model, n_samples, n_features, n_components=None, is_sparse=False, **kwargs):
+    """
+    Choose a solver (or, if model is 'auto', a reduction model) suited to the size of a dataset
+
+    Parameters
+    ----------
+    :param model: 'auto', a model name, or a dictionary with 'model', 'args', and 'kwargs' keys.  The policy applies
+      to 'auto' (TruncatedSVD for sparse data), 'PCA' (choosing the SVD solver), 'TSNE' (choosing between exact and
+      Barnes-Hut gradients), and 'PPCA' (switching to MiniBatchPPCA if a batch_size is specified or the data exceed the
+      memory budget); solvers that are specified explicitly (e.g., via an svd_solver or method keyword argument) are
+      left unchanged.
+    :param n_samples: the number of observations (rows) in the dataset
+    :param n_features: the number of features (columns) in the dataset
+    :param n_components: the number of components to reduce the data to (default: None; use the model's default)
+    :param is_sparse: True if the data are stored as a scipy.sparse matrix (default: False)
+    :param kwargs: any other keyword arguments that will be passed to the model.  The policy's thresholds are set in
+      the [solvers] section of config.ini.
+
+    Returns
+    -------
+    :return: a tuple containing the model to apply (in dictionary form, if the policy applies; otherwise model is
+      returned unchanged) and a dictionary describing the selected solver (or None if the policy does not apply)
+    """
+    if type(model) is dict and all([k in model.keys() for k in ['model', 'args', 'kwargs']]):
+        spec = model
+    elif (type(model) is str) or hasattr(model, '__name__'):
+        spec = {'model': model, 'args': [], 'kwargs': {}}
+    else:
+        return model, None
+
+    policy = eval_dict(get_default_options()['solvers'])
+    opts = dw.core.update_dict(spec['kwargs'], kwargs)
+    name = spec['model'] if type(spec['model']) is str else getattr(spec['model'], '__name__', None)
+
+    if n_components is None:
+        n_components = opts.get('n_components', None)
+    if n_components is None:
+        defaults = eval_dict(get_default_options()['PCA' if name == 'auto' else name])
+        n_components = defaults.get('n_components', 3)
+
+    if name == 'auto':
+        rows = batch_size(n_samples, n_features, n_components, **policy)
+        if is_sparse:
+            name, solver = 'TruncatedSVD', {'algorithm': 'randomized'}
+        elif rows is not None:
+            name, solver = 'IncrementalPCA', {'batch_size': rows}
+        else:
+            name, solver = 'PCA', {'svd_solver': svd_solver(n_samples, n_features, n_components, **policy)}
+        solver['n_components'] = n_components
+        return ({'model': name, 'args': spec['args'], 'kwargs': dw.core.update_dict(spec['kwargs'], solver)},
+                dw.core.update_dict({'model': name}, solver))
+    elif name == 'PCA' and 'svd_solver' not in opts.keys():
+        if is_sparse:  # ARPACK centers sparse data implicitly, without densifying it
+            solver = {'svd_solver': 'arpack'}
+        else:
+            solver = {'svd_solver': svd_solver(n_samples, n_features, n_components, **policy)}
+    elif name == 'TSNE' and 'method' not in opts.keys():
+        # Barnes-Hut gradients only support embeddings with fewer than 4 dimensions
+        if (n_components < 4) and (n_samples > policy['exact_tsne_max_samples']):
+            solver = {'method': 'barnes_hut'}
+        else:
+            solver = {'method': 'exact'}
+
+        # TSNE's PCA initialization doesn't support sparse data
+        if is_sparse and ('init' not in opts.keys()):
+            solver['init'] = 'random'
+    elif name == 'PPCA':
+        # mini-batch PPCA only holds one batch of data in memory at a time
+        rows = opts.get('batch_size', batch_size(n_samples, n_features, n_components, **policy))
+        if ('batch_size' not in opts.keys()) and (rows is None):
+            return model, None
+        spec = {'model': 'MiniBatchPPCA', 'args': spec['args'], 'kwargs': spec['kwargs']}
+        name, solver = 'MiniBatchPPCA', {'batch_size': rows}
+    else:
+        return model, None
+
+    return ({'model': spec['model'], 'args': spec['args'], 'kwargs': dw.core.update_dict(spec['kwargs'], solver)},
+            dw.core.update_dict({'model': name}, solver))
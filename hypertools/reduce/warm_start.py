@@ -0,0 +1,123 @@
+# noinspection PyPackageRequirements
+import datawrangler as dw
+import numpy as np
+from scipy import sparse
+
+from .landmarks import knn_placement
+from .progressive import get_name, initializers
+
+from ..core import get_default_options, eval_dict
+
+
+def get_embedding(prior):
+    """
+    Return a stacked (MultiIndex) DataFrame (or, for arrays, a 2D numpy array) containing a prior embedding: a
+    DataFrame or list of DataFrames returned by reduce, the (embedding, model) tuple returned by reduce with
+    return_model=True, or an array
+    """
+    if type(prior) is tuple:
+        return get_embedding(prior[0])
+    elif type(prior) is list:
+        return dw.stack(prior)
+    elif dw.zoo.is_multiindex_dataframe(prior):
+        return prior
+    elif dw.zoo.is_dataframe(prior):
+        return dw.stack([prior])  # match the index of the stacked data (see dw.decorate.apply_stacked)
+    return np.asarray(prior)
+
+
+def match_rows(data, prior):
+    """
+    Match the rows of a (stacked) dataset to the rows of a prior embedding.  DataFrame rows are matched by their index
+    labels; if the prior embedding is an array (or either index contains duplicates), the prior embedding's rows are
+    assumed to correspond to the first rows of the dataset.
+
+    Parameters
+    ----------
+    :param data: a (possibly MultiIndex) DataFrame or a scipy.sparse matrix (matched by position)
+    :param prior: a prior embedding (see get_embedding)
+
+    Returns
+    -------
+    :return: an array (with one entry per row of data) containing the matching row of the prior embedding, or -1 for
+      new rows
+    """
+    prior = get_embedding(prior)
+    if dw.zoo.is_dataframe(data) and dw.zoo.is_dataframe(prior) and data.index.is_unique and prior.index.is_unique:
+        return prior.index.get_indexer(data.index)
+
+    matches = np.arange(data.shape[0])
+    matches[matches >= prior.shape[0]] = -1
+    return matches
+
+
+def warm_start_init(data, prior, n_neighbors=10):
+    """
+    Initialize an embedding of a (stacked) dataset from a prior embedding of an earlier version of the dataset.  Rows
+    that appear in the prior embedding keep their coordinates, and new rows are placed at the inverse-distance-weighted
+    average of their nearest matched rows' coordinates (see knn_placement).
+
+    Parameters
+    ----------
+    :param data: a (possibly MultiIndex) DataFrame
+    :param prior: a prior embedding (see get_embedding)
+    :param n_neighbors: the number of matched rows used to place each new row (default: 10)
+
+    Returns
+    -------
+    :return: a number-of-observations by number-of-components array
+    """
+    matches = match_rows(data, prior)
+    matched = matches >= 0
+    assert np.any(matched), ValueError('none of the observations appear in the prior embedding')
+
+    prior = get_embedding(prior)
+    prior = np.asarray(prior.values if dw.zoo.is_dataframe(prior) else prior, dtype=float)
+
+    init = np.empty([data.shape[0], prior.shape[1]])
+    init[matched] = prior[matches[matched]]
+    if not np.all(matched):
+        values = data if sparse.issparse(data) else data.values
+        init[~matched] = knn_placement(None, values[matched], init[matched], values[~matched],
+                                       n_neighbors=n_neighbors)
+    return init
+
+
+def warm_start(data, model, prior, kwargs, n_components=None):
+    """
+    Prepare to warm start a reduction model from a prior embedding (e.g., when re-embedding a dataset after appending
+    new observations).  The model is initialized using warm_start_init, which reduces the number of optimization
+    steps needed and keeps consecutive embeddings in the same orientation.  Options are set in the [warm_start] section
+    of config.ini:
+        - n_neighbors: the number of matched rows used to place each new row
+        - per-model keyword arguments (keyed by the lowercase model name), applied unless they are specified explicitly;
+          e.g., fewer UMAP epochs, and no early exaggeration for TSNE
+
+    Parameters
+    ----------
+    :param data: a (possibly MultiIndex) DataFrame
+    :param model: a single reduction model (string, class, or dictionary) that supports initialization via an init
+      parameter (UMAP or TSNE)
+    :param prior: a prior embedding (see get_embedding)
+    :param kwargs: a dictionary of keyword arguments for the reducer
+    :param n_components: the number of components of the new embedding (default: None; no check)
+
+    Returns
+    -------
+    :return: a copy of kwargs, updated to initialize the model from the prior embedding
+    """
+    name = get_name(model)
+    assert name in initializers.keys(), ValueError(f'warm starts are not supported for {name} models (supported '
+                                                   f'models: {", ".join(initializers.keys())})')
+
+    opts = eval_dict(get_default_options()['warm_start'])
+    init = warm_start_init(data, prior, n_neighbors=opts['n_neighbors'])
+    assert (n_components is None) or (init.shape[1] == n_components), \
+        ValueError(f'the prior embedding has {init.shape[1]} components, but {n_components} were requested')
+
+    explicit = kwargs.keys()
+    if type(model) is dict:
+        explicit = [*explicit, *model['kwargs'].keys()]
+
+    defaults = {k: v for k, v in opts.get(name.lower(), {}).items() if k not in explicit}
+    return dw.core.update_dict(dw.core.update_dict(kwargs, defaults), {'init': initializers[name](init)})
@@ -3,6 +3,8 @@ import pandas as pd
 
 import pytest
 import hypertools as hyp
+from hypertools.align import pairwise_alignment, isc, isfc, time_segment_matching
+from hypertools.align.piecewise import get_blocks
 
 weights = hyp.load('weights')
 spiral = hyp.load('spiral')
@@ -139,3 +141,119 @@ def test_trim_and_pad():
     assert np.allclose(padded[0].iloc[:, a.shape[1]:], 0)
 
     assert np.allclose(b, padded[1])
+
+
+def test_pairwise_alignment():
+    rot = np.array([[-0.50524616, -0.48383773, -0.71458195],
+                    [-0.86275536, 0.26450786, 0.43091621],
+                    [-0.01948098, 0.83422817, -0.55107518]])
+
+    data = [spiral[0], np.dot(spiral[0], rot.T), np.random.randn(*spiral[0].shape)]
+    disparity, projections = pairwise_alignment(data, return_projections=True, n_jobs=2)
+    assert disparity.shape == (3, 3)
+    assert np.allclose(disparity, disparity.T)
+    assert np.allclose(np.diag(disparity), 0)
+    assert np.isclose(disparity.iloc[0, 1], 0, atol=1e-5)
+    assert disparity.iloc[0, 2] > 0.1
+
+    # for centered data, disparities match scipy's
+    from scipy.spatial import procrustes
+    centered = [d - np.mean(d, axis=0) for d in data]
+    expected = procrustes(centered[0], centered[2])[2]
+    assert np.isclose(pairwise_alignment(centered, n_jobs=1).iloc[0, 2], expected)
+
+    # projections should match the Procrustes aligner (in both directions)
+    fitted = hyp.align(data[:2], model='Procrustes', return_model=True)[1]['model']
+    assert compare_alignments(fitted.proj[1], projections[1][0])
+    assert np.allclose(np.dot(data[0], projections[0][1]), data[1], atol=1e-5)
+
+    correlations = pairwise_alignment(data, metric='correlation', n_jobs=1)
+    assert np.allclose(np.diag(correlations), 1)
+    assert np.isclose(correlations.iloc[0, 1], 1, atol=1e-5)
+    assert np.isclose(correlations.iloc[1, 0], 1, atol=1e-5)
+    assert np.all(correlations.values[0, 2] < 1)
+
+
+def test_isc(tmp_path):
+    shared = np.random.randn(100, 10)
+    data = [shared + 0.5 * np.random.randn(*shared.shape) for _ in range(5)]
+    data[-1][:, -1] = np.random.randn(shared.shape[0])
+
+    r = isc(data)
+    assert r.shape == (len(data), shared.shape[1])
+
+    # compare with a naive leave-one-out implementation
+    for i, x in enumerate(data):
+        others = np.mean([y for j, y in enumerate(data) if j != i], axis=0)
+        expected = [np.corrcoef(x[:, f], others[:, f])[0, 1] for f in range(x.shape[1])]
+        assert np.allclose(r.iloc[i], expected)
+    assert np.all(r.values[:-1] > 0.5)
+    assert np.abs(r.values[-1, -1]) < 0.5
+
+    mean_r = isc(data, summary='mean')
+    assert mean_r.shape == (shared.shape[1],)
+    assert np.all(mean_r.values <= r.max(axis=0).values + 1e-10)
+
+    # subjects may also be streamed from disk
+    fnames = []
+    for i, x in enumerate(data):
+        fnames.append(str(tmp_path / f'subject_{i}.npy'))
+        np.save(fnames[-1], x)
+    assert np.allclose(isc(fnames), r)
+    assert np.allclose(isc(f for f in fnames), r)  # generators are only traversed once
+
+    r2 = isfc(data)
+    assert len(r2) == len(data)
+    assert all([x.shape == (shared.shape[1], shared.shape[1]) for x in r2])
+    assert all([np.allclose(np.diag(x), y) for x, y in zip(r2, r.values)])
+    assert all([np.allclose(x, y) for x, y in zip(isfc(f for f in fnames), r2)])
+    assert isfc(data, summary='median').shape == (shared.shape[1], shared.shape[1])
+
+
+def test_transform_new_data():
+    data = [pd.DataFrame(np.dot(spiral[0], np.linalg.qr(np.random.randn(3, 3))[0])) for _ in range(3)]
+    for m in ['HyperAlign', 'Procrustes', 'SharedResponseModel']:
+        aligned, fitted = hyp.align(data, model=m, return_model=True)
+        retransformed = fitted['model'].transform(data)
+        assert all([np.allclose(a, b) for a, b in zip(aligned, retransformed)])
+
+        held_out = fitted['model'].transform([d.iloc[:50] for d in data])
+        assert all([np.allclose(a.iloc[:50], b) for a, b in zip(aligned, held_out)])
+
+
+def test_time_segment_matching():
+    shared = np.cumsum(np.random.randn(120, 10), axis=0)
+    data = [np.dot(shared, np.linalg.qr(np.random.randn(10, 10))[0]) + np.random.randn(*shared.shape)
+            for _ in range(4)]
+
+    results = time_segment_matching(data, models=['NullAlign', 'HyperAlign', 'SharedResponseModel'], n_folds=2,
+                                    segment_length=10, n_jobs=1)
+    assert results.shape == (6, 3)
+    assert list(results.columns) == ['accuracy', 'fit_time', 'transform_time']
+    assert np.all(results['fit_time'] >= 0) and np.all(results['transform_time'] >= 0)
+
+    accuracy = results['accuracy'].groupby(level='model').mean()
+    assert accuracy['HyperAlign'] > accuracy['NullAlign']
+    assert accuracy['SharedResponseModel'] > accuracy['NullAlign']
+
+
+def test_piecewise_hyperalign():
+    weights_alignment_checker({'model': 'PiecewiseHyperAlign', 'args': [], 'kwargs': {'blocks': 2, 'n_jobs': 1}})
+
+    # a single block spanning every feature is equivalent to whole-data hyperalignment
+    aligned1 = hyp.align(spiral, model='HyperAlign')
+    aligned2, fitted = hyp.align(spiral, model='PiecewiseHyperAlign', blocks=[[0, 1, 2]], n_jobs=1,
+                                 return_model=True)
+    assert all([np.allclose(a, b) for a, b in zip(aligned1, aligned2)])
+
+    # projections are block diagonal, and features outside of any block are left unchanged
+    aligned3, fitted = hyp.align(weights, model='PiecewiseHyperAlign', blocks=[np.arange(10), np.arange(10, 25)],
+                                 n_jobs=1, return_model=True)
+    proj = fitted['model'].proj[0].toarray()
+    assert np.allclose(proj[:10, 10:], 0)
+    assert np.allclose(proj[10:25, :10], 0)
+    assert np.allclose(proj[25:, 25:], np.eye(proj.shape[0] - 25))
+    assert np.allclose(aligned3[0].iloc[:, 25:], weights[0].iloc[:, 25:])
+
+    # numpy integers are treated like ints
+    assert [len(b) for b in get_blocks(10, blocks=np.int64(3))] == [4, 3, 3]
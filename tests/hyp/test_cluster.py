@@ -3,6 +3,8 @@ import pandas as pd
 
 import pytest
 import hypertools as hyp
+from hypertools.cluster import cluster_sweep
+from hypertools.core import apply_unique
 
 cluster1 = np.random.multivariate_normal(np.zeros(5), np.eye(5), size=100)
 cluster2 = np.random.multivariate_normal(np.zeros(5)+100, np.eye(5), size=300)
@@ -11,6 +13,14 @@ true_labels = pd.DataFrame(data=np.concatenate([np.zeros(cluster1.shape[0]), np.
                            index=clusters.index)
 
 
+def same_partition(a, b):
+    """
+    Check whether two sets of cluster labels (arrays or DataFrames) divide the observations into the same clusters
+    """
+    a, b = np.reshape(np.asarray(a), [-1, 1]), np.reshape(np.asarray(b), [-1, 1])
+    return len(np.unique(a)) == len(np.unique(b)) == len(np.unique(np.hstack([a, b]), axis=0))
+
+
 def test_discrete_clusters():
     def homogeneity_test(estimates, truth, threshold=0.95):
         for x in np.unique(estimates.values):
@@ -34,6 +44,11 @@ def test_discrete_clusters():
         homogeneity_test(labels2[0], true_labels.iloc[:cluster1.shape[0]])
         homogeneity_test(labels2[1], true_labels.iloc[cluster1.shape[0]:])
 
+    # models that build nearest neighbor graphs can be fit to a shared (cached) graph
+    labels = hyp.cluster(clusters, model='SpectralClustering', affinity='nearest_neighbors', n_clusters=2,
+                         neighbor_cache=True)
+    homogeneity_test(labels, true_labels)
+
 
 def test_cluster_mixture():
     n_components = 3
@@ -49,3 +64,132 @@ def test_cluster_mixture():
         assert np.all(mixture_proportions >= 0)
         assert np.all(mixture_proportions <= 1)
         assert np.allclose(np.sum(mixture_proportions, axis=1), 1)
+
+
+def test_cluster_dedup():
+    n = clusters.shape[0]
+    repeated = pd.concat([clusters, clusters.iloc[::2], clusters.iloc[::4]], ignore_index=True)
+    repeated_labels = pd.concat([true_labels, true_labels.iloc[::2], true_labels.iloc[::4]], ignore_index=True)
+
+    # duplicate rows are fit once (weighted by their counts), and each copy receives the same label
+    labels = hyp.cluster(repeated, model='KMeans', n_clusters=2, dedup=True)
+    assert labels.shape == (repeated.shape[0], 1)
+    assert labels.index.equals(repeated.index)
+    assert np.array_equal(labels.iloc[n:].values, pd.concat([labels.iloc[:n:2], labels.iloc[:n:4]]).values)
+    assert same_partition(labels, repeated_labels)
+
+    # sample weights are summed over each distinct row's copies
+    weights = []
+    apply_unique(lambda x, return_model=False, sample_weight=None: weights.append(sample_weight) or x, repeated,
+                 sample_weight=np.full(repeated.shape[0], 0.5))
+    assert np.allclose(weights[0], 0.5 * np.bincount(np.r_[np.arange(n), np.arange(0, n, 2), np.arange(0, n, 4)]))
+    labels = hyp.cluster(repeated, model='KMeans', n_clusters=2, dedup=True, sample_weight=np.ones(repeated.shape[0]))
+    assert same_partition(labels, repeated_labels)
+
+    # models that don't accept sample weights are fit to the distinct rows
+    labels = hyp.cluster(repeated, model='AgglomerativeClustering', n_clusters=2, dedup=True)
+    assert same_partition(labels, repeated_labels)
+
+
+def test_cluster_fit_sample():
+    # inductive models assign the remaining observations with their predict methods, and other models assign each
+    # observation the label of its nearest neighbor in the subsample
+    for m, inductive in [('KMeans', True), ('GaussianMixture', True), ('AgglomerativeClustering', False)]:
+        kwargs = {'n_components': 2} if m == 'GaussianMixture' else {'n_clusters': 2}
+        labels, info = hyp.cluster(clusters, model=m, fit_sample=50, fit_sample_chunk_size=100, return_model=True,
+                                   **kwargs)
+        assert labels.shape == (clusters.shape[0], 1)
+        assert labels.index.equals(clusters.index)
+        assert len(info['fit_sample']) == 50
+        assert info['inductive'] == inductive
+        assert same_partition(labels, true_labels)
+
+    # samples are stratified across datasets
+    labels, info = hyp.cluster([cluster1, cluster2], model='KMeans', n_clusters=2, fit_sample=40, return_model=True)
+    assert [x.shape for x in labels] == [(cluster1.shape[0], 1), (cluster2.shape[0], 1)]
+    assert np.sum(info['fit_sample'] < cluster1.shape[0]) == 10
+
+    proportions = hyp.cluster(clusters, model='GaussianMixture', n_components=2, mode='fit_predict_proba',
+                              fit_sample=50)
+    assert proportions.shape == (clusters.shape[0], 2)
+    assert np.allclose(np.sum(proportions, axis=1), 1)
+
+    # subsample options are ignored when the subsample would include every observation
+    labels = hyp.cluster(clusters, n_clusters=2, fit_sample=1000, fit_sample_method='random')
+    assert same_partition(labels, true_labels)
+
+
+def test_cluster_stream(tmp_path):
+    x = np.lib.format.open_memmap(str(tmp_path / 'clusters.npy'), mode='w+', dtype=float, shape=clusters.shape)
+    x[:] = clusters.values
+    x.flush()
+    x = np.load(str(tmp_path / 'clusters.npy'), mmap_mode='r')
+
+    # models are fit chunk by chunk, and labels are written chunk by chunk
+    labels = hyp.cluster(x, n_clusters=2, stream=True, batch_size=50)
+    assert labels.shape == (clusters.shape[0], 1)
+    assert same_partition(labels.values, true_labels.values)
+
+    out = str(tmp_path / 'labels.npy')
+    labels, info = hyp.cluster(x, model='Birch', n_clusters=2, threshold=5, stream=True, batch_size=50, out=out,
+                               return_model=True)
+    assert isinstance(labels, np.memmap)
+    assert type(info['model']).__name__ == 'Birch'
+    assert np.array_equal(np.load(out), labels)
+    assert same_partition(labels, true_labels.values)
+
+    # chunk iterators are re-created for each pass
+    def reader():
+        for start in range(0, x.shape[0], 70):
+            yield pd.DataFrame(x[start:(start + 70)])
+
+    labels = hyp.cluster(reader, n_clusters=2, stream=True, n_epochs=2)
+    assert same_partition(labels.values, true_labels.values)
+
+    # lists of datasets are labeled separately (as in cluster)
+    labels = hyp.cluster([cluster1, cluster2], n_clusters=2, stream=True, batch_size=70)
+    assert [x.shape for x in labels] == [(cluster1.shape[0], 1), (cluster2.shape[0], 1)]
+    assert same_partition(pd.concat(labels), true_labels)
+
+    with pytest.raises(AssertionError):
+        hyp.cluster(reader(), n_clusters=2, stream=True)
+    with pytest.raises(AssertionError):
+        hyp.cluster(x, model='AgglomerativeClustering', stream=True)
+
+
+def test_cluster_sweep():
+    labels, scores = cluster_sweep(clusters, n_clusters=[2, 3, 4], covariance_types=['full', 'diag'],
+                                   silhouette_sample=200, random_state=0, n_jobs=2)
+    assert list(scores.columns) == ['model', 'n_clusters', 'covariance_type', 'inertia', 'bic', 'silhouette', 'error']
+    assert scores['error'].isnull().all()
+    assert scores.shape[0] == 3 + 3 * 2
+    assert np.all(np.isnan(scores.query('model == "KMeans"')['bic']))
+    assert not np.any(np.isnan(scores.query('model == "GaussianMixture"')['bic']))
+    assert scores.loc[np.argmax(scores['silhouette']), 'n_clusters'] == 2
+    assert labels.shape == (clusters.shape[0], 1)
+    assert same_partition(labels, true_labels)
+
+    labels, scores = cluster_sweep([cluster1, cluster2], models='GaussianMixture', n_clusters=[1, 2, 3],
+                                   criterion='bic', n_jobs=1)
+    assert [x.shape[0] for x in labels] == [cluster1.shape[0], cluster2.shape[0]]
+    assert np.isnan(scores.loc[0, 'silhouette'])  # a single cluster has no silhouette
+    assert same_partition(pd.concat(labels, ignore_index=True), true_labels)
+
+    # candidates that cannot be fit (GaussianMixture requires dense data) are recorded rather than ending the sweep
+    from scipy import sparse
+    labels, scores = cluster_sweep(sparse.csr_matrix(clusters.values), n_clusters=[2, 3], random_state=0, n_jobs=1)
+    assert labels.shape == (clusters.shape[0], 1)
+    assert same_partition(labels, true_labels)
+    failed = scores.query('model == "GaussianMixture"')
+    assert failed.shape[0] == 2
+    assert failed['error'].str.contains('dense').all()
+    assert np.all(np.isnan(failed[['inertia', 'bic', 'silhouette']].values))
+    assert scores.query('model == "KMeans"')['error'].isnull().all()
+
+
+def test_cluster_sparse():
+    from scipy import sparse
+
+    labels = hyp.cluster(sparse.csr_matrix(clusters.values), model='MiniBatchKMeans', n_clusters=2, n_init=3)
+    assert labels.shape == (clusters.shape[0], 1)
+    assert np.unique(labels.values).shape[0] == 2
@@ -2,6 +2,7 @@
 import datawrangler as dw
 import numpy as np
 import pandas as pd
+import os
 import warnings
 
 import sklearn
@@ -154,6 +155,26 @@ def test_apply_model():
             assert all([x.shape[0] == 10 for x in x2_fit])
 
 
+def test_apply_model_sparse():
+    from scipy import sparse
+
+    # sparse outputs stay sparse, and later steps of a pipeline are applied to them without densifying
+    x = pd.DataFrame(np.random.randint(0, 5, size=(100, 4)), index=range(100, 200))
+    encoded = hyp.core.apply_model(x, 'OneHotEncoder')
+    assert sparse.issparse(encoded)
+    assert encoded.shape == (100, 20)
+
+    reduced = hyp.core.apply_model(x, ['OneHotEncoder', {'model': 'TruncatedSVD', 'args': [],
+                                                         'kwargs': {'n_components': 2}}])
+    assert type(reduced) is pd.DataFrame
+    assert reduced.shape == (100, 2)
+    assert reduced.index.equals(x.index)
+
+    reduced = hyp.core.apply_model(encoded, {'model': 'TruncatedSVD', 'args': [], 'kwargs': {'n_components': 2}})
+    assert type(reduced) is pd.DataFrame
+    assert reduced.shape == (100, 2)
+
+
 def test_has_all_attributes():
     x = HyperTest(1, 2, 3, 4, 5, 6)
     assert hyp.core.has_all_attributes(x, ['b', 'c', 'd'])
@@ -297,3 +318,145 @@ def test_robust_dict():
     y.pop('second')
     assert y['second'] == 'hello'
     assert y['first'] == 1
+
+
+def test_sample_rows():
+    x = pd.DataFrame(np.random.randn(1000, 3), index=pd.MultiIndex.from_product([range(10), range(100)]))
+    x = x.iloc[100:]  # make the strata unequal in size
+    x = pd.concat([x, pd.DataFrame(np.random.randn(5, 3), index=pd.MultiIndex.from_product([[10], range(5)]))])
+
+    for method in ['kmeans++', 'stratified', 'random']:
+        inds = hyp.core.sample_rows(x, 50, method=method, random_state=0)
+        assert len(inds) == 50
+        assert len(np.unique(inds)) == 50
+        assert np.all(np.diff(inds) > 0)
+        assert np.array_equal(inds, hyp.core.sample_rows(x, 50, method=method, random_state=0))
+
+    # stratified samples represent every stratum (in proportion to its size)
+    strata = x.index.get_level_values(0)[hyp.core.sample_rows(x, 50, method='stratified')]
+    assert set(strata) == set(range(1, 11))
+    assert np.all(np.bincount(strata)[1:10] >= 4)
+
+    assert np.array_equal(hyp.core.sample_rows(x, 2000), np.arange(x.shape[0]))
+
+
+def test_unique_rows():
+    from scipy import sparse
+
+    rng = np.random.RandomState(0)
+    x = rng.randint(0, 3, size=(500, 4)).astype(float)
+    first, inverse, counts = hyp.core.unique_rows(x)
+
+    assert len(first) == np.unique(x, axis=0).shape[0]
+    assert np.all(np.diff(first) > 0)
+    assert np.array_equal(x[first][inverse], x)
+    assert counts.sum() == x.shape[0]
+    assert np.array_equal(counts, np.bincount(inverse))
+
+    # sparse and dense versions of the same data have the same distinct rows
+    for s in [sparse.csr_matrix(x), sparse.coo_matrix(x), sparse.csc_matrix(x)]:
+        assert all([np.array_equal(a, b) for a, b in zip(hyp.core.unique_rows(s), (first, inverse, counts))])
+    assert all([np.array_equal(a, b) for a, b in zip(hyp.core.unique_rows(pd.DataFrame(x)), (first, inverse, counts))])
+
+
+def test_neighbor_graph(monkeypatch):
+    from hypertools.core import neighbors
+
+    x = np.random.randn(500, 5)
+    calls = []
+    compute_neighbors = neighbors.compute_neighbors
+    monkeypatch.setattr(neighbors, 'compute_neighbors', lambda *args, **kwargs: calls.append(args[1]) or
+                        compute_neighbors(*args, **kwargs))
+    monkeypatch.setattr(neighbors, 'graphs', neighbors.OrderedDict())
+
+    indices, distances, index = hyp.core.neighbor_graph(x, 10)
+    assert indices.shape == distances.shape == (500, 10)
+    assert np.array_equal(indices[:, 0], np.arange(500))  # each observation is its own nearest neighbor
+    assert np.all(np.diff(distances, axis=1) >= 0)
+    assert index is None
+
+    # graphs are computed once per dataset and metric, and reused for smaller numbers of neighbors
+    smaller, _, _ = hyp.core.neighbor_graph(pd.DataFrame(x.copy()), 5)
+    assert np.array_equal(smaller, indices[:, :5])
+    assert calls == [10]
+
+    hyp.core.neighbor_graph(x, 20)
+    hyp.core.neighbor_graph(x, 10, metric='manhattan')
+    assert calls == [10, 20, 10]
+    assert len(neighbors.graphs) == 2
+
+    graph = neighbors.distance_graph(x, 5)
+    assert graph.shape == (500, 500)
+    assert graph.nnz == 2500
+    assert np.allclose(graph.toarray()[np.arange(500)[:, np.newaxis], indices[:, :5]], distances[:, :5])
+
+
+def test_cache(tmp_path, monkeypatch):
+    from hypertools.core import cache
+    opts = {'enabled': False, 'cachedir': str(tmp_path), 'max_size': 10 ** 9}
+    monkeypatch.setattr(cache, 'cache_options', lambda: opts.copy())
+
+    x = [pd.DataFrame(np.random.randn(100, 10)) for _ in range(3)]
+    assert cache.fingerprint(x) == cache.fingerprint([d.copy() for d in x])
+    assert cache.fingerprint(x) != cache.fingerprint(x[:2])
+    assert cache.fingerprint(x[0]) != cache.fingerprint(x[0].values)
+
+    calls = []
+
+    @cache.cached('test')
+    def f(data, model='PCA', **kwargs):
+        calls.append(model)
+        return hyp.reduce(data, model=model, **kwargs)
+
+    r1 = f(x, model='PCA', cache=True)
+    r2 = f(x, model='PCA', cache=True)
+    assert calls == ['PCA']
+    assert all([np.allclose(a, b) and a.index.equals(b.index) for a, b in zip(r1, r2)])
+
+    # cached results are copy-on-write views of memory-mapped arrays: they can be modified (like freshly computed
+    # results) without changing the stored result
+    expected = r1[0].iloc[0, 0]
+    r1[0].iloc[0, 0] = 1.0
+    r2[0].iloc[0, 0] = 1.0
+    assert np.isclose(f(x, model='PCA', cache=True)[0].iloc[0, 0], expected)
+    assert calls == ['PCA']
+
+    # different models, different data, and disabled caching all bypass the stored result
+    f(x, model='FastICA', cache=True)
+    f(x[:2], model='PCA', cache=True)
+    f(x, model='PCA')
+    assert calls == ['PCA', 'FastICA', 'PCA', 'PCA']
+
+    # changing the default options in config.ini (or the installed packages) also bypasses the stored result
+    key = cache.cache_key('test', x, model='PCA')
+    defaults = hyp.core.get_default_options()
+    defaults['PCA'] = {**defaults['PCA'], 'whiten': 'True'}
+    with monkeypatch.context() as m:
+        m.setattr(cache, 'get_default_options', lambda: defaults)
+        assert cache.cache_key('test', x, model='PCA') != key
+    with monkeypatch.context() as m:
+        m.setattr(cache, 'package_version', lambda name: 'other')
+        assert cache.cache_key('test', x, model='PCA') != key
+    assert cache.cache_key('test', x, model='PCA') == key
+
+    # least recently used entries are evicted once the cache grows too large
+    f(x, model='PCA', cache=True)
+    entry_size = cache.entry_size(os.path.join(str(tmp_path), cache.cache_key('test', x, model='PCA')))
+    cache.write('new', pd.DataFrame(np.zeros([10, 3])), cachedir=str(tmp_path), max_size=entry_size + 500)
+    assert os.path.exists(os.path.join(str(tmp_path), 'new'))
+    assert len([e for e in os.listdir(str(tmp_path)) if not e.startswith('.')]) <= 2
+
+
+def write_entry(cachedir, i):
+    from hypertools.core import cache
+    cache.write('shared', pd.DataFrame(np.full([1000, 10], 7.0)), cachedir=cachedir, max_size=10 ** 9)
+    return i
+
+
+def test_cache_concurrent_writers(tmp_path):
+    from joblib import Parallel, delayed
+    from hypertools.core import cache
+
+    Parallel(n_jobs=4, backend='threading')(delayed(write_entry)(str(tmp_path), i) for i in range(8))
+    assert np.allclose(cache.read('shared', cachedir=str(tmp_path)).values, 7.0)
+    assert [e for e in os.listdir(str(tmp_path)) if not e.startswith('.')] == ['shared']
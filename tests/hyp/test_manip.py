@@ -5,6 +5,8 @@ import pandas as pd
 
 import pytest
 import hypertools as hyp
+from hypertools.manip import Normalize, Resample, Smooth, StreamingSmooth, ZScore
+from hypertools.manip.resample import fit_batches
 
 weights = hyp.load('weights_sample')
 
@@ -36,6 +38,60 @@ def test_zscore():
     assert all([x.shape == w.shape for x, w in zip(x2, weights)])
 
 
+def test_normalize_zscore_axis_and_inplace():
+    x = pd.DataFrame(np.random.randn(50, 8) * 3 + 2)
+
+    x1 = hyp.manip(x, model='Normalize', axis=1, min=-1, max=5)
+    assert np.allclose(x1.min(axis=1), -1)
+    assert np.allclose(x1.max(axis=1), 5)
+
+    for m, kwargs in [(ZScore, {}), (Normalize, {'min': -2, 'max': 2})]:
+        expected = hyp.manip(x, model=m.__name__, **kwargs)
+
+        y = x.copy()
+        z = m(inplace=True, **kwargs).fit_transform(y)
+        assert z is y
+        assert np.allclose(y, expected)
+
+
+def test_partial_fit():
+    x = pd.DataFrame(np.random.randn(1000, 5) * 3 + 1)
+    x.iloc[3, 2] = np.nan
+
+    for m, params in [(ZScore, ['mean', 'std']), (Normalize, ['baseline', 'peak'])]:
+        full = m().fit(x)
+        streamed = m()
+        for i in range(0, x.shape[0], 137):
+            streamed.partial_fit(x.iloc[i:(i + 137)])
+
+        assert all([np.allclose(getattr(full, p), getattr(streamed, p)) for p in params])
+        assert np.allclose(streamed.transform(x.iloc[-10:]), full.transform(x).iloc[-10:])
+
+        with pytest.raises(ValueError):
+            m(axis=1).partial_fit(x)
+
+
+def test_keep_data():
+    x = pd.DataFrame(np.random.randn(100, 4) * 2 + 1)
+    y = pd.DataFrame(np.random.randn(30, 4))
+
+    # by default, fitted manipulators retain only their fitted parameters and may be applied to new data
+    for m in [ZScore, Normalize, Smooth, Resample]:
+        fitted = m().fit(x)
+        assert fitted.data is None
+        with pytest.raises(AssertionError):
+            fitted.transform()
+        assert np.allclose(fitted.transform(x), m().fit_transform(x))
+        assert fitted.transform(y).shape[1] == y.shape[1]
+
+        kept = m(keep_data=True).fit(x)
+        assert kept.data is x
+        assert np.allclose(kept.transform(), fitted.transform(x))
+
+    # new data are transformed using the training statistics
+    assert np.allclose(ZScore().fit(x).transform(y), (y - x.mean(axis=0)) / x.std(axis=0))
+
+
 def test_resample():
     n_samples = 500
     x1 = hyp.manip(weights, model='Resample', n_samples=n_samples)
@@ -58,6 +114,21 @@ def test_resample():
     assert len(x3) == len(weights)
 
 
+def test_resample_batches():
+    data = [pd.DataFrame(np.cumsum(np.random.randn(n, 4), axis=0)) for n in [40, 40, 60]]
+
+    # equal-length datasets are resampled together in one batch; the result should match resampling each dataset
+    # separately
+    x1, fitted = hyp.manip(data, model='Resample', n_samples=25, return_model=True)
+    assert len(fit_batches(dw.stack(data), n_samples=25)['batches']) == 2
+    assert all([x.shape == (25, 4) for x in x1])
+    assert all([np.allclose(x, hyp.manip(d, model='Resample', n_samples=25)) for x, d in zip(x1, data)])
+
+    # interpolated values should pass through the original samples
+    x2 = hyp.manip(data[0], model='Resample', n_samples=79)
+    assert np.allclose(x2.iloc[::2].values, data[0].values)
+
+
 def test_smooth():
     x1 = hyp.manip(weights, model='Smooth', maintain_bounds=True)
     assert all([p.shape == w.shape for p, w in zip(x1, weights)])
@@ -75,12 +146,73 @@ def test_smooth():
     assert all([x.shape == w.shape for x, w in zip(x4, weights)])
 
 
+def test_smooth_groups():
+    data = [pd.DataFrame(np.cumsum(np.random.randn(n, 4), axis=0)) for n in [50, 80, 5, 50, 5, 50]]
+
+    # each dataset should be smoothed independently (no smoothing across dataset boundaries)
+    x1 = hyp.manip(data, model='Smooth', maintain_bounds=False)
+    assert all([np.allclose(a, hyp.manip(d, model='Smooth', maintain_bounds=False)) for a, d in zip(x1, data)])
+
+    x2 = hyp.manip(data, model='Smooth', maintain_bounds=True)
+    lower = dw.stack(data).min(axis=0).values
+    upper = dw.stack(data).max(axis=0).values
+    assert all([np.all(x.values >= lower) and np.all(x.values <= upper) for x in x2])
+
+
+def test_streaming_smooth():
+    x = pd.DataFrame(np.cumsum(np.random.randn(500, 3), axis=0))
+
+    for method in ['savgol', 'exponential']:
+        smoothed = StreamingSmooth(method=method).fit_transform(x)
+        assert smoothed.shape == x.shape
+
+        # smoothing the data in chunks should give the same result as smoothing all of the data at once
+        model = StreamingSmooth(method=method).fit(x.iloc[:0])
+        chunks = [model.transform(x.iloc[i:(i + 37)]) for i in range(0, x.shape[0], 37)]
+        assert np.allclose(pd.concat(chunks), smoothed)
+
+        # smoothing is causal: changing future samples doesn't affect past outputs
+        y = x.copy()
+        y.iloc[300:] = 0
+        assert np.allclose(StreamingSmooth(method=method).fit_transform(y).iloc[:300], smoothed.iloc[:300])
+
+    # causal Savitzky-Golay filters preserve polynomials up to the given order
+    t = np.arange(100.0)
+    cubic = pd.DataFrame(0.001 * t ** 3 - 0.1 * t ** 2 + t)
+    assert np.allclose(StreamingSmooth(order=3).fit_transform(cubic).iloc[10:], cubic.iloc[10:])
+
+    # each dataset is treated as a separate stream
+    data = [x.iloc[:100], x.iloc[100:250], x.iloc[250:350], x.iloc[350:]]
+    x2 = hyp.manip(data, model='StreamingSmooth')
+    assert all([np.allclose(a, StreamingSmooth().fit_transform(d)) for a, d in zip(x2, data)])
+
+
 def test_zscore_smooth_resample_smooth():
     x = hyp.manip(weights, model=['ZScore', 'Smooth', 'Resample', 'Smooth'])
     assert all([w.shape == (100, weights[0].shape[1]) for w in x])
     assert all([type(w) is pd.DataFrame for w in x])
 
 
+def test_fused_chain():
+    data = [pd.DataFrame(np.random.randn(n, 4)) for n in [30, 5, 50]]
+    chain = ['ZScore', 'Smooth', {'model': 'Normalize', 'args': [], 'kwargs': {'min': -1, 'max': 2}}]
+
+    x1, fused = hyp.manip(data, model=chain, return_model=True)
+    x2, sequential = hyp.manip(data, model=chain, return_model=True, fuse=False)
+    assert all([np.allclose(a, b) for a, b in zip(x1, x2)])
+    assert all([a.index.equals(b.index) for a, b in zip(x1, x2)])
+
+    # each fused step is fit exactly as it would have been on its own
+    new_data = pd.DataFrame(np.random.randn(20, 4))
+    for f, s in zip(fused, sequential):
+        assert type(f['model']) is type(s['model'])
+        assert np.allclose(f['model'].transform(new_data), s['model'].transform(new_data))
+
+    x3 = hyp.manip(data[0].values, model=['ZScore', 'Normalize'], axis=1)
+    x4 = hyp.manip(data[0].values, model=['ZScore', 'Normalize'], axis=1, fuse=False)
+    assert np.allclose(x3, x4)
+
+
 def test_preprocessing():
     models = ['Binarizer', 'MaxAbsScaler']
     x1 = hyp.manip(weights, model=models)
@@ -255,6 +255,31 @@ def test_bounding_box(fig_dir):
     plot_test('fig77', fig_dir, data, bounding_box=True, animate='chemtrails')
 
 
+def test_plot_dedup():
+    x = pd.DataFrame(np.random.randn(50, 3))
+    x = pd.concat([x, x, x.iloc[:10]], ignore_index=True)
+
+    # each distinct point is drawn once, with its marker scaled by its number of copies
+    fig = hyp.plot(x, dedup=True)
+    assert sum([len(t.x) for t in fig.data]) == 50
+    markersize = hyp.core.eval_dict(hyp.core.get_default_options()['plot'])['markersize']
+    sizes = np.concatenate([t.marker.size for t in fig.data])
+    assert np.allclose(np.unique(sizes), markersize * np.sqrt([2, 3]))
+
+    # lines connect consecutive observations, so they are drawn in full
+    assert sum([len(t.x) for t in hyp.plot(x, '-', dedup=True).data]) == x.shape[0]
+
+    # datasets may collapse to different numbers of distinct points
+    y = pd.DataFrame(np.random.randn(300, 3))
+    fig = hyp.plot([x, y, y.iloc[:10]], dedup=True)
+    assert [len(t.x) for t in fig.data] == [50, 300, 10]
+    assert np.allclose(np.unique(fig.data[0].marker.size), markersize * np.sqrt([2, 3]))
+    assert np.allclose(fig.data[1].marker.size, markersize)
+
+    fig = hyp.plot([x, y.iloc[:10]], dedup=True, cluster={'model': 'KMeans', 'args': [], 'kwargs': {'n_clusters': 2}})
+    assert len(fig.data) > 0
+
+
 def test_backend_management():
     # not implemented
     pass
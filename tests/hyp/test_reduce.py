@@ -35,3 +35,283 @@ def test_reduce():
         assert type(x) is pd.DataFrame
         assert x.shape[0] == normalized_weights[0].shape[0]
         assert x.shape[1] == n_components
+
+
+def test_reduce_auto(monkeypatch):
+    from hypertools.reduce import solvers
+
+    x1, info = hyp.reduce(normalized_weights, model='auto', return_model=True)
+    assert all([r.shape == (w.shape[0], 3) for r, w in zip(x1, normalized_weights)])
+    assert info['solver']['model'] == 'PCA'
+    assert type(info['model']).__name__ == 'PCA'
+
+    # solvers are chosen for named models unless they are specified explicitly
+    _, info = hyp.reduce(normalized_weights, model='TSNE', n_components=10, return_model=True)
+    assert info['solver']['method'] == 'exact'
+    _, info = hyp.reduce(normalized_weights, model='PCA', svd_solver='arpack', return_model=True)
+    assert 'solver' not in info.keys()
+
+    assert solvers.select_solver('PCA', 10000, 100)[1]['svd_solver'] == 'full'
+    assert solvers.select_solver('PCA', 10000, 2000)[1]['svd_solver'] == 'randomized'
+    assert solvers.select_solver('TSNE', 100000, 50)[1]['method'] == 'barnes_hut'
+    assert solvers.select_solver('TSNE', 100000, 50, n_components=5)[1]['method'] == 'exact'
+    assert solvers.select_solver('auto', 100, 10, is_sparse=True)[1]['model'] == 'TruncatedSVD'
+
+    # the default memory budget depends only on the machine's total memory (not its current load)
+    monkeypatch.setattr(solvers.os, 'sysconf', lambda name: {'SC_PHYS_PAGES': 1000, 'SC_PAGE_SIZE': 4096}[name])
+    assert solvers.memory_budget(memory_fraction=0.5) == 500 * 4096
+    assert solvers.memory_budget(memory=123) == 123
+
+    # datasets that exceed the memory budget are reduced incrementally, in batches that fit within the budget
+    monkeypatch.setattr(solvers, 'memory_budget', lambda **kwargs: 3 * 8 * 10 * 50)
+    model, solver = solvers.select_solver('auto', 1000, 10)
+    assert solver['model'] == 'IncrementalPCA'
+    assert solver['batch_size'] == 50
+
+
+def test_reduce_landmarks():
+    n_landmarks = 100
+    n_rows = dw.stack(normalized_weights).shape[0]
+    for m, extension in [('Isomap', 'transform'), ('SpectralEmbedding', 'nystrom'), ('TSNE', 'knn')]:
+        reduced, info = hyp.reduce(normalized_weights, model=m, n_components=2, landmarks=n_landmarks,
+                                   return_model=True)
+        assert info['extension'] == extension
+        assert len(info['landmarks']) == n_landmarks
+        assert all([r.shape == (w.shape[0], 2) for r, w in zip(reduced, normalized_weights)])
+        assert np.all(np.isfinite(dw.stack(reduced).values))
+
+    # landmarks keep the coordinates they were assigned when fitting the model
+    stacked = dw.stack(normalized_weights)
+    reduced, info = hyp.reduce(stacked, model='TSNE', n_components=2, landmarks=n_landmarks, return_model=True,
+                               landmark_method='stratified')
+    assert reduced.shape == (n_rows, 2)
+    assert np.allclose(reduced.iloc[info['landmarks']].values, info['model'].embedding_)
+
+    # landmark options are ignored when there are no more observations than landmarks
+    x = pd.DataFrame(np.random.randn(300, 10))
+    assert hyp.reduce(x, model='PCA', n_components=2, landmarks=1000, landmark_method='random').shape == (300, 2)
+
+
+def test_reduce_progressive():
+    stages = []
+    handle = hyp.reduce(normalized_weights, model='TSNE', n_components=2, progressive=True,
+                        progressive_preview_size=100, progressive_landmarks=200, progressive_random_state=0,
+                        callback=lambda embedding, stage: stages.append(stage))
+
+    # the preview is available immediately
+    assert handle.stages == ['preview', 'landmarks', 'full']
+    assert all([p.shape == (w.shape[0], 2) for p, w in zip(handle.embedding, normalized_weights)])
+
+    reduced = handle.result(timeout=600)
+    assert handle.done() and handle.exception() is None
+    assert stages == handle.stages
+    assert handle.stage == 'full'
+    assert all([r.shape == (w.shape[0], 2) for r, w in zip(reduced, normalized_weights)])
+    assert np.all(np.isfinite(dw.stack(reduced).values))
+
+    # later stages are initialized from earlier ones
+    assert isinstance(handle.model['model'].init, np.ndarray)
+
+    # datasets with no more observations than the preview size are previewed using all of their observations
+    x = pd.DataFrame(np.random.randn(300, 10))
+    handle = hyp.reduce(x, model='PCA', n_components=2, progressive=True)
+    assert handle.stages == ['preview', 'full']
+    assert handle.result(timeout=600).shape == (300, 2)
+
+
+def test_reduce_warm_start():
+    from hypertools.reduce.warm_start import warm_start_init
+
+    earlier = [w.iloc[:-10] for w in normalized_weights]
+    prior = hyp.reduce(earlier, model='TSNE', n_components=2, random_state=0)
+
+    # rotate the prior embedding, so that its orientation differs from the one a cold start would find
+    theta = np.pi / 3
+    rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    prior = [pd.DataFrame(np.dot(p.values, rotation), index=p.index) for p in prior]
+
+    # rows that appear in the prior embedding keep their coordinates, and new rows are placed near their neighbors
+    stacked = dw.stack(normalized_weights)
+    init = warm_start_init(stacked, prior)
+    matched = np.concatenate([np.arange(w.shape[0]) < w.shape[0] - 10 for w in normalized_weights])
+    assert np.allclose(init[matched], dw.stack(prior).values)
+    assert np.all(np.isfinite(init))
+
+    # warm-started embeddings keep the prior embedding's orientation (they stay close to it without being re-aligned to
+    # it), unlike cold starts
+    def displacement(embedding):
+        x = dw.stack(embedding).values[matched]
+        x = x - np.mean(x, axis=0)
+        y = dw.stack(prior).values - np.mean(dw.stack(prior).values, axis=0)
+        return np.linalg.norm(x / np.linalg.norm(x) - y / np.linalg.norm(y))
+
+    reduced, info = hyp.reduce(normalized_weights, model='TSNE', n_components=2, prior=prior, random_state=1,
+                               return_model=True)
+    assert isinstance(info['model'].init, np.ndarray)
+    assert info['model'].early_exaggeration == 1.0
+    assert all([r.shape == (w.shape[0], 2) for r, w in zip(reduced, normalized_weights)])
+
+    cold = hyp.reduce(normalized_weights, model='TSNE', n_components=2, random_state=1)
+    assert displacement(reduced) < 0.5 * displacement(cold)
+
+    with pytest.raises(AssertionError):
+        hyp.reduce(normalized_weights, model='PCA', n_components=2, prior=prior)
+
+
+def test_reduce_neighbor_cache():
+    from sklearn.datasets import make_swiss_roll
+    x = pd.DataFrame(make_swiss_roll(500, random_state=0)[0])
+
+    # models that build nearest neighbor graphs can be fit to a shared (cached) graph, with the same results
+    for m, kwargs in [('Isomap', {'n_neighbors': 10}), ('SpectralEmbedding', {'n_neighbors': 15, 'random_state': 0}),
+                      ('UMAP', {})]:
+        reduced, info = hyp.reduce(x, model=m, n_components=2, neighbor_cache=True, return_model=True, **kwargs)
+        assert reduced.shape == (500, 2)
+        assert type(info['model']).__name__ == m
+        if m != 'UMAP':
+            expected = hyp.reduce(x, model=m, n_components=2, **kwargs)
+            assert all([np.abs(np.corrcoef(reduced[i], expected[i])[0, 1]) > 0.999 for i in range(2)])
+
+    assert info['model'].knn_search_index is not None  # UMAP can still place new observations
+
+    # landmark mode places observations by kNN when the model was fit to precomputed distances
+    _, info = hyp.reduce(x, model='Isomap', n_components=2, n_neighbors=10, neighbor_cache=True, landmarks=200,
+                         return_model=True)
+    assert info['model'].metric == 'precomputed'
+    assert info['extension'] == 'knn'
+
+
+def test_reduce_sparse():
+    from scipy import sparse
+
+    rng = np.random.RandomState(0)
+    x = sparse.random(2000, 5000, density=0.001, format='csr', random_state=rng)
+
+    # sparse data are reduced without being densified (sparse-capable solvers are chosen automatically)
+    reduced, info = hyp.reduce(x, n_components=5, return_model=True)
+    assert type(reduced) is pd.DataFrame
+    assert reduced.shape == (2000, 5)
+    assert info['solver']['model'] == 'TruncatedSVD'
+
+    _, info = hyp.reduce(x, model='PCA', n_components=5, return_model=True)
+    assert info['solver']['svd_solver'] == 'arpack'
+
+    for m in ['UMAP', 'TSNE']:
+        assert hyp.reduce(x[:500], model=m, n_components=2).shape == (500, 2)
+
+    reduced, info = hyp.reduce(x.tocoo(), model='TruncatedSVD', n_components=5, landmarks=200, return_model=True)
+    assert reduced.shape == (2000, 5)
+    assert len(info['landmarks']) == 200
+    assert hyp.core.fingerprint(x) == hyp.core.fingerprint(x.tocoo())
+
+
+def test_reduce_dedup():
+    rng = np.random.RandomState(0)
+    x = pd.DataFrame(rng.randn(200, 10))
+    x = pd.concat([x, x.iloc[:100], x.iloc[:50]], ignore_index=True)
+
+    # duplicate rows are reduced once, and each copy receives the same embedding
+    reduced, info = hyp.reduce(x, model='UMAP', n_components=2, dedup=True, return_model=True)
+    assert reduced.shape == (350, 2)
+    assert reduced.index.equals(x.index)
+    assert np.allclose(reduced.iloc[:100].values, reduced.iloc[200:300].values)
+    assert np.allclose(reduced.iloc[:50].values, reduced.iloc[300:].values)
+    assert np.array_equal(info['unique_rows'], np.arange(200))
+    assert np.array_equal(np.unique(info['counts']), [1, 2, 3])
+    assert info['model'].embedding_.shape == (200, 2)
+
+    reduced = hyp.reduce([x, x.iloc[:100]], model='PCA', n_components=3, dedup=True)
+    assert [r.shape for r in reduced] == [(350, 3), (100, 3)]
+    assert np.allclose(reduced[0].iloc[:100].values, reduced[1].values)
+
+    # initializations and prior embeddings given for every row are restricted to the distinct rows
+    init = rng.randn(350, 2)
+    reduced, info = hyp.reduce(x, model='TSNE', n_components=2, init=init, dedup=True, return_model=True)
+    assert np.allclose(info['model'].init, init[:200])
+    assert np.allclose(reduced.iloc[:100].values, reduced.iloc[200:300].values)
+
+    prior = rng.randn(350, 2)
+    reduced, info = hyp.reduce(x, model='TSNE', n_components=2, prior=prior, dedup=True, return_model=True)
+    assert info['model'].init.shape == (200, 2)
+    assert reduced.shape == (350, 2)
+
+    handle = hyp.reduce(x, model='UMAP', n_components=2, progressive=True, dedup=True)
+    reduced = handle.result(timeout=600)
+    assert handle.exception() is None and handle.stage == 'full'
+    assert np.allclose(reduced.iloc[:100].values, reduced.iloc[200:300].values)
+
+
+def test_ppca():
+    from hypertools.external import PPCA
+
+    rng = np.random.RandomState(0)
+    complete = np.dot(rng.randn(500, 3), rng.randn(3, 20)) + 0.1 * rng.randn(500, 20)
+    missing = rng.rand(*complete.shape) < 0.2
+    data = complete.copy()
+    data[missing] = np.nan
+
+    np.random.seed(0)
+    model = PPCA()
+    projected = model.fit_transform(data, d=3)
+    assert np.array_equal(np.isnan(data), missing)  # the input is left unchanged
+
+    assert projected.shape == (500, 3)
+    assert np.all(np.isfinite(projected))
+    assert np.all(np.diff(model.eig_vals) <= 0)
+    assert model.var_exp[-1] > 0.95
+
+    # missing values are filled in using the low-rank structure of the observed values
+    filled = model.data * model.stds + model.means
+    assert np.allclose(filled[~missing], complete[~missing])
+    assert np.corrcoef(filled[missing], complete[missing])[0, 1] > 0.95
+
+
+def test_minibatch_ppca(tmp_path, monkeypatch):
+    from hypertools.external import PPCA, MiniBatchPPCA
+    from hypertools.reduce import solvers
+
+    rng = np.random.RandomState(0)
+    data = np.dot(rng.randn(2000, 3), rng.randn(3, 20)) + 0.1 * rng.randn(2000, 20)
+    data[rng.rand(*data.shape) < 0.2] = np.nan
+
+    def similarity(a, b):  # cosines of the principal angles between two models' subspaces
+        return np.linalg.svd(np.dot(a.C.T, b.C), compute_uv=False)
+
+    np.random.seed(0)
+    batch = PPCA(n_components=3)
+    full = batch.fit_transform(data)
+
+    # repeated passes through arrays (or lists of chunks) use exact EM
+    model = MiniBatchPPCA(n_components=3, batch_size=250, random_state=0)
+    projected = model.fit_transform(data)
+    assert projected.shape == (2000, 3)
+    assert np.all(similarity(batch, model) > 0.9999)
+    assert all([np.abs(np.corrcoef(full[:, i], projected[:, i])[0, 1]) > 0.999 for i in range(3)])
+
+    # streams are fit in a single pass (stepwise EM), equivalent to calling partial_fit on each chunk
+    stream = MiniBatchPPCA(n_components=3, random_state=0).fit(iter(np.array_split(data, 10)))
+    assert stream.n_batches == 10
+    assert np.all(similarity(batch, stream) > 0.999)
+
+    incremental = MiniBatchPPCA(n_components=3, random_state=0)
+    for chunk in np.array_split(data, 10):
+        incremental.partial_fit(chunk)
+    assert np.allclose(incremental.C, stream.C)
+
+    # reduce switches to mini-batch PPCA when a batch size is specified (or the data exceed the memory budget)
+    reduced, info = hyp.reduce(data, model='PPCA', n_components=3, batch_size=250, return_model=True)
+    assert type(info['model']).__name__ == 'MiniBatchPPCA'
+    assert info['solver']['batch_size'] == 250
+    assert reduced.shape == (2000, 3)
+    assert np.all(np.isfinite(reduced.values))
+
+    monkeypatch.setattr(solvers, 'memory_budget', lambda **kwargs: 3 * 8 * 20 * 100)
+    assert solvers.select_solver('PPCA', 2000, 20, n_components=3)[1] == {'model': 'MiniBatchPPCA', 'batch_size': 100}
+    assert solvers.select_solver('PPCA', 100, 20, n_components=3)[1] is None
+
+    # memory-mapped arrays are reduced without being loaded into memory
+    fname = str(tmp_path / 'data.npy')
+    np.save(fname, data)
+    reduced = hyp.reduce(np.load(fname, mmap_mode='r'), model='PPCA', n_components=3, batch_size=250, random_state=0)
+    assert reduced.shape == (2000, 3)
+    assert np.allclose(reduced.values, projected)